@@ -0,0 +1,366 @@
+"""
+Benchmark and regression oracle for ``phrase_to_san()``.
+
+    python benchmark.py build --corpus new.jsonl  # sample new cases (see below)
+    python benchmark.py check   # exit with status 1 if any result differs from the corpus
+    python benchmark.py update  # re-record the corpus's expected results, printing each one that changes
+    python benchmark.py run     # per-case throughput, p50/p99 latency and allocations
+    python benchmark.py startup # cold import and first-call latency vs warm calls, against --import-budget-ms
+
+The corpus holds (FEN, phrase, expected result) triples for every ``case`` in ``phrase_to_move()``,
+in positions sampled from games that follow a few common openings and then continue with random
+(but capture- and check-happy) moves. Each expected result is stored both without and with
+``raise_warnings``, as the SAN or the name and message of the exception raised.
+
+The corpus is frozen, so that ``check`` compares the code against the results it gave when the corpus was
+built, not against itself: ``build`` won't overwrite an existing file without ``--force``. When a change is
+meant to alter results, ``update`` rewrites only the expected results of the same cases, and the corpus is
+committed on its own so that its diff shows every result that changed. New cases (ex. for a new kind of
+phrase) are built into another file with ``--arms`` and appended.
+
+``startup`` times fresh interpreters instead, since that is what a cold-started worker pays: importing
+``chess``, then importing ``phrase_to_san`` on top of it (checked against the budget), then the first call,
+then the median of the calls after it.
+"""
+import argparse
+import json
+import random
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import chess
+
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from move_index import MoveIndex
+from phrase_to_san import phrase_to_san
+
+CORPUS_PATH = 'benchmark_corpus.jsonl'
+
+OPENINGS = [
+    'e4 e5 Nf3 Nc6 Bb5 a6 Ba4 Nf6 O-O Be7',
+    'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6',
+    'd4 d5 c4 e6 Nc3 Nf6 Bg5 Be7 e3 O-O',
+    'd4 Nf6 c4 g6 Nc3 Bg7 e4 d6 Nf3 O-O',
+    'e4 e6 d4 d5 Nc3 Bb4 e5 c5 a3 Bxc3+',
+    'e4 c6 d4 d5 Nc3 dxe4 Nxe4 Bf5 Ng3 Bg6',
+    'c4 e5 Nc3 Nf6 g3 d5 cxd5 Nxd5 Bg2 Nb6',
+    'e4 e5 Bc4 Nc6 Qh5 Nf6',
+    'e4 d5 exd5 Qxd5 Nc3 Qa5 d4 Nf6 Nf3 Bf5',
+    'd4 d5 Bf4 Nf6 e3 c5 c3 Nc6 Nd2 e6',
+]
+
+SPECIAL_FENS = [
+    'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1',               # Castling either way
+    'r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1',
+    '7k/5Q2/6K1/8/8/8/8/8 w - - 0 1',                     # Mates and stalemates
+    '6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1',
+    'k7/8/2Q5/8/8/8/8/7K w - - 0 1',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',  # En passant
+    '8/P6k/8/8/8/8/6p1/K7 w - - 0 1',                     # Promotions
+    '2r3k1/1P6/8/8/8/8/6p1/K6R w - - 0 1',
+    '3q1bk1/4P3/8/8/8/8/8/4K2R w K - 0 1',
+    '4k3/8/8/8/8/8/1p6/R3K3 b Q - 0 1',
+    '4k3/8/8/2N1N3/8/2N1N3/8/4K3 w - - 0 1',              # Disambiguators
+    '4k3/8/8/8/R6R/8/8/R3K3 w - - 0 1',
+]
+
+SUFFIXES = ['', ' check', ' checkmate', ' stalemate']
+
+TEMPLATES: Dict[str, List[str]] = {
+    'castles_kingside': ['castles kingside'],
+    'castles_queenside': ['castles queenside'],
+    'castles': ['castles'],
+    'only_check': [''],
+    'piece_check': ['{piece}'],
+    'takes': ['takes'],
+    'file_takes': ['{from_file} takes'],
+    'takes_file': ['takes {to_file}'],
+    'takes_square': ['takes {to_file} {to_rank}'],
+    'takes_piece': ['takes {captured}'],
+    'piece_takes': ['{piece} takes'],
+    'piece_takes_piece': ['{piece} takes {captured}'],
+    'file_square': ['{from_file} {to_file} {to_rank}', '{from_file} takes {to_file} {to_rank}'],
+    'uci': ['{from_file} {from_rank} {to_file} {to_rank}'],
+    'file_file': ['{from_file} {to_file}', '{from_file} takes {to_file}'],
+    'square': ['{to_file} {to_rank}'],
+    'piece_from_square_takes_piece': ['{piece} {from_file} {from_rank} takes {captured}'],
+    'piece_from_square_square': ['{piece} {from_file} {from_rank} {to_file} {to_rank}',
+                                 '{piece} {from_file} {from_rank} takes {to_file} {to_rank}'],
+    'piece_file_takes_piece': ['{piece} {from_file} takes {captured}'],
+    'piece_file_square': ['{piece} {from_file} {to_file} {to_rank}', '{piece} {from_file} takes {to_file} {to_rank}'],
+    'piece_rank_takes_piece': ['{piece} {from_rank} takes {captured}'],
+    'piece_rank_square': ['{piece} {from_rank} {to_file} {to_rank}', '{piece} {from_rank} takes {to_file} {to_rank}'],
+    'piece_square': ['{piece} {to_file} {to_rank}', '{piece} takes {to_file} {to_rank}',
+                     '{piece} to {to_file} {to_rank}'],
+    'unparsed': ['{piece} {piece}', 'e 9', 'banana'],
+    'promotion': ['{to_file} {to_rank} equals {promotion}', '{to_file} {to_rank} {promotion}', '{to_file} {to_rank}',
+                  'takes {to_file} {to_rank} {promotion}', '{from_file} {to_file} {promotion}',
+                  'takes {captured} promotes {promotion}', 'takes {captured} {promotion}',
+                  'pawn takes {captured} {promotion}', '{promotion}', 'promote', 'promote {promotion}',
+                  'promote to {promotion}'],
+}
+'''Phrase templates for each ``case`` in ``phrase_to_move()``, filled in from the legal moves of each position.'''
+
+PAWN_CASES = {'file_takes', 'takes_file', 'file_square', 'file_file', 'square', 'promotion'}
+
+
+def sample_positions(n_games: int = 40, seed: int = 0) -> Iterator[chess.Board]:
+    rng = random.Random(seed)
+    for fen in SPECIAL_FENS:
+        yield chess.Board(fen)
+
+    for game in range(n_games):
+        board = chess.Board()
+        for san in OPENINGS[game % len(OPENINGS)].split():
+            board.push_san(san)
+        yield board.copy()
+
+        for ply in range(rng.randint(10, 80)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            forcing = [move for move in moves if board.is_capture(move) or board.gives_check(move)]
+            board.push(rng.choice(forcing) if forcing and rng.random() < 0.4 else rng.choice(moves))
+            if rng.random() < 0.15:
+                yield board.copy()
+        yield board.copy()
+
+
+def fill(template: str, board: chess.Board, move: chess.Move) -> str:
+    captured = board.piece_type_at(move.to_square) or chess.PAWN
+    return template.format(piece=chess.piece_name(board.piece_type_at(move.from_square)),
+                           captured=chess.piece_name(captured),
+                           from_file=chess.FILE_NAMES[chess.square_file(move.from_square)],
+                           from_rank=chess.RANK_NAMES[chess.square_rank(move.from_square)],
+                           to_file=chess.FILE_NAMES[chess.square_file(move.to_square)],
+                           to_rank=chess.RANK_NAMES[chess.square_rank(move.to_square)],
+                           promotion=chess.piece_name(move.promotion or chess.QUEEN))
+
+
+def outcome(phrase: str, board: chess.Board, raise_warnings: bool, index: Optional[MoveIndex] = None) -> Dict:
+    try:
+        return {'san': phrase_to_san(phrase, board, raise_warnings=raise_warnings, index=index)}
+    except Exception as e:
+        return {'error': type(e).__name__, 'message': str(e)}
+
+
+def build(path: str, per_arm: int, seed: int, arms: Optional[List[str]] = None, force: bool = False) -> int:
+    if os.path.exists(path) and not force:
+        print(f'{path} already exists; build to another --corpus (or pass --force to overwrite it)')
+        return 1
+    unknown = set(arms or ()) - set(TEMPLATES)
+    if unknown:
+        print(f'Unknown arms: {", ".join(sorted(unknown))} (known: {", ".join(TEMPLATES)})')
+        return 1
+
+    rng = random.Random(seed)
+    cases = defaultdict(set)
+    for board in sample_positions(seed=seed):
+        fen = board.fen()
+        moves = list(board.legal_moves)
+        for arm, templates in TEMPLATES.items():
+            if arms and arm not in arms:
+                continue
+            for template in templates:
+                # Mostly moves the template fits, so that most cases resolve, plus one that may not
+                fitting = moves
+                if arm in PAWN_CASES:
+                    fitting = [move for move in fitting if board.piece_type_at(move.from_square) == chess.PAWN]
+                if arm == 'promotion':
+                    fitting = [move for move in fitting if move.promotion]
+                if 'takes' in template:
+                    fitting = [move for move in fitting if board.is_capture(move)]
+                if arm == 'promotion':
+                    # Only positions with promotions, where every form of promotion phrase can be tried
+                    sampled = rng.sample(fitting, min(3, len(fitting)))
+                else:
+                    sampled = rng.sample(fitting, min(2, len(fitting))) + rng.sample(moves, min(1, len(moves)))
+                for move in sampled:
+                    for suffix in SUFFIXES:
+                        cases[arm].add((fen, (fill(template, board, move) + suffix).strip()))
+
+    n = 0
+    with open(path, 'w') as f:
+        for arm, pairs in cases.items():
+            pairs = sorted(pairs)
+            for fen, phrase in rng.sample(pairs, min(per_arm, len(pairs))):
+                board = chess.Board(fen)
+                f.write(json.dumps({'arm': arm, 'fen': fen, 'phrase': phrase,
+                                    'expected': outcome(phrase, board, False),
+                                    'expected_strict': outcome(phrase, board, True)}) + '\n')
+                n += 1
+    print(f'Wrote {n} cases to {path}')
+    return 0
+
+
+def load(path: str) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(path: str) -> int:
+    failures = 0
+    cases = load(path)
+    for case in cases:
+        board = chess.Board(case['fen'])
+        for key, raise_warnings in (('expected', False), ('expected_strict', True)):
+            got = outcome(case['phrase'], board, raise_warnings)
+            if got != case[key]:
+                failures += 1
+                print(f'[{case["arm"]}] {case["fen"]} "{case["phrase"]}" (raise_warnings={raise_warnings}): '
+                      f'expected {case[key]}, got {got}')
+    print(f'{len(cases) * 2 - failures}/{len(cases) * 2} results match')
+    return 1 if failures else 0
+
+
+def update(path: str) -> int:
+    """
+    Re-record the expected results of every case in the corpus, keeping the cases (and their order) as they are.
+    """
+    changed = 0
+    cases = load(path)
+    for case in cases:
+        board = chess.Board(case['fen'])
+        for key, raise_warnings in (('expected', False), ('expected_strict', True)):
+            got = outcome(case['phrase'], board, raise_warnings)
+            if got != case[key]:
+                changed += 1
+                print(f'[{case["arm"]}] {case["fen"]} "{case["phrase"]}" (raise_warnings={raise_warnings}): '
+                      f'{case[key]} -> {got}')
+                case[key] = got
+    with open(path, 'w') as f:
+        for case in cases:
+            f.write(json.dumps(case) + '\n')
+    print(f'{changed}/{len(cases) * 2} results changed')
+    return 0
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def timed(cases: List[Dict], repeat: int, reuse_index: bool) -> Tuple[Dict[str, List[float]], Dict[str, List[int]]]:
+    boards = {}
+    for case in cases:
+        if case['fen'] not in boards:
+            board = chess.Board(case['fen'])
+            boards[case['fen']] = (board, MoveIndex(board) if reuse_index else None)
+
+    seconds = defaultdict(list)
+    for _ in range(repeat):
+        for case in cases:
+            board, index = boards[case['fen']]
+            start = time.perf_counter()
+            outcome(case['phrase'], board, True, index)
+            seconds[case['arm']].append(time.perf_counter() - start)
+
+    allocated = defaultdict(list)
+    tracemalloc.start()
+    for case in cases:
+        board, index = boards[case['fen']]
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        outcome(case['phrase'], board, True, index)
+        allocated[case['arm']].append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return seconds, allocated
+
+
+def report(seconds: Dict[str, List[float]], allocated: Dict[str, List[int]]):
+    print(f'{"case":<32}{"n":>7}{"calls/s":>11}{"p50 us":>10}{"p99 us":>10}{"peak KiB":>10}')
+    rows = [(arm, seconds[arm], allocated[arm]) for arm in TEMPLATES if arm in seconds]
+    rows.append(('all', [s for samples in seconds.values() for s in samples],
+                 [a for samples in allocated.values() for a in samples]))
+    for arm, samples, allocs in rows:
+        print(f'{arm:<32}{len(samples):>7}{len(samples) / sum(samples):>11.0f}'
+              f'{percentile(samples, 0.5) * 1e6:>10.1f}{percentile(samples, 0.99) * 1e6:>10.1f}'
+              f'{statistics.mean(allocs) / 1024:>10.1f}')
+
+
+STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import chess
+chess_done = time.perf_counter()
+from phrase_to_san import phrase_to_san
+import_done = time.perf_counter()
+board = chess.Board()
+phrase_to_san('knight f 3', board)
+first_done = time.perf_counter()
+warm = []
+for phrase in ['knight f 3', 'e 4', 'castles', 'takes', 'bishop b 5'] * 20:
+    call_start = time.perf_counter()
+    try:
+        phrase_to_san(phrase, board)
+    except Exception:
+        pass
+    warm.append(time.perf_counter() - call_start)
+print(json.dumps({'chess_ms': (chess_done - start) * 1e3, 'import_ms': (import_done - chess_done) * 1e3,
+                  'first_call_ms': (first_done - import_done) * 1e3,
+                  'warm_call_ms': sorted(warm)[len(warm) // 2] * 1e3}))
+'''
+
+
+IMPORT_BUDGET_MS = 25.0
+'''Most that importing ``phrase_to_san`` (after ``chess``) may take in a fresh interpreter, by default.'''
+
+
+def time_startup(samples: int) -> List[Dict[str, float]]:
+    """
+    Run ``STARTUP_SCRIPT`` in ``samples`` fresh interpreters, and get the times (in ms) each one printed.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    return [json.loads(subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=here, check=True,
+                                      capture_output=True, text=True).stdout)
+            for _ in range(samples)]
+
+
+def startup(samples: int, import_budget_ms: float) -> int:
+    runs = time_startup(samples)
+    print(f'{"stage":<24}{"median ms":>11}{"max ms":>10}')
+    for key, label in (('chess_ms', 'import chess'), ('import_ms', 'import phrase_to_san'),
+                       ('first_call_ms', 'first call'), ('warm_call_ms', 'warm call')):
+        values = [run[key] for run in runs]
+        print(f'{label:<24}{statistics.median(values):>11.3f}{max(values):>10.3f}')
+
+    median_import = statistics.median(run['import_ms'] for run in runs)
+    if median_import > import_budget_ms:
+        print(f'Importing phrase_to_san took {median_import:.1f}ms, over the budget of {import_budget_ms}ms')
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build', 'check', 'update', 'run', 'startup'])
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--per-case', type=int, default=100, help='cases to keep for each match case (build)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--arms', nargs='+', help='only build cases for these match cases (build)')
+    parser.add_argument('--force', action='store_true', help='overwrite an existing corpus (build)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed passes over the corpus (run)')
+    parser.add_argument('--reuse-index', action='store_true', help='build one MoveIndex per position up front (run)')
+    parser.add_argument('--samples', type=int, default=10, help='fresh interpreters to time (startup)')
+    parser.add_argument('--import-budget-ms', type=float, default=IMPORT_BUDGET_MS,
+                        help='most that importing phrase_to_san (after chess) may take (startup)')
+    args = parser.parse_args(argv)
+
+    commands: Dict[str, Callable[[], Optional[int]]] = {
+        'build': lambda: build(args.corpus, args.per_case, args.seed, args.arms, args.force),
+        'check': lambda: check(args.corpus),
+        'update': lambda: update(args.corpus),
+        'run': lambda: report(*timed(load(args.corpus), args.repeat, args.reuse_index)),
+        'startup': lambda: startup(args.samples, args.import_budget_ms),
+    }
+    return commands[args.command]() or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+from typing import Callable, List, NamedTuple, Optional, Sequence, Union
+
+from grammar import FILES, GRAMMAR, RANKS
+from locales import Locale
+from move_index import MoveFeatures, MoveIndex
+from phrase_to_san import PIECE_TYPES, PhraseResult, parse_phrase, says_takes
+
+
+class ScoredCandidate(NamedTuple):
+    """
+    One of the moves an ambiguous phrase could mean, with what is needed to rank it and to
+    ``narrow()`` it down later without going back to the board.
+    """
+    move: MoveFeatures
+    san: str
+    score: float
+    check_agrees: bool
+    '''Whether the phrase said exactly the right one of "check"/"checkmate"/"stalemate" (or none of them).'''
+    capture_agrees: bool
+    '''Whether the phrase said "takes" if and only if the move is a capture.'''
+    conditions_met: int
+    '''
+    How many of the phrase's "check"/"checkmate"/"stalemate" the move satisfies (what ``get_only_move()``
+    narrows by).
+    '''
+    gives_check: bool
+    gives_mate: bool
+
+
+def rank_candidates(result: PhraseResult,
+                    index: MoveIndex,
+                    *,
+                    prior: Optional[Callable[[MoveFeatures], float]] = None) -> List[ScoredCandidate]:
+    """
+    Score each of the ``result``'s candidate moves (see ``resolve_phrase()``), and sort them from the most
+    to the least likely, keeping legal move order among equal scores. ``index`` must be the one the result
+    came from. ``prior`` can add a score of its own to each move (ex. from the moves the player usually makes).
+
+    The score counts one point each for agreeing with what the phrase said about check and about capturing,
+    one per "check"/"checkmate"/"stalemate" it satisfies, plus the prior.
+    """
+    query = result.query
+    takes = says_takes(query)
+    said = (query.says_check, query.says_mate, query.says_stalemate)
+
+    ranked = []
+    for move in result.candidates:
+        gives = (index.gives_check(move) and not index.gives_mate(move), index.gives_mate(move),
+                 index.gives_stalemate(move))
+        check_agrees = gives == said
+        capture_agrees = move.is_capture == takes
+        # Saying "check" is satisfied by a mate too, same as in ``resolve_phrase()``
+        conditions_met = (query.says_check and index.gives_check(move)) + (query.says_mate and gives[1]) \
+            + (query.says_stalemate and gives[2])
+        score = check_agrees + capture_agrees + conditions_met + (prior(move) if prior is not None else 0.0)
+        ranked.append(ScoredCandidate(move, index.san(move), float(score), check_agrees, capture_agrees,
+                                      conditions_met, index.gives_check(move), gives[1]))
+
+    ranked.sort(key=lambda candidate: -candidate.score)
+    return ranked
+
+
+def _fits(move: MoveFeatures, files: Sequence[str], ranks: Sequence[str], destination: bool) -> bool:
+    file, rank = (move.to_file, move.to_rank) if destination else (move.from_file, move.from_rank)
+    return all(FILES.index(f) == file for f in files) and all(RANKS.index(r) == rank for r in ranks)
+
+
+def narrow(candidates: Sequence[ScoredCandidate],
+           follow_up: str,
+           locale: Union[str, Locale, None] = None) -> List[ScoredCandidate]:
+    """
+    Keep the ``candidates`` (from ``rank_candidates()``) that fit a follow-up phrase that only says which
+    of them was meant, ex. "the one on b", "the b knight", "the one that takes the bishop", "the one to d 7"
+    or "check". Files and ranks name the square the piece moves from (or, if none fit or the follow-up says
+    "to", the square it moves to), pieces name the piece that moves (or the one it takes), and "takes" and
+    "check"/"checkmate" must hold for the move. Words the grammar doesn't know are ignored. The candidates
+    keep their order, so if several are left, the first is still the most likely.
+
+    The follow-up is read in ``locale`` (see ``locales``). Only English has a word for "to", since other
+    languages' are filler, so there the files and ranks are tried against the square moved from first.
+    """
+    parsed = parse_phrase(follow_up, locale)
+    classes = GRAMMAR.token_classes
+    files = [token for token in parsed.tokens if classes.get(token) == 'file']
+    ranks = [token for token in parsed.tokens if classes.get(token) == 'rank']
+    pieces = [PIECE_TYPES[token] for token in parsed.tokens if token in PIECE_TYPES]
+    says_takes = 'takes' in parsed.tokens
+
+    def fits_words(candidate: ScoredCandidate) -> bool:
+        move = candidate.move
+        return all(piece in (move.piece_type, move.captured_type) for piece in pieces) \
+            and (not says_takes or move.is_capture) \
+            and (not parsed.says_check or candidate.gives_check) \
+            and (not parsed.says_mate or candidate.gives_mate)
+
+    remaining = [candidate for candidate in candidates if fits_words(candidate)]
+    to_first = 'to' in parsed.tokens
+    for destination in (to_first, not to_first):
+        fitting = [candidate for candidate in remaining if _fits(candidate.move, files, ranks, destination)]
+        if fitting:
+            return fitting
+    return []
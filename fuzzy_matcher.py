@@ -0,0 +1,277 @@
+import functools
+import itertools
+import re
+import threading
+
+import chess
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+from grammar import FILES, GRAMMAR, RANKS, Grammar
+from locales import EN, Locale, get_locale
+from move_index import MoveIndex
+from phrase_to_san import PhraseResult, Status, resolve_phrase
+
+SUFFIX_WORDS = ('check', 'checkmate', 'stalemate')
+
+FILLER_WORDS = ('the', 'to', 'on', 'from', 'into', 'at', 'and', 'then')
+'''English words that the grammar skips, which are only ever read as themselves (ex. "to" is not a misheard "2").'''
+
+SPOKEN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'a': ('ay', 'eh'),
+    'b': ('bee', 'be'),
+    'c': ('see', 'sea', 'cee'),
+    'd': ('dee',),
+    'e': ('ee',),
+    'f': ('ef', 'eff'),
+    'g': ('gee', 'jee'),
+    'h': ('aitch', 'age'),
+    '1': ('one', 'won'),
+    '2': ('two', 'too'),
+    '3': ('three', 'tree', 'free'),
+    '4': ('four', 'for', 'fore'),
+    '5': ('five',),
+    '6': ('six',),
+    '7': ('seven',),
+    '8': ('eight', 'ate'),
+}
+'''How the single-character tokens are spoken, so that they can be matched by sound too.'''
+
+PHONETIC_RULES: List[Tuple[re.Pattern, str]] = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r'^kn|^gn|^wr', lambda m: m.group()[1]),
+    (r'gh', ''),
+    (r'ph', 'f'),
+    (r'ck', 'k'),
+    (r'tch', 'ch'),
+    (r'dg', 'j'),
+    (r'c(?=[eiy])', 's'),
+    (r'c', 'k'),
+    (r'q', 'k'),
+    (r'x', 'ks'),
+    (r'z', 's'),
+    (r'(?<=.)[aeiouyhw]', ''),
+    (r'(.)\1+', lambda m: m.group(1)),
+)]
+'''A rough, metaphone-like reduction of an English word to how it sounds, applied in order.'''
+
+
+def phonetic_key(word: str) -> str:
+    """
+    Get a key that words which sound alike tend to share, ex. "nite" and "knight" are both ``'nt'``.
+    """
+    key = word.lower()
+    for pattern, replacement in PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return key
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree over ``words``, for finding every word within some edit distance of another
+    without comparing it against the whole vocabulary.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.root: Optional[Tuple[str, Dict[int, tuple]]] = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """
+        Get ``(distance, word)`` for every word within ``max_distance`` of ``word``, closest first.
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+
+class FuzzyMatcher:
+    """
+    Maps words a ``locale`` doesn't know to the tokens they were most likely meant to be, by sound
+    (see ``phonetic_key()``) and then by spelling. For English, the vocabulary is every token of the
+    ``grammar``, "check"/"checkmate"/"stalemate", and the ``SPOKEN_ALIASES`` of files and ranks; for
+    other locales, it is the words of their ``Vocabulary`` and the files and ranks. Its phonetic keys
+    are indexed in a ``BKTree`` once, and each word's matches are cached. Filler words (``FILLER_WORDS``
+    for English) are known words that stand for nothing, so they are never matched to a token.
+
+    At most ``max_candidates`` tokens are returned per word. Keys of up to ``short_key_length`` characters
+    must match exactly (there are too many words one edit away from ``'b'``), and longer keys may be
+    up to ``max_distance`` edits away.
+    """
+
+    def __init__(self,
+                 grammar: Grammar = GRAMMAR,
+                 *,
+                 locale: Union[str, Locale, None] = None,
+                 max_candidates: int = 3,
+                 max_distance: int = 1,
+                 short_key_length: int = 2):
+        self.locale = get_locale(locale)
+        self.max_candidates = max_candidates
+        self.max_distance = max_distance
+        self.short_key_length = short_key_length
+
+        if self.locale.vocabulary is EN:
+            known = set(grammar.token_classes) | set(SUFFIX_WORDS)
+            spellings = [(spelling, token) for token in known for spelling in (token, *SPOKEN_ALIASES.get(token, ()))]
+            fillers = FILLER_WORDS
+        else:
+            known = set(self.locale.tokens) | set(FILES) | set(RANKS)
+            spellings = [(word, token) for word, token in self.locale.tokens.items() if token]
+            spellings += [(token, token) for token in FILES + RANKS]
+            fillers = self.locale.vocabulary.fillers
+
+        self.vocabulary: Set[str] = known | set(fillers)
+        '''The words the locale reads as they are, which are never replaced.'''
+        self.spellings: Dict[str, List[Tuple[str, str]]] = {}
+        '''Each phonetic key, and the ``(spelling, token)`` pairs that have it.'''
+        for spelling, token in spellings:
+            self.spellings.setdefault(phonetic_key(spelling), []).append((spelling, token))
+        self.tree = BKTree(self.spellings)
+        self.candidates = functools.lru_cache(maxsize=4096)(self._candidates)
+
+    def _candidates(self, word: str) -> Tuple[Tuple[int, str], ...]:
+        """
+        Get ``(cost, token)`` for the tokens ``word`` most likely stands for, cheapest first. The cost is
+        the edit distance between the phonetic keys, then between the spellings.
+        """
+        key = phonetic_key(word)
+        max_distance = 0 if len(key) <= self.short_key_length else self.max_distance
+        matches = sorted((key_distance, edit_distance(word, spelling), token)
+                         for key_distance, match in self.tree.search(key, max_distance)
+                         for spelling, token in self.spellings[match])
+
+        found: Dict[str, int] = {}
+        for key_distance, spelling_distance, token in matches:
+            if token not in found and len(found) < self.max_candidates:
+                found[token] = key_distance + spelling_distance
+        return tuple((cost, token) for token, cost in found.items())
+
+
+FUZZY_MATCHER = FuzzyMatcher()
+
+_MATCHERS: Dict[str, FuzzyMatcher] = {EN.name: FUZZY_MATCHER}
+_MATCHERS_LOCK = threading.Lock()
+
+
+def get_matcher(locale: Union[str, Locale, None] = None) -> FuzzyMatcher:
+    """
+    Get the ``FuzzyMatcher`` for ``locale`` (see ``locales.get_locale()``), building it on first use.
+    """
+    locale = get_locale(locale)
+    matcher = _MATCHERS.get(locale.name)
+    # A vocabulary registered again compiles to a new ``Locale``, which needs a new matcher
+    if matcher is None or matcher.locale is not locale:
+        with _MATCHERS_LOCK:
+            matcher = _MATCHERS.get(locale.name)
+            if matcher is None or matcher.locale is not locale:
+                matcher = _MATCHERS[locale.name] = FuzzyMatcher(locale=locale)
+    return matcher
+
+
+class FuzzyReading(NamedTuple):
+    phrase: str
+    '''The phrase with its unknown words replaced.'''
+    cost: int
+    '''The sum of the costs of the replacements (see ``FuzzyMatcher``).'''
+    result: PhraseResult
+
+
+def fuzzy_readings(phrase: str,
+                   board: chess.Board,
+                   *,
+                   index: Optional[MoveIndex] = None,
+                   matcher: Optional[FuzzyMatcher] = None,
+                   max_unknown: int = 4,
+                   max_readings: int = 64,
+                   locale: Union[str, Locale, None] = None) -> List[FuzzyReading]:
+    """
+    Read each word of ``phrase`` that ``locale`` doesn't know as either itself or one of the tokens it sounds like,
+    and keep the readings that resolve to a legal move on ``board``, cheapest first and one per move. At most
+    ``max_readings`` readings are tried, and phrases with more than ``max_unknown`` unknown words are not tried at
+    all. ``matcher`` defaults to the one for ``locale`` (see ``get_matcher()``).
+    """
+    if index is None:
+        index = MoveIndex(board)
+    if matcher is None:
+        matcher = get_matcher(locale)
+    locale = matcher.locale
+
+    words = locale.normalizer.normalize(phrase).lower().split()
+    options = []
+    for word in words:
+        if word in matcher.vocabulary:
+            options.append(((0, word),))
+        else:
+            options.append(((0, word), *((cost + 1, token) for cost, token in matcher.candidates(word))))
+    if sum(len(option) > 1 for option in options) > max_unknown:
+        return []
+
+    readings = sorted(itertools.product(*options), key=lambda reading: sum(cost for cost, _ in reading))
+    found = {}
+    for reading in readings[1:max_readings + 1]:
+        cost = sum(cost for cost, _ in reading)
+        # Already normalized, so only split into tokens: normalizing again could rewrite the tokens put in
+        text = ' '.join(token for _, token in reading)
+        result = resolve_phrase(' '.join(locale.split(text)), board, index=index)
+        if result.status is Status.RESOLVED and result.move.id not in found:
+            found[result.move.id] = FuzzyReading(text, cost, result)
+    return list(found.values())
+
+
+def resolve_fuzzy(phrase: str,
+                  board: chess.Board,
+                  *,
+                  index: Optional[MoveIndex] = None,
+                  matcher: Optional[FuzzyMatcher] = None,
+                  locale: Union[str, Locale, None] = None) -> PhraseResult:
+    """
+    Resolve ``phrase`` like ``resolve_phrase()``, and if that doesn't give a move, fall back to the cheapest of its
+    ``fuzzy_readings()``, as long as no other reading that costs as little gives a different move.
+    """
+    if index is None:
+        index = MoveIndex(board)
+    if matcher is None:
+        matcher = get_matcher(locale)
+
+    result = resolve_phrase(phrase, board, index=index, locale=matcher.locale)
+    if result.status is Status.RESOLVED:
+        return result
+
+    readings = fuzzy_readings(phrase, board, index=index, matcher=matcher)
+    if readings and (len(readings) == 1 or readings[1].cost > readings[0].cost):
+        return readings[0].result
+    return result
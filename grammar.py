@@ -0,0 +1,264 @@
+import chess
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+FILES = 'abcdefgh'
+RANKS = '12345678'
+
+TOKEN_CLASSES: Dict[str, str] = {
+    **{file: 'file' for file in FILES},
+    **{rank: 'rank' for rank in RANKS},
+    **{name: 'piece' for name in chess.PIECE_NAMES[1:6]},
+    'king': 'king',
+    'takes': 'takes',
+    'equals': 'equals',
+    'promote': 'equals',
+    'promotes': 'equals',
+    'castles': 'castles',
+    'kingside': 'side',
+    'queenside': 'side',
+}
+'''
+The class of each token the grammar knows about. Any other token is an ``'other'``. Kings get their own
+class since they can't be captured, promoted to or (for the purposes of "knight check") give check.
+'''
+
+PATTERN_CLASSES = {
+    'piece': {'piece', 'king'},
+    'captured': {'piece'},
+    'checking_piece': {'piece'},
+    'from_file': {'file'},
+    'to_file': {'file'},
+    'from_rank': {'rank'},
+    'to_rank': {'rank'},
+    'side': {'side'},
+    'takes': {'takes'},
+    'castles': {'castles'},
+}
+'''The token classes each name in a ``Rule`` pattern matches. ``*`` matches any number of tokens of any class.'''
+
+PATTERN_FIELDS = {'checking_piece': 'piece'}
+'''Names in ``Rule`` patterns that bind to a ``MoveQuery`` field with a different name.'''
+
+
+class Rule(NamedTuple):
+    """
+    One form a phrase can take. ``pattern`` names the tokens in order; the ones that are
+    ``MoveQuery`` fields get bound to it, and the tokens matched by a ``*`` become ``MoveQuery.extra``.
+    ``needs_suffix`` rules only match phrases that end in "check"/"checkmate"/"stalemate", and
+    ``needs_promotion`` rules only match phrases that say what to promote to (see ``split_promotion()``).
+    """
+    name: str
+    pattern: Tuple[str, ...]
+    needs_suffix: bool = False
+    needs_promotion: bool = False
+
+    def matches(self, says_any: bool, classes: Sequence[str], says_promotion: bool = False) -> bool:
+        if self.needs_suffix and not says_any:
+            return False
+        if self.needs_promotion and not says_promotion:
+            return False
+
+        if '*' in self.pattern:
+            star = self.pattern.index('*')
+            head, tail = self.pattern[:star], self.pattern[star + 1:]
+            if len(classes) < len(head) + len(tail):
+                return False
+            return all(cls in PATTERN_CLASSES[name] for name, cls in zip(head, classes)) \
+                and all(cls in PATTERN_CLASSES[name] for name, cls in zip(tail, classes[len(classes) - len(tail):]))
+
+        return len(classes) == len(self.pattern) \
+            and all(cls in PATTERN_CLASSES[name] for name, cls in zip(self.pattern, classes))
+
+
+RULES = [
+    Rule('castles_side', ('castles', 'side')),
+    Rule('castles', ('castles',)),
+    Rule('promotes', (), needs_promotion=True),
+    Rule('check', (), needs_suffix=True),
+    Rule('piece_check', ('checking_piece',), needs_suffix=True),
+    Rule('takes', ('takes',)),
+    Rule('file_takes', ('from_file', 'takes')),
+    Rule('takes_file', ('takes', 'to_file')),
+    Rule('takes_square', ('takes', 'to_file', 'to_rank')),
+    Rule('takes_piece', ('takes', 'captured')),
+    Rule('piece_takes', ('piece', 'takes')),
+    Rule('piece_takes_piece', ('piece', 'takes', 'captured')),
+    Rule('uci', ('from_file', 'from_rank', '*', 'to_file', 'to_rank')),
+    Rule('file_square', ('from_file', '*', 'to_file', 'to_rank')),
+    Rule('file_file', ('from_file', '*', 'to_file')),
+    Rule('square', ('to_file', 'to_rank')),
+    Rule('piece_from_square_takes_piece', ('piece', 'from_file', 'from_rank', 'takes', 'captured')),
+    Rule('piece_from_square_square', ('piece', 'from_file', 'from_rank', '*', 'to_file', 'to_rank')),
+    Rule('piece_file_takes_piece', ('piece', 'from_file', 'takes', 'captured')),
+    Rule('piece_file_square', ('piece', 'from_file', '*', 'to_file', 'to_rank')),
+    Rule('piece_rank_takes_piece', ('piece', 'from_rank', 'takes', 'captured')),
+    Rule('piece_rank_square', ('piece', 'from_rank', '*', 'to_file', 'to_rank')),
+    Rule('piece_square', ('piece', '*', 'to_file', 'to_rank')),
+]
+'''Every form of phrase, in priority order: a phrase takes the first rule it matches.'''
+
+
+class MoveQuery(NamedTuple):
+    """
+    What a phrase says about the move it describes, as parsed by ``parse_query()``. Each field holds
+    the token that gave it (ex. ``piece='knight'``, ``to_file='f'``), or ``None`` if the phrase doesn't
+    say. ``rule`` is the name of the ``Rule`` the phrase matched, or ``None`` if it matched none.
+    """
+    rule: Optional[str]
+    phrase: str
+    piece: Optional[str] = None
+    captured: Optional[str] = None
+    from_file: Optional[str] = None
+    from_rank: Optional[str] = None
+    to_file: Optional[str] = None
+    to_rank: Optional[str] = None
+    side: Optional[str] = None
+    promotion: Optional[str] = None
+    '''The piece to promote to, or ``''`` if the phrase says "equals"/"promote" without one.'''
+    extra: Tuple[str, ...] = ()
+    says_check: bool = False
+    says_mate: bool = False
+    says_stalemate: bool = False
+
+
+BLANK_QUERY = MoveQuery(None, '')
+EXTRA_FIELD = MoveQuery._fields.index('extra')
+PROMOTION_FIELD = MoveQuery._fields.index('promotion')
+
+
+PROMOTION_FILLERS = ('to', 'into')
+'''Words that can come between "equals"/"promote" and the piece (ex. "promote to queen").'''
+
+
+def split_promotion(tokens: Sequence[str], classes: Sequence[str], says_any: bool) -> Tuple[int, Optional[int]]:
+    """
+    Find the promotion at the end of a phrase made of ``tokens`` of the given ``classes``: "equals"/"promote"
+    and a piece (ex. "e 8 equals queen" or "promote to queen"), "equals"/"promote" alone, a piece right after a
+    square or file (ex. "takes f 8 queen") or after the piece taken (ex. "takes rook queen"), or just a piece
+    (ex. "queen", but not "queen check", which is a queen move).
+    Returns how many tokens it takes up, and the index of the piece it names (or ``None``).
+    """
+    n = len(classes)
+    if n >= 2 and classes[-1] in ('piece', 'king'):
+        if classes[-2] == 'equals':
+            return 2, n - 1
+        if n >= 3 and classes[-3] == 'equals' and tokens[-2] in PROMOTION_FILLERS:
+            return 3, n - 1
+    if n >= 1 and classes[-1] == 'equals':
+        return 1, None
+    if n >= 2 and classes[-2] == 'equals' and tokens[-1] in PROMOTION_FILLERS:
+        return 2, None
+    if n >= 2 and classes[-1] in ('piece', 'king') and classes[-2] in ('file', 'rank'):
+        return 1, n - 1
+    if n >= 3 and classes[-1] in ('piece', 'king') and classes[-2] == 'piece' and classes[-3] == 'takes':
+        return 1, n - 1
+    if n == 1 and classes[0] == 'piece' and not says_any:
+        return 1, 0
+    return 0, None
+
+
+class Grammar:
+    """
+    ``RULES`` compiled into a dispatch table from the token classes of a phrase (and whether it ends
+    in "check"/"checkmate"/"stalemate") to the first rule that matches them, so that parsing a phrase
+    is one pass over its tokens and one dict lookup, however many rules there are.
+
+    Each shape of phrase is added to the table the first time it is seen (up to ``max_signature_length``
+    tokens). With ``prefill`` (or after calling ``prefill()``), the table is also filled ahead of time for
+    every rule, with ``*`` matching nothing or "takes", so the common shapes never miss.
+    """
+
+    def __init__(self,
+                 rules: Sequence[Rule] = RULES,
+                 token_classes: Dict[str, str] = TOKEN_CLASSES,
+                 max_signature_length: int = 8,
+                 *,
+                 prefill: bool = True):
+        self.rules = list(rules)
+        self.token_classes = dict(token_classes)
+        self.max_signature_length = max_signature_length
+
+        self._table: Dict[Tuple[bool, bool, Tuple[str, ...]], Optional[Rule]] = {}
+        self._bindings: Dict[str, Tuple[List[Tuple[int, int]], Optional[int]]] = {}
+        for rule in self.rules:
+            self._bindings[rule.name] = self._compile_bindings(rule.pattern)
+        if prefill:
+            self.prefill()
+
+    def prefill(self):
+        """
+        Add the shapes of phrase every rule matches to the table.
+        """
+        for rule in self.rules:
+            for says_any in (False, True):
+                for says_promotion in (False, True):
+                    for star in ((), ('takes',)):
+                        names = [name for part in rule.pattern for name in (star if part == '*' else (part,))]
+                        for classes in self._expand(names):
+                            self.lookup(says_any, classes, says_promotion)
+
+    @staticmethod
+    def _compile_bindings(pattern: Tuple[str, ...]) -> Tuple[List[Tuple[int, int]], Optional[int]]:
+        """
+        Get the (``MoveQuery`` field index, token index) pairs that ``pattern`` binds, where tokens after
+        the ``*`` are indexed from the end of the phrase, and where the ``*`` is (or ``None``).
+        """
+        star = pattern.index('*') if '*' in pattern else None
+        bindings = []
+        for i, name in enumerate(pattern):
+            field = PATTERN_FIELDS.get(name, name)
+            if field in MoveQuery._fields:
+                bindings.append((MoveQuery._fields.index(field), i if star is None or i < star else i - len(pattern)))
+        return bindings, star
+
+    @staticmethod
+    def _expand(names: List[str]) -> List[Tuple[str, ...]]:
+        expanded = [()]
+        for name in names:
+            expanded = [classes + (cls,) for classes in expanded for cls in sorted(PATTERN_CLASSES[name])]
+        return expanded
+
+    def lookup(self, says_any: bool, classes: Tuple[str, ...], says_promotion: bool = False) -> Optional[Rule]:
+        """
+        Get the first rule that matches a phrase made of tokens of the given ``classes``
+        (not counting its promotion, see ``split_promotion()``).
+        """
+        key = (says_any, says_promotion, classes)
+        rule = self._table.get(key)
+        if rule is None and key not in self._table:
+            rule = next((rule for rule in self.rules if rule.matches(says_any, classes, says_promotion)), None)
+            if len(classes) <= self.max_signature_length:
+                self._table[key] = rule
+        return rule
+
+    def parse(self, phrase: str, tokens: Sequence[str], says_check: bool, says_mate: bool,
+              says_stalemate: bool) -> MoveQuery:
+        get = self.token_classes.get
+        says_any = says_check or says_mate or says_stalemate
+        classes = tuple([get(token, 'other') for token in tokens])
+        promotion = None
+        if classes and (classes[-1] in ('equals', 'piece', 'king') or tokens[-1] in PROMOTION_FILLERS):
+            length, piece = split_promotion(tokens, classes, says_any)
+            if length:
+                promotion = tokens[piece] if piece is not None else ''
+                tokens, classes = tokens[:len(tokens) - length], classes[:len(classes) - length]
+
+        rule = self.lookup(says_any, classes, promotion is not None)
+        if rule is None:
+            return MoveQuery(None, phrase, says_check=says_check, says_mate=says_mate, says_stalemate=says_stalemate)
+
+        bindings, star = self._bindings[rule.name]
+        fields = list(BLANK_QUERY)
+        fields[:2] = rule.name, phrase
+        fields[-3:] = says_check, says_mate, says_stalemate
+        fields[PROMOTION_FIELD] = promotion
+        for field, i in bindings:
+            fields[field] = tokens[i]
+        if star is not None:
+            fields[EXTRA_FIELD] = tuple(tokens[star:len(tokens) - len(rule.pattern) + star + 1])
+        return MoveQuery._make(fields)
+
+
+GRAMMAR = Grammar(prefill=False)
+'''The grammar ``phrase_to_san()`` uses. It fills its table as phrases come in, so importing it is cheap.'''
@@ -0,0 +1,109 @@
+"""
+Optional hooks into ``resolve_phrase()`` (and so ``phrase_to_san()``), for finding out where slow phrases
+spend their time. Nothing is measured unless a hook is registered:
+
+    stats = ResolveStats()
+    add_hook(stats)
+    ...
+    print(stats.as_dict())
+    remove_hook(stats)
+
+Each hook is called with a ``ResolveTrace`` after every phrase is resolved, in the thread that resolved it.
+"""
+import threading
+
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+STAGES = ('index', 'normalize', 'tokenize', 'grammar', 'resolve', 'warnings')
+'''
+The stages timed for each phrase: building the ``MoveIndex`` (if one wasn't passed in), normalizing and
+tokenizing the phrase, matching it to a grammar rule, finding its candidate moves, and working out its SAN and warnings.
+'''
+
+COUNTS = ('moves_generated', 'candidates', 'conditions', 'check_probes', 'reply_probes', 'board_pushes')
+'''
+The counters kept for each phrase: legal moves generated for a new ``MoveIndex``, candidate moves the rule
+selected, "check"/"checkmate"/"stalemate" conditions evaluated to narrow the candidates down, moves whose
+check flag was computed (python-chess pushes and pops each one), moves whose opponent replies were generated
+for checkmate/stalemate (another push and pop each), and the total of the last two.
+'''
+
+
+class ResolveTrace(NamedTuple):
+    phrase: str
+    rule: Optional[str]
+    '''The name of the grammar rule the phrase matched, or ``None``.'''
+    status: str
+    '''The ``Status`` value of the result, ex. ``'resolved'``.'''
+    error: Optional[str]
+    '''The name of the error class, if the phrase didn't resolve.'''
+    seconds: Dict[str, float]
+    '''Seconds spent in each of the ``STAGES``.'''
+    counts: Dict[str, int]
+    '''Each of the ``COUNTS``.'''
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+
+HOOKS: List[Callable[[ResolveTrace], None]] = []
+'''The registered hooks. ``resolve_phrase()`` only times anything while this is not empty.'''
+
+
+def add_hook(hook: Callable[[ResolveTrace], None]):
+    if hook not in HOOKS:
+        HOOKS.append(hook)
+
+
+def remove_hook(hook: Callable[[ResolveTrace], None]):
+    if hook in HOOKS:
+        HOOKS.remove(hook)
+
+
+class ResolveStats:
+    """
+    A hook that adds up ``ResolveTrace``s: time per stage, counters, and how often each rule, status
+    and error came up. ``as_dict()`` gives flat totals that can be handed to a metrics system.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.counts: Dict[str, int] = dict.fromkeys(COUNTS, 0)
+        self.rules: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.max_seconds = 0.0
+        self.slowest: Optional[ResolveTrace] = None
+
+    def __call__(self, trace: ResolveTrace):
+        with self._lock:
+            self.calls += 1
+            for stage, seconds in trace.seconds.items():
+                self.seconds[stage] += seconds
+            for name, count in trace.counts.items():
+                self.counts[name] += count
+            self.rules[trace.rule or 'none'] += 1
+            self.statuses[trace.status] += 1
+            if trace.error is not None:
+                self.errors[trace.error] += 1
+            total = trace.total_seconds
+            if total > self.max_seconds:
+                self.max_seconds = total
+                self.slowest = trace
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            stats = {'calls': self.calls, 'total_seconds': sum(self.seconds.values()), 'max_seconds': self.max_seconds}
+            stats.update({f'seconds.{stage}': seconds for stage, seconds in self.seconds.items()})
+            stats.update({f'count.{name}': count for name, count in self.counts.items()})
+            stats.update({f'rule.{rule}': n for rule, n in self.rules.items()})
+            stats.update({f'status.{status}': n for status, n in self.statuses.items()})
+            stats.update({f'error.{error}': n for error, n in self.errors.items()})
+            return stats
@@ -0,0 +1,177 @@
+"""
+Vocabularies for dictating moves in other languages than English.
+
+A ``Vocabulary`` says how a language names the pieces, the action words ("takes", "castles", "check", ...), the
+ranks and files, and which words are filler, plus regex replacements for homophones and multi-word phrases. It
+is compiled once per process into a ``Locale``: a ``Normalizer`` for the replacements, and a table from each
+word to the English token the grammar knows it by (ex. ``'springer' -> 'knight'``). Phrases are normalized and
+their words translated with one dict lookup each, then parsed by the same ``GRAMMAR`` as English, so any number
+of locales can be used side by side without copies of the grammar or the rest of the pipeline:
+
+    phrase_to_san('Springer f drei', board, locale='de')  # 'Nf3'
+
+Error and warning messages stay in English.
+"""
+import threading
+
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from grammar import FILES, RANKS, TOKEN_CLASSES
+from normalizer import Normalizer
+from stt_replacements import REPLACEMENTS
+
+SUFFIX_TOKENS = ('check', 'checkmate', 'stalemate')
+
+TOKENS = frozenset(TOKEN_CLASSES) | frozenset(SUFFIX_TOKENS)
+'''The English tokens a vocabulary's words can stand for.'''
+
+
+class Vocabulary(NamedTuple):
+    """
+    The words of one language. Each of ``pieces``, ``words``, ``numbers`` and ``letters`` maps a (lower case)
+    spoken word to the token it stands for (ex. ``'caballo': 'knight'``, ``'tres': '3'``, ``'efe': 'f'``), and
+    ``fillers`` are words to drop. ``replacements`` are applied first, like ``stt_replacements.REPLACEMENTS``,
+    for homophones and phrases of more than one word; they match regardless of case.
+    """
+    name: str
+    pieces: Dict[str, str] = {}
+    words: Dict[str, str] = {}
+    '''Action words: "takes", "castles", "kingside"/"queenside", "equals", "check"/"checkmate"/"stalemate".'''
+    numbers: Dict[str, str] = {}
+    letters: Dict[str, str] = {}
+    fillers: Tuple[str, ...] = ()
+    replacements: Dict[str, str] = {}
+
+
+EN = Vocabulary('en', replacements=REPLACEMENTS)
+'''English: the grammar's own tokens, and ``stt_replacements.REPLACEMENTS``.'''
+
+_ES_FILE = r'(?:[a-h]|be|ce|de|efe|ge|hache)'
+'''A file as said in Spanish (the letters of ``ES``), for its replacements to look ahead for a square.'''
+
+ES = Vocabulary(
+    'es',
+    pieces={'peón': 'pawn', 'peon': 'pawn', 'caballo': 'knight', 'alfil': 'bishop', 'torre': 'rook', 'dama': 'queen',
+            'reina': 'queen', 'rey': 'king'},
+    words={'come': 'takes', 'captura': 'takes', 'toma': 'takes', 'x': 'takes', 'enroque': 'castles',
+           'enroca': 'castles', 'corto': 'kingside', 'largo': 'queenside', 'corona': 'equals', 'promueve': 'equals',
+           'promociona': 'equals', 'igual': 'equals', 'jaque': 'check', 'mate': 'checkmate', 'jaquemate': 'checkmate',
+           'ahogado': 'stalemate'},
+    numbers={'uno': '1', 'dos': '2', 'tres': '3', 'cuatro': '4', 'cinco': '5', 'seis': '6', 'siete': '7', 'ocho': '8'},
+    letters={'be': 'b', 'ce': 'c', 'de': 'd', 'efe': 'f', 'ge': 'g', 'hache': 'h'},
+    fillers=('en', 'al', 'el', 'la', 'hacia', 'casilla'),
+    replacements={
+        r'\bjaque\s+mate\b': 'mate',
+        r'\benroque\s+(?:a\s+)?(?:la\s+)?(?:del\s+)?rey\b': 'enroque corto',
+        r'\benroque\s+(?:a\s+)?(?:la\s+)?(?:de\s+)?(?:la\s+)?dama\b': 'enroque largo',
+        # "caballo de ge uno a efe tres": "de" (from) before a square that is followed by another one, but not the
+        # file in "peón de cuatro" or "torre de a uno"
+        rf'\bde\s+(?={_ES_FILE}\s+\w+\s+(?:a\s+)?{_ES_FILE}\s+\w)': '',
+        # "alfil a ce cuatro": "a" (to) before a square, but not the file in "a cuatro" or "a a cuatro"
+        rf'\ba\s+(?={_ES_FILE}\s+\w)': '',
+    },
+)
+
+DE = Vocabulary(
+    'de',
+    pieces={'bauer': 'pawn', 'springer': 'knight', 'pferd': 'knight', 'läufer': 'bishop', 'laeufer': 'bishop',
+            'laufer': 'bishop', 'turm': 'rook', 'dame': 'queen', 'königin': 'queen', 'koenigin': 'queen',
+            'könig': 'king', 'koenig': 'king', 'konig': 'king'},
+    words={'schlägt': 'takes', 'schlaegt': 'takes', 'schlagt': 'takes', 'nimmt': 'takes', 'x': 'takes',
+           'rochade': 'castles', 'rochiert': 'castles', 'kurz': 'kingside', 'lang': 'queenside', 'wird': 'equals',
+           'umwandlung': 'equals', 'verwandelt': 'equals', 'schach': 'check', 'matt': 'checkmate',
+           'schachmatt': 'checkmate', 'patt': 'stalemate'},
+    numbers={'eins': '1', 'zwei': '2', 'zwo': '2', 'drei': '3', 'vier': '4', 'fünf': '5', 'fuenf': '5',
+             'sechs': '6', 'sieben': '7', 'acht': '8'},
+    letters={'ah': 'a', 'beh': 'b', 'be': 'b', 'zeh': 'c', 'ce': 'c', 'deh': 'd', 'de': 'd', 'eh': 'e', 'eff': 'f',
+             'ef': 'f', 'geh': 'g', 'ge': 'g', 'hah': 'h', 'ha': 'h'},
+    fillers=('auf', 'nach', 'von', 'zu', 'feld', 'in', 'eine', 'einen', 'zur'),
+    replacements={
+        r'\bschach\s*matt\b': 'matt',
+        r'\b(?:kurze|kleine)\s+rochade\b': 'rochade kurz',
+        r'\b(?:lange|große|grosse)\s+rochade\b': 'rochade lang',
+    },
+)
+
+VOCABULARIES: Dict[str, Vocabulary] = {vocabulary.name: vocabulary for vocabulary in (EN, ES, DE)}
+'''Every vocabulary ``get_locale()`` knows about; see ``register_vocabulary()``.'''
+
+
+class Locale:
+    """
+    A ``Vocabulary`` compiled for parsing phrases (see the module docstring). Compiling checks that every word
+    stands for a token the grammar knows, and raises ``ValueError`` otherwise.
+    """
+
+    def __init__(self, vocabulary: Vocabulary):
+        self.name = vocabulary.name
+        self.vocabulary = vocabulary
+        # English patterns are written the way ``stt_replacements`` has always had them, so they are left alone
+        replacements = vocabulary.replacements if vocabulary is EN else \
+            {f'(?i:{pattern})': replacement for pattern, replacement in vocabulary.replacements.items()}
+        self.normalizer = Normalizer(replacements)
+
+        self.tokens: Dict[str, str] = {}
+        '''Each word of the vocabulary, and the token it stands for (``''`` for filler).'''
+        for table, allowed in ((vocabulary.pieces, TOKENS), (vocabulary.words, TOKENS),
+                               (vocabulary.numbers, RANKS), (vocabulary.letters, FILES)):
+            for word, token in table.items():
+                if token not in allowed:
+                    raise ValueError(f'{self.name}: {word!r} stands for {token!r}, '
+                                     'which is not a token the grammar knows')
+                self.tokens[word.lower()] = token
+        self.tokens.update(dict.fromkeys(vocabulary.fillers, ''))
+
+    def tokenize(self, phrase: str) -> Tuple[str, List[str]]:
+        """
+        Normalize ``phrase`` and split it into the grammar's tokens. Returns the normalized phrase and the tokens.
+        """
+        phrase = self.normalizer.normalize(phrase)
+        return phrase, self.split(phrase)
+
+    def split(self, phrase: str) -> List[str]:
+        """
+        Split an already normalized ``phrase`` into the grammar's tokens.
+        """
+        words = phrase.lower().split()
+        if not self.tokens:
+            return words
+        get = self.tokens.get
+        return [token for token in (get(word, word) for word in words) if token]
+
+    def __repr__(self) -> str:
+        return f'<Locale {self.name!r}>'
+
+
+_LOCALES: Dict[str, Locale] = {}
+_LOCK = threading.Lock()
+
+
+def register_vocabulary(vocabulary: Vocabulary):
+    """
+    Add (or replace) a vocabulary, to be compiled the first time ``get_locale()`` asks for it.
+    """
+    with _LOCK:
+        VOCABULARIES[vocabulary.name] = vocabulary
+        _LOCALES.pop(vocabulary.name, None)
+
+
+def get_locale(locale: Union[str, Locale, None] = None) -> Locale:
+    """
+    Get the compiled ``Locale`` named ``locale`` (English if ``None``), compiling it on first use. Each locale
+    is compiled once per process, however many threads and requests use it. Raises ``ValueError`` for a name
+    with no vocabulary.
+    """
+    if isinstance(locale, Locale):
+        return locale
+    name = locale or EN.name
+    compiled = _LOCALES.get(name)
+    if compiled is None:
+        with _LOCK:
+            compiled = _LOCALES.get(name)
+            if compiled is None:
+                vocabulary = VOCABULARIES.get(name)
+                if vocabulary is None:
+                    raise ValueError(f'Unknown locale: {name!r} (known: {", ".join(sorted(VOCABULARIES))})')
+                compiled = _LOCALES[name] = Locale(vocabulary)
+    return compiled
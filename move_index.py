@@ -0,0 +1,253 @@
+import threading
+
+import chess
+
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from position import Position, as_board
+
+
+class MoveFeatures(NamedTuple):
+    """
+    Compact facts about a single legal move, computed once when a ``MoveIndex`` is built.
+    ``id`` is the position of the move in ``MoveIndex.moves``.
+    """
+    id: int
+    move: chess.Move
+    piece_type: chess.PieceType
+    captured_type: Optional[chess.PieceType]
+    from_square: chess.Square
+    to_square: chess.Square
+    from_file: int
+    from_rank: int
+    to_file: int
+    to_rank: int
+    promotion: Optional[chess.PieceType]
+    is_capture: bool
+    is_castling: bool
+
+
+def mask_ids(mask: int) -> Iterator[int]:
+    """
+    Iterate over the ids of the moves in a ``MoveIndex`` mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class MoveIndex:
+    """
+    Legal moves of one position, generated once and stored as ``MoveFeatures``, along with
+    inverted indexes from feature values to the moves that have them, so that finding the moves
+    that match a phrase is a few bitwise ands instead of a scan over ``board.legal_moves``.
+    The moves matching a feature value are kept as a mask, an int with bit ``id`` set for each
+    of them, so any combination of features is one ``&`` per feature however many moves there are.
+    Each inverted index (ex. ``piece_type -> mask``) is built the first time a lookup needs it.
+
+    Check, checkmate and stalemate flags and SAN strings are computed lazily and cached, since
+    most phrases never need them, so each is worked out at most once per move however many phrases,
+    conditions and warning checks ask for it. The index keeps its own copy of the board (or builds one from a
+    ``Position``), so it stays valid for the position it was built from even if the caller's board moves on.
+
+    Nothing ever moves ``index.board``: the moves needed for check and reply probes are played on a copy of it
+    that each thread makes the first time it probes. So one index can be used from several threads at once.
+    """
+
+    def __init__(self, board: Union[chess.Board, Position]):
+        self.board = as_board(board)
+        self._probes = threading.local()
+        self.moves: List[MoveFeatures] = []
+
+        make = MoveFeatures._make
+        piece_type_at = self.board.piece_type_at
+        is_castling = self.board.is_castling
+        theirs = self.board.occupied_co[not self.board.turn]
+        ep_square = self.board.ep_square
+        promotion_mask = 0
+        for i, move in enumerate(self.board.generate_legal_moves()):
+            from_square, to_square = move.from_square, move.to_square
+            from_file, to_file = from_square & 7, to_square & 7
+            piece_type = piece_type_at(from_square)
+
+            captured_type = None
+            if chess.BB_SQUARES[to_square] & theirs:
+                captured_type = piece_type_at(to_square)
+            elif piece_type == chess.PAWN and to_square == ep_square and from_file != to_file:
+                captured_type = chess.PAWN
+
+            if move.promotion:
+                promotion_mask |= 1 << i
+            self.moves.append(make((i, move, piece_type, captured_type, from_square, to_square,
+                                    from_file, from_square >> 3, to_file, to_square >> 3,
+                                    move.promotion, captured_type is not None,
+                                    piece_type == chess.KING and is_castling(move))))
+
+        self.all_mask = (1 << len(self.moves)) - 1
+        self._tables: Dict[str, Dict[object, int]] = {}
+        self.promotion_mask = promotion_mask
+        '''The moves that are promotions (``0`` in most positions, so checking for them costs nothing).'''
+        self._san: List[Optional[str]] = [None] * len(self.moves)
+        self._gives_check: List[Optional[bool]] = [None] * len(self.moves)
+        self._has_reply: List[Optional[bool]] = [None] * len(self.moves)
+        self._checking_moves: Optional[List[MoveFeatures]] = None
+        self._disambiguators: Optional[List[Tuple[bool, bool, bool, bool]]] = None
+
+    def mask_where(self, feature: str, value: object) -> int:
+        """
+        Get the mask of the moves whose ``feature`` (a ``MoveFeatures`` field name) equals ``value``.
+        """
+        table = self._tables.get(feature)
+        if table is None:
+            field = MoveFeatures._fields.index(feature)
+            table = {}
+            get = table.get
+            for features in self.moves:
+                key = features[field]
+                table[key] = get(key, 0) | 1 << features.id
+            # Only published once it is complete, since other threads may be looking it up
+            self._tables[feature] = table
+        return table.get(value, 0)
+
+    def mask(self, **features: object) -> int:
+        """
+        Get the mask of the moves that have all of the given ``MoveFeatures`` values (see ``select()``).
+        """
+        mask = self.all_mask
+        for feature, value in features.items():
+            mask &= self.mask_where(feature, value)
+            if not mask:
+                break
+        return mask
+
+    def moves_in(self, mask: int) -> List[MoveFeatures]:
+        """
+        Get the moves in ``mask``, in legal move order.
+        """
+        moves = self.moves
+        return [moves[i] for i in mask_ids(mask)]
+
+    def select(self, **features: object) -> List[MoveFeatures]:
+        """
+        Get the moves (in legal move order) that have all of the given ``MoveFeatures`` values,
+        ex. ``index.select(piece_type=chess.KNIGHT, is_capture=True)``. Passing ``promotion=None``
+        keeps only moves that are not promotions.
+        """
+        return self.moves_in(self.mask(**features))
+
+    def promotions(self, piece_type: Optional[chess.PieceType] = None) -> List[MoveFeatures]:
+        """
+        Get the promotions (to ``piece_type``, or to any piece), in legal move order.
+        """
+        if piece_type is None:
+            return self.moves_in(self.promotion_mask)
+        return self.moves_in(self.mask_where('promotion', piece_type))
+
+    def castles(self, *, kingside: bool = True, queenside: bool = True) -> List[MoveFeatures]:
+        return [features for features in self.select(is_castling=True)
+                if (kingside and features.to_file > features.from_file)
+                or (queenside and features.to_file < features.from_file)]
+
+    def disambiguator(self, features: MoveFeatures) -> Tuple[bool, bool]:
+        """
+        Whether the SAN of the move needs the file and the rank it moves from, as in ``Nbd7`` or ``R1a3``
+        (pawn captures always need the file). Worked out for every move at once, the first time it is needed.
+        """
+        return self._disambiguation()[features.id][:2]
+
+    def disambiguates(self, features: MoveFeatures) -> Tuple[bool, bool]:
+        """
+        Whether the file the move is from, and the rank it is from, would each be enough on their own to tell it
+        apart from the moves of other pieces of the same type to the same square (ex. both for ``Rad1`` when the
+        other rook is on ``d8``, though SAN only uses the file).
+        """
+        return self._disambiguation()[features.id][2:]
+
+    def _disambiguation(self) -> List[Tuple[bool, bool, bool, bool]]:
+        if self._disambiguators is None:
+            rivals: Dict[Tuple[chess.PieceType, chess.Square], int] = {}
+            for move in self.moves:
+                key = (move.piece_type, move.to_square)
+                rivals[key] = rivals.get(key, 0) | chess.BB_SQUARES[move.from_square]
+
+            disambiguators = []
+            for move in self.moves:
+                others = rivals[move.piece_type, move.to_square] & ~chess.BB_SQUARES[move.from_square]
+                same_file = bool(others & chess.BB_FILES[move.from_file])
+                same_rank = bool(others & chess.BB_RANKS[move.from_rank])
+                if move.piece_type == chess.PAWN or move.is_castling:
+                    needs = (move.piece_type == chess.PAWN and move.is_capture, False)
+                else:
+                    # Same as ``board.san()``: the file if it tells the pieces apart, otherwise the rank, otherwise both
+                    needs = (bool(others) and (same_rank or not same_file), same_file)
+                disambiguators.append(needs + (not same_file, not same_rank))
+            self._disambiguators = disambiguators
+        return self._disambiguators
+
+    def san(self, features: MoveFeatures) -> str:
+        san = self._san[features.id]
+        if san is None:
+            # Same as ``board.san()``, but the check/checkmate suffix comes from the cached
+            # flags instead of pushing the move again to look ahead
+            san = self.board._algebraic_without_suffix(features.move)
+            if self.gives_mate(features):
+                san += '#'
+            elif self.gives_check(features):
+                san += '+'
+            self._san[features.id] = san
+        return san
+
+    def probe_board(self) -> chess.Board:
+        """
+        Get this thread's own copy of ``board``, to play moves on.
+        """
+        board = getattr(self._probes, 'board', None)
+        if board is None:
+            board = self._probes.board = self.board.copy(stack=False)
+        return board
+
+    def gives_check(self, features: MoveFeatures) -> bool:
+        flag = self._gives_check[features.id]
+        if flag is None:
+            flag = self._gives_check[features.id] = self.probe_board().gives_check(features.move)
+        return flag
+
+    def has_reply(self, features: MoveFeatures) -> bool:
+        """
+        Whether the opponent has any legal move after ``features`` is played. This is the expensive
+        part of telling checkmate and stalemate apart from a plain (non-)check, since it generates the
+        opponent's moves, so ``gives_mate()`` only needs it for checks and ``gives_stalemate()`` only
+        for non-checks.
+        """
+        flag = self._has_reply[features.id]
+        if flag is None:
+            board = self.probe_board()
+            board.push(features.move)
+            try:
+                flag = self._has_reply[features.id] = any(board.generate_legal_moves())
+            finally:
+                board.pop()
+        return flag
+
+    def gives_mate(self, features: MoveFeatures) -> bool:
+        return self.gives_check(features) and not self.has_reply(features)
+
+    def gives_stalemate(self, features: MoveFeatures) -> bool:
+        return not self.gives_check(features) and not self.has_reply(features)
+
+    def probe_counts(self) -> Tuple[int, int]:
+        """
+        How many moves have had their check flag and their opponent's replies worked out so far
+        (each took a push and pop of the board).
+        """
+        return (len(self._gives_check) - self._gives_check.count(None),
+                len(self._has_reply) - self._has_reply.count(None))
+
+    def checking_moves(self) -> List[MoveFeatures]:
+        """
+        Get the moves that give check, computing the check flag of every move on first use.
+        """
+        if self._checking_moves is None:
+            self._checking_moves = [features for features in self.moves if self.gives_check(features)]
+        return self._checking_moves
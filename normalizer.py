@@ -0,0 +1,90 @@
+import re
+import time
+
+from typing import List, Mapping, Optional
+
+
+class Normalizer:
+    """
+    Applies an ordered table of ``pattern -> replacement`` substitutions (see ``stt_replacements``)
+    to a spoken phrase in a single pass.
+
+    All patterns are compiled once into one alternation regex whose alternatives are tried in table
+    order at each position of the phrase, so a phrase that needs no replacements costs one regex scan.
+    Only when something matches is the table consulted, to find the first pattern that matches there.
+    As long as matches of different patterns don't overlap or feed into each other, this gives the
+    same output as applying each substitution one after the other.
+
+    The regexes are compiled on the first call to ``normalize()`` (or ``compile()``), not when the
+    normalizer is made, so that importing a module that makes one stays cheap. The pattern each
+    replacement came from is only compiled once some phrase needs it.
+
+    The time spent in the most recent call to ``normalize()`` is kept in ``last_seconds``, and
+    running totals are kept in ``calls`` and ``total_seconds``.
+    """
+
+    def __init__(self, replacements: Mapping[str, str]):
+        self.replacements = dict(replacements)
+        self._patterns = list(self.replacements)
+        self._rules: List[Optional[re.Pattern]] = [None] * len(self._patterns)
+        self._regex: Optional[re.Pattern] = None
+        self._compiled = False
+
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def compile(self):
+        """
+        Compile the regex that finds every replacement (ex. to warm up before the first phrase).
+        Raises ``ValueError`` if a pattern has capturing groups.
+        """
+        if self._compiled:
+            return
+        if self._patterns:
+            # Capturing groups around each alternative would stop ``re`` from skipping ahead to
+            # positions where some pattern can start, which makes the scan ~100x slower
+            regex = re.compile('|'.join(f'(?:{pattern})' for pattern in self._patterns))
+            if regex.groups:
+                pattern = next(pattern for pattern in self._patterns if re.compile(pattern).groups)
+                raise ValueError(f'Replacement pattern must not contain capturing groups: {pattern!r}')
+            self._regex = regex
+        self._compiled = True
+
+    def _replace(self, match: re.Match) -> str:
+        string, start = match.string, match.start()
+        for i, pattern in enumerate(self._patterns):
+            rule = self._rules[i]
+            if rule is None:
+                rule = self._rules[i] = re.compile(pattern)
+            if rule.match(string, start):
+                return self.replacements[pattern]
+        raise AssertionError('Internal error: no replacement pattern matched')
+
+    def normalize(self, phrase: str) -> str:
+        """
+        Return ``phrase`` with every replacement applied.
+        """
+        start = time.perf_counter()
+        if not self._compiled:
+            self.compile()
+        if self._regex is not None:
+            phrase = self._regex.sub(self._replace, phrase)
+        elapsed = time.perf_counter() - start
+
+        self.last_seconds = elapsed
+        self.total_seconds += elapsed
+        self.calls += 1
+        return phrase
+
+    @property
+    def mean_seconds(self) -> float:
+        """
+        Average time spent per call to ``normalize()``.
+        """
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+    def reset_stats(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
@@ -0,0 +1,243 @@
+"""
+Resolve phrases from many games at once, in batches:
+
+    batcher = PhraseBatcher(executor=ProcessPoolExecutor(4))
+    future = batcher.submit('g42', 'knight f 3', Position.from_board(board))
+    san = future.result()  # Or raises, same as ``phrase_to_san()``
+
+Requests are collected for up to ``window`` seconds after the first one arrives, then grouped by position
+(not counting the halfmove clock and move number), so that games in the same position (ex. the same opening)
+share one ``MoveIndex`` and one cached result per phrase, and the whole batch is resolved in one call on the
+executor. A request waits at most ``window`` seconds before its batch is sent off, on top of the time it takes
+to resolve.
+"""
+import collections
+import queue
+import threading
+import time
+
+from concurrent.futures import Executor, Future
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+
+from locales import get_locale
+from move_index import MoveIndex
+from phrase_cache import PhraseCache
+from phrase_to_san import PhraseToSANError, PhraseToSANWarning
+from position import Position
+
+''' Worker side '''
+_CACHE: Optional[PhraseCache] = None
+_INDEXES: 'collections.OrderedDict[Position, MoveIndex]' = collections.OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+MAX_INDEXES = 1024
+'''How many positions' ``MoveIndex``es each process keeps between batches (most recently used first).'''
+
+Outcome = Tuple[Optional[str], Optional[Type[Exception]], Optional[str]]
+'''``(san, None, None)`` for a resolved phrase, or ``(None, error class, message)``.'''
+
+
+def _index(position: Position) -> MoveIndex:
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(position)
+        if index is not None:
+            _INDEXES.move_to_end(position)
+            return index
+    # Built outside the lock; if two threads race, one index is thrown away
+    index = MoveIndex(position)
+    with _INDEXES_LOCK:
+        index = _INDEXES.setdefault(position, index)
+        while len(_INDEXES) > MAX_INDEXES:
+            _INDEXES.popitem(last=False)
+    return index
+
+
+def resolve_batch(groups: List[Tuple[Position, List[Tuple[str, bool, Optional[str]]]]]) -> List[List[Outcome]]:
+    """
+    Resolve the ``(phrase, raise_warnings, locale)`` requests of each position, with one ``MoveIndex`` per position and
+    results cached (in a ``PhraseCache``) across batches. Runs wherever the batch is sent, ex. a worker process. The
+    index and the cache are shared by every thread of the process, so ``resolve_batch()`` can run on a thread pool.
+    """
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = PhraseCache()
+
+    outcomes = []
+    for position, requests in groups:
+        index = _index(position)
+        board = index.board
+        group = []
+        for phrase, raise_warnings, locale in requests:
+            try:
+                san = _CACHE.phrase_to_san(phrase, board, raise_warnings=raise_warnings, index=index, position=position,
+                                           locale=locale)
+            except (PhraseToSANError, PhraseToSANWarning) as e:
+                group.append((None, type(e), str(e)))
+            else:
+                group.append((san, None, None))
+        outcomes.append(group)
+    return outcomes
+
+
+''' Caller side '''
+class BatchRequest(NamedTuple):
+    game_id: str
+    phrase: str
+    position: Position
+    raise_warnings: bool
+    locale: Optional[str]
+    future: Future
+
+
+class BatcherStats:
+    """
+    Counters for a ``PhraseBatcher``, updated under a lock from its own thread and the executor's callbacks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.positions = 0
+        '''Distinct positions summed over all batches (so ``requests / positions`` is how much grouping saved).'''
+        self.failed_batches = 0
+
+    def add_batch(self, requests: int, positions: int):
+        with self._lock:
+            self.requests += requests
+            self.batches += 1
+            self.positions += positions
+
+    def add_failed_batch(self):
+        with self._lock:
+            self.failed_batches += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {'requests': self.requests, 'batches': self.batches, 'positions': self.positions,
+                    'failed_batches': self.failed_batches,
+                    'requests_per_batch': round(self.requests / self.batches, 2) if self.batches else None,
+                    'requests_per_position': round(self.requests / self.positions, 2) if self.positions else None}
+
+
+class PhraseBatcher:
+    """
+    Collects requests from any number of threads into batches (see the module docstring), and resolves each batch
+    with ``resolve_batch()`` on ``executor``, or on the batcher's own thread if there is none. A batch is sent
+    once ``window`` seconds have passed since its first request, or as soon as it has ``max_batch`` requests. At
+    most ``max_pending`` batches are resolving at once; past that, new requests wait in the queue.
+    """
+
+    def __init__(self,
+                 executor: Optional[Executor] = None,
+                 *,
+                 window: float = 0.002,
+                 max_batch: int = 512,
+                 max_pending: int = 8):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = BatcherStats()
+        self._queue: 'queue.SimpleQueue[Optional[BatchRequest]]' = queue.SimpleQueue()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='phrase-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self,
+               game_id: str,
+               phrase: str,
+               position: Position,
+               *,
+               raise_warnings: bool = False,
+               locale: Optional[str] = None) -> Future:
+        """
+        Queue ``phrase``, said in ``game_id`` in ``position`` (in ``locale``, see ``locales``). The future gets
+        the SAN, or the ``PhraseToSANError``/``PhraseToSANWarning`` that ``phrase_to_san()`` would raise.
+        """
+        if self._closed:
+            raise RuntimeError('The batcher is closed')
+        get_locale(locale)  # Unknown locales raise here, rather than failing the whole batch
+        future = Future()
+        self._queue.put(BatchRequest(game_id, phrase, position, raise_warnings, locale, future))
+        return future
+
+    def close(self):
+        """
+        Stop taking requests, and wait for the ones already queued to be sent off.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def __enter__(self) -> 'PhraseBatcher':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _collect(self, first: BatchRequest) -> Tuple[List[BatchRequest], bool]:
+        """
+        Get the batch starting with ``first``, and whether the batcher was closed while collecting it.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        closed = False
+        while not closed:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, closed = self._collect(first)
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if batch:
+                self._pending.acquire()
+                self._send(batch)
+
+    def _send(self, batch: List[BatchRequest]):
+        by_position: Dict[Position, List[BatchRequest]] = {}
+        for request in batch:
+            by_position.setdefault(request.position.without_clocks(), []).append(request)
+        groups = [(position, [(request.phrase, request.raise_warnings, request.locale) for request in requests])
+                  for position, requests in by_position.items()]
+        self.stats.add_batch(len(batch), len(groups))
+
+        def dispatch(done: Future):
+            try:
+                outcomes = done.result()
+            except BaseException as e:
+                self.stats.add_failed_batch()
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                for requests, group in zip(by_position.values(), outcomes):
+                    for request, (san, error, message) in zip(requests, group):
+                        if error is None:
+                            request.future.set_result(san)
+                        else:
+                            request.future.set_exception(error(message))
+            finally:
+                self._pending.release()
+
+        try:
+            if self.executor is not None:
+                self.executor.submit(resolve_batch, groups).add_done_callback(dispatch)
+                return
+            done = Future()
+            done.set_result(resolve_batch(groups))
+        except Exception as e:
+            # Including an executor that has been shut down, so that callers aren't left waiting
+            done = Future()
+            done.set_exception(e)
+        dispatch(done)
@@ -0,0 +1,145 @@
+import sys
+import threading
+
+import chess
+import chess.polyglot
+
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional, Tuple, Type, Union
+
+from locales import Locale
+from move_index import MoveIndex
+from phrase_to_san import PhraseToSANError, PhraseToSANWarning, parse_phrase, phrase_to_san
+
+ENTRY_OVERHEAD_BYTES = 200
+'''Rough size of the dict slot, tuples and ints that make up a cache entry, on top of its strings.'''
+
+
+class CachedResult(NamedTuple):
+    """
+    What ``phrase_to_san()`` did for one phrase: returned ``san``, or raised ``error(message)``.
+    ``phrase`` is the normalized phrase for errors, since their messages can quote it.
+    """
+    san: Optional[str]
+    error: Optional[Type[Exception]]
+    message: Optional[str]
+    phrase: Optional[str]
+    size: int
+
+    def replay(self) -> str:
+        if self.error is not None:
+            raise self.error(self.message)
+        return self.san
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def position_key(board: chess.Board) -> Hashable:
+    """
+    The part of a ``PhraseCache`` key that identifies the position of ``board``.
+    """
+    return chess.polyglot.zobrist_hash(board), board.castling_rights, board.ep_square
+
+
+class PhraseCache:
+    """
+    An LRU cache of ``phrase_to_san()`` results, shared across boards, games and threads.
+
+    Entries are keyed by the position (see ``position_key()``), the normalized tokens of the phrase
+    and ``raise_warnings``, so ex. "knight f 3" from the starting position is only resolved once
+    however many games ask for it. Errors and warnings are stored as their class and message and
+    raised again on a hit.
+
+    The oldest entries are evicted once there are more than ``max_entries`` of them, or once their
+    (estimated) size goes over ``max_bytes``; either budget can be ``None`` for no limit.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 100_000, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: 'OrderedDict[Tuple, CachedResult]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def phrase_to_san(self,
+                      phrase: str,
+                      board: chess.Board,
+                      *,
+                      raise_warnings: bool = False,
+                      index: Optional[MoveIndex] = None,
+                      position: Optional[Hashable] = None,
+                      locale: Union[str, Locale, None] = None) -> str:
+        """
+        Same as ``phrase_to_san(phrase, board, raise_warnings=raise_warnings, index=index, locale=locale)``, but
+        looked up in the cache first. Pass ``position`` if ``position_key(board)`` is already known. Entries are
+        keyed by the grammar's tokens, so the same move said in different locales shares one entry.
+        """
+        if position is None:
+            position = position_key(board)
+        parsed = parse_phrase(phrase, locale)
+        key = (position, parsed[1:], raise_warnings)
+
+        with self._lock:
+            result = self._entries.get(key)
+            # An error message may quote the phrase, so only replay it for the same phrase
+            if result is not None and (result.error is None or result.phrase == parsed.phrase):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result.replay()
+            self.misses += 1
+
+        try:
+            san = phrase_to_san(phrase, board, raise_warnings=raise_warnings, index=index, locale=locale)
+        except (PhraseToSANError, PhraseToSANWarning) as e:
+            message = str(e)
+            result = CachedResult(None, type(e), message, parsed.phrase,
+                                  ENTRY_OVERHEAD_BYTES + sys.getsizeof(message) + sys.getsizeof(parsed.phrase))
+        else:
+            result = CachedResult(san, None, None, None, ENTRY_OVERHEAD_BYTES + sys.getsizeof(san))
+        self._put(key, result, sum(map(sys.getsizeof, parsed.tokens)))
+        return result.replay()
+
+    def _put(self, key: Tuple, result: CachedResult, key_size: int):
+        result = result._replace(size=result.size + key_size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = result
+            self.bytes += result.size
+
+            while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                                     or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self.bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
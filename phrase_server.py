@@ -0,0 +1,297 @@
+"""
+An asyncio JSON-lines service for resolving phrases, with the work spread over worker processes.
+
+    python phrase_server.py --stdio
+    python phrase_server.py --tcp 127.0.0.1:8765 --workers 4
+    python phrase_server.py --unix /tmp/phrases.sock
+
+Each request is one line of JSON, and gets one line of JSON back (not necessarily in order, so
+send an ``id`` to match them up):
+
+    {"id": 1, "fen": "<FEN>", "phrase": "knight f 3"}
+    {"id": 2, "game": "g42", "phrase": "e 4"}                   # resolved and played in game "g42"
+    {"id": 3, "game": "g42", "fen": "<FEN>"}                    # (re)start game "g42" from a position
+    {"id": 4, "game": "g42", "undo": true}
+    {"id": 5, "fen": "<FEN>", "phrase": "Springer f drei", "locale": "de"}
+    {"id": 6, "stats": true}
+
+    {"id": 1, "ok": true, "san": "Nf3"}
+    {"id": 2, "ok": false, "error": "AmbiguousCaptureSource", "message": "...", "warning": false}
+
+Add ``"raise_warnings": true`` to reject phrases that would raise a ``PhraseToSANWarning``, and a ``"locale"``
+(ex. ``"es"``, see ``locales.py``) for phrases in another language. Games live in the worker they are routed
+to (by game id), so all of a game's positions are resolved with one ``PhraseSession``. Requests without a game
+are routed by FEN and go through a ``PhraseCache``, after the ``--store`` of precomputed positions (see
+``position_store.py``), which every worker maps once.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import time
+import zlib
+
+import chess
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from phrase_cache import PhraseCache
+from phrase_session import PhraseSession
+from phrase_to_san import PhraseToSANError, PhraseToSANWarning, phrase_to_san
+from position_store import PositionStore
+from san_phrases import warm_up
+
+''' Worker side '''
+_GAMES: 'collections.OrderedDict[str, PhraseSession]' = collections.OrderedDict()
+_CACHE: Optional[PhraseCache] = None
+_STORE: Optional[PositionStore] = None
+MAX_GAMES_PER_WORKER = 10_000
+
+
+def _init_worker(store_path: Optional[str] = None):
+    global _CACHE, _STORE
+    _CACHE = PhraseCache()
+    if store_path is not None:
+        _STORE = PositionStore.open(store_path)
+    # Warm up the imports, grammar and normalizer before the first real request
+    warm_up()
+    phrase_to_san('e 4', chess.Board())
+
+
+def _game(game_id: str) -> PhraseSession:
+    session = _GAMES.get(game_id)
+    if session is None:
+        session = _GAMES[game_id] = PhraseSession(prefetch=False)
+        while len(_GAMES) > MAX_GAMES_PER_WORKER:
+            _GAMES.popitem(last=False)
+    else:
+        _GAMES.move_to_end(game_id)
+    return session
+
+
+def handle(request: Dict) -> Dict:
+    """
+    Carry out one request in a worker process (see the module docstring for the format).
+    """
+    game_id = request.get('game')
+    phrase = request.get('phrase')
+    raise_warnings = bool(request.get('raise_warnings', False))
+    locale = request.get('locale')
+    try:
+        if game_id is None:
+            if phrase is None or 'fen' not in request:
+                return {'ok': False, 'error': 'BadRequest', 'message': 'Expected "phrase" and "fen" or "game"'}
+            board = chess.Board(request['fen'])
+            artifact = _STORE.get(board) if _STORE is not None else None
+            if artifact is not None:
+                san = artifact.lookup(phrase, raise_warnings=raise_warnings, locale=locale)
+                if san is not None:
+                    return {'ok': True, 'san': san}
+            san = _CACHE.phrase_to_san(phrase, board, raise_warnings=raise_warnings, locale=locale)
+            return {'ok': True, 'san': san}
+
+        session = _game(str(game_id))
+        if 'fen' in request:
+            session.reset(chess.Board(request['fen']))
+        if request.get('undo'):
+            session.pop()
+        if phrase is None:
+            return {'ok': True, 'fen': session.board.fen()}
+
+        san = session.phrase_to_san(phrase, raise_warnings=raise_warnings, locale=locale)
+        session.push_san(san)
+        return {'ok': True, 'san': san, 'fen': session.board.fen()}
+    except (PhraseToSANError, PhraseToSANWarning) as e:
+        return {'ok': False, 'error': type(e).__name__, 'message': str(e),
+                'warning': isinstance(e, PhraseToSANWarning)}
+    except (ValueError, IndexError) as e:
+        # Bad FENs, unknown locales, and undoing past the start of a game
+        return {'ok': False, 'error': 'BadRequest', 'message': str(e)}
+
+
+''' Server side '''
+class ServerStats:
+    """
+    Counters for a ``PhraseServer``. Latencies are kept for the most recent ``window`` requests.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.ok = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.latencies: Deque[float] = collections.deque(maxlen=window)
+
+    def as_dict(self) -> Dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e3, 3) if latencies else None
+
+        elapsed = time.perf_counter() - self.started
+        return {'requests': self.requests, 'ok': self.ok, 'errors': self.errors, 'timeouts': self.timeouts,
+                'in_flight': self.in_flight, 'requests_per_second': round(self.requests / elapsed, 1),
+                'p50_ms': percentile(0.5), 'p99_ms': percentile(0.99)}
+
+
+class PhraseServer:
+    """
+    Hands requests to ``workers`` single-process pools, so that every request for a game (or a FEN)
+    goes to the same worker process and is handled in the order it arrived. At most ``max_in_flight``
+    requests are handled at once; past that, the server stops reading input until some finish.
+    Requests that take longer than ``timeout`` seconds get a ``Timeout`` error. Each worker maps the
+    ``PositionStore`` at ``store`` (if given) when it starts.
+    """
+
+    def __init__(self,
+                 workers: int = os.cpu_count() or 1,
+                 max_in_flight: int = 256,
+                 timeout: float = 5.0,
+                 store: Optional[str] = None):
+        self.pools: List[ProcessPoolExecutor] = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                                     initargs=(store,))
+                                                 for _ in range(max(1, workers))]
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.stats = ServerStats()
+
+    def route(self, request: Dict) -> ProcessPoolExecutor:
+        key = request.get('game', request.get('fen', ''))
+        return self.pools[zlib.crc32(str(key).encode()) % len(self.pools)]
+
+    async def resolve(self, request: Dict) -> Dict:
+        if request.get('stats'):
+            return {'ok': True, 'stats': self.stats.as_dict()}
+
+        start = time.perf_counter()
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.route(request), handle, request)
+            response = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # The worker still finishes the request (and plays the move, for a game)
+            self.stats.timeouts += 1
+            response = {'ok': False, 'error': 'Timeout', 'message': f'No response within {self.timeout}s'}
+        except Exception as e:
+            response = {'ok': False, 'error': type(e).__name__, 'message': str(e)}
+        finally:
+            self.stats.in_flight -= 1
+
+        self.stats.latencies.append(time.perf_counter() - start)
+        if response['ok']:
+            self.stats.ok += 1
+        else:
+            self.stats.errors += 1
+        return response
+
+    async def _respond(self, line: bytes, write):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Expected a JSON object')
+        except ValueError as e:
+            response = {'ok': False, 'error': 'BadRequest', 'message': str(e)}
+        else:
+            response = await self.resolve(request)
+            if 'id' in request:
+                response = {'id': request['id'], **response}
+        finally:
+            self.slots.release()
+        await write((json.dumps(response) + '\n').encode())
+
+    async def serve_stream(self, readline: Callable[[], Awaitable[bytes]], write: Callable[[bytes], Awaitable]):
+        """
+        Answer each line from ``readline`` with ``write``, until the end of the input.
+        """
+        tasks = set()
+        while True:
+            await self.slots.acquire()
+            line = await readline()
+            if not line:
+                self.slots.release()
+                break
+            if not line.strip():
+                self.slots.release()
+                continue
+            task = asyncio.create_task(self._respond(line, write))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def write(data: bytes):
+            writer.write(data)
+            await writer.drain()
+
+        try:
+            await self.serve_stream(reader.readline, write)
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host: str, port: int):
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_unix(self, path: str):
+        server = await asyncio.start_unix_server(self._serve_connection, path)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self):
+        # stdin may be a file rather than a pipe, so read it from a thread instead of through the event loop
+        async def readline() -> bytes:
+            return await asyncio.to_thread(sys.stdin.buffer.readline)
+
+        async def write(data: bytes):
+            sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+
+        await self.serve_stream(readline, write)
+
+    def shutdown(self):
+        for pool in self.pools:
+            pool.shutdown(cancel_futures=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--stdio', action='store_true', help='read requests from stdin, write responses to stdout')
+    mode.add_argument('--tcp', metavar='HOST:PORT')
+    mode.add_argument('--unix', metavar='PATH')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds')
+    parser.add_argument('--store', help='position store to answer FEN requests from (see position_store.py)')
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = PhraseServer(args.workers, args.max_in_flight, args.timeout, args.store)
+        try:
+            if args.stdio:
+                await server.serve_stdio()
+            elif args.tcp:
+                host, _, port = args.tcp.rpartition(':')
+                await server.serve_tcp(host or '127.0.0.1', int(port))
+            else:
+                await server.serve_unix(args.unix)
+        finally:
+            print(json.dumps(server.stats.as_dict()), file=sys.stderr)
+            server.shutdown()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
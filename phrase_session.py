@@ -0,0 +1,170 @@
+import chess
+import chess.polyglot
+
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import List, Optional, Union
+
+from locales import Locale
+from move_index import MoveIndex
+from phrase_table import PhraseTable
+from phrase_to_san import phrase_to_san
+from phrase_trie import IncrementalParser, PhraseTrie
+
+_PREFETCH_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def prefetch_executor() -> ThreadPoolExecutor:
+    """
+    Get the single background thread shared by every ``PhraseSession`` that builds phrase tables.
+    Started on first use.
+    """
+    global _PREFETCH_EXECUTOR
+    if _PREFETCH_EXECUTOR is None:
+        _PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='phrase-table')
+    return _PREFETCH_EXECUTOR
+
+
+class PositionSnapshot:
+    """
+    Everything a ``PhraseSession`` has worked out for one position: its ``MoveIndex`` and the
+    (possibly still building) ``PhraseTable``. The table is built on the same index, which can be
+    used from the session's thread and the executor's at once.
+    """
+
+    def __init__(self, board: chess.Board, executor: Optional[Executor]):
+        self.index = MoveIndex(board)
+        self.table: Optional[Future] = None
+        self.trie: Optional[PhraseTrie] = None
+        if executor is not None:
+            self.table = executor.submit(PhraseTable, self.index.board, index=self.index)
+
+    def ready_table(self) -> Optional[PhraseTable]:
+        """
+        Get the phrase table if it has finished building (without waiting for it), otherwise ``None``.
+        """
+        table = self.table
+        if table is None or not table.done() or table.cancelled() or table.exception() is not None:
+            return None
+        return table.result()
+
+    def get_table(self) -> PhraseTable:
+        """
+        Get the phrase table, waiting for it to finish building (or building it here if it wasn't prefetched,
+        or the prefetch was cancelled).
+        """
+        if self.table is None or self.table.cancelled():
+            table = Future()
+            table.set_result(PhraseTable(self.index.board, index=self.index))
+            self.table = table
+        return self.table.result()
+
+
+class PhraseSession:
+    """
+    A game in progress, for resolving one spoken phrase after another.
+
+    Wraps a ``chess.Board`` (which should only be moved through the session) and keeps a
+    ``PositionSnapshot`` for the current position and recently visited ones, keyed by their
+    Zobrist hash. Pushing a move into a position that was seen before (ex. after ``pop()``, or
+    a transposition) reuses its snapshot instead of rebuilding it, and up to ``max_positions``
+    snapshots are kept.
+
+    With ``prefetch``, the ``PhraseTable`` of each new position is built on a background thread
+    (see ``prefetch_executor()``) while the player is thinking. Phrases that come in before it is
+    ready are resolved with the position's ``MoveIndex`` instead, so nothing ever waits on it.
+    """
+
+    def __init__(self,
+                 board: Optional[chess.Board] = None,
+                 *,
+                 prefetch: bool = True,
+                 max_positions: int = 64,
+                 executor: Optional[Executor] = None):
+        self.board = board.copy() if board is not None else chess.Board()
+        self.max_positions = max_positions
+        self.executor = (executor or prefetch_executor()) if prefetch else None
+
+        self._snapshots: 'OrderedDict[int, PositionSnapshot]' = OrderedDict()
+        self._keys: List[int] = []
+        self._enter()
+
+    def _enter(self):
+        """
+        Look up (or make) the snapshot of the position ``self.board`` is in.
+        """
+        key = chess.polyglot.zobrist_hash(self.board)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            snapshot = self._snapshots[key] = PositionSnapshot(self.board, self.executor)
+            while len(self._snapshots) > self.max_positions:
+                _, evicted = self._snapshots.popitem(last=False)
+                if evicted.table is not None:
+                    evicted.table.cancel()
+        else:
+            self._snapshots.move_to_end(key)
+
+        self._keys.append(key)
+        self.snapshot = snapshot
+
+    @property
+    def index(self) -> MoveIndex:
+        return self.snapshot.index
+
+    @property
+    def table(self) -> Optional[PhraseTable]:
+        return self.snapshot.ready_table()
+
+    def phrase_to_san(self,
+                      phrase: str,
+                      *,
+                      raise_warnings: bool = False,
+                      locale: Union[str, Locale, None] = None) -> str:
+        """
+        Same as ``phrase_to_san(phrase, session.board, raise_warnings=raise_warnings, locale=locale)``.
+        """
+        table = self.table
+        if table is not None:
+            return table.phrase_to_san(phrase, raise_warnings=raise_warnings, locale=locale)
+        return phrase_to_san(phrase, self.board, raise_warnings=raise_warnings, index=self.index, locale=locale)
+
+    def incremental_parser(self, *, locale: Union[str, Locale, None] = None) -> IncrementalParser:
+        """
+        Get an ``IncrementalParser`` for following a phrase (in ``locale``) word by word in the current position.
+        """
+        snapshot = self.snapshot
+        if snapshot.trie is None:
+            snapshot.trie = PhraseTrie(snapshot.get_table())
+        return IncrementalParser(snapshot.trie.table, trie=snapshot.trie, locale=locale)
+
+    def push(self, move: chess.Move):
+        self.board.push(move)
+        self._enter()
+
+    def push_san(self, san: str) -> chess.Move:
+        move = self.board.push_san(san)
+        self._enter()
+        return move
+
+    def pop(self) -> chess.Move:
+        move = self.board.pop()
+        self._keys.pop()
+        key = self._keys.pop() if self._keys else None
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            # Still cached, so there is nothing to rebuild
+            self._snapshots.move_to_end(key)
+            self._keys.append(key)
+            self.snapshot = snapshot
+        else:
+            self._enter()
+        return move
+
+    def reset(self, board: Optional[chess.Board] = None):
+        """
+        Start over from ``board`` (the starting position by default). Snapshots are kept, since
+        the new game will likely pass through some of the same positions.
+        """
+        self.board = board.copy() if board is not None else chess.Board()
+        self._keys = []
+        self._enter()
@@ -0,0 +1,173 @@
+import chess
+
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from locales import Locale
+from move_index import MoveFeatures, MoveIndex
+from phrase_to_san import (PhraseToSANError, PhraseToSANWarning, get_warnings, parse_phrase, phrase_to_move,
+                           phrase_to_san)
+
+SUFFIXES = ('', ' check', ' checkmate', ' stalemate')
+
+PIECE_TEMPLATES = (
+    '{piece}',
+    '{piece} takes',
+    '{piece} takes {captured}',
+    '{piece} {to_file} {to_rank}',
+    '{piece} takes {to_file} {to_rank}',
+    '{piece} {from_file} {to_file} {to_rank}',
+    '{piece} {from_file} takes {to_file} {to_rank}',
+    '{piece} {from_file} takes {captured}',
+    '{piece} {from_rank} {to_file} {to_rank}',
+    '{piece} {from_rank} takes {to_file} {to_rank}',
+    '{piece} {from_rank} takes {captured}',
+    '{piece} {from_file} {from_rank} {to_file} {to_rank}',
+    '{piece} {from_file} {from_rank} takes {to_file} {to_rank}',
+    '{piece} {from_file} {from_rank} takes {captured}',
+)
+'''Phrases that name the moving piece. The ones with a file or rank disambiguator are only used for pieces.'''
+
+PAWN_TEMPLATES = (
+    '{to_file} {to_rank}',
+    '{from_file} {to_file}',
+    '{from_file} takes {to_file}',
+    '{from_file} {to_file} {to_rank}',
+    '{from_file} takes {to_file} {to_rank}',
+    '{from_file} takes',
+    'takes {to_file}',
+    '{piece} {from_file} {to_file} {to_rank}',
+    '{piece} {from_file} takes {to_file} {to_rank}',
+)
+
+MOVE_TEMPLATES = (
+    '',
+    'takes',
+    'takes {to_file} {to_rank}',
+    'takes {captured}',
+    '{from_file} {from_rank} {to_file} {to_rank}',
+)
+
+CASTLING_TEMPLATES = (
+    'castles',
+    'castles {side}',
+)
+
+
+def generate_phrases(index: MoveIndex) -> Iterator[str]:
+    """
+    Yield phrases (without duplicates) that may describe a legal move in ``index``, in every
+    form the ``phrase_to_san()`` rules know about, with and without a "check"/"checkmate"/"stalemate"
+    suffix, and for promotions, with the piece after them (ex. "e 8 queen", "e 8 equals queen").
+    Many of them will be ambiguous, or point at a different move than the one they were
+    made from; use ``PhraseTable`` to keep only the ones that resolve. Filler words other than
+    "takes" (ex. "knight to f 3") are accepted by some rules but not generated.
+    """
+    seen = set()
+    for move in index.moves:
+        names = {
+            'piece': chess.piece_name(move.piece_type),
+            'captured': chess.piece_name(move.captured_type) if move.is_capture else None,
+            'from_file': chess.FILE_NAMES[move.from_file],
+            'from_rank': chess.RANK_NAMES[move.from_rank],
+            'to_file': chess.FILE_NAMES[move.to_file],
+            'to_rank': chess.RANK_NAMES[move.to_rank],
+            'side': 'kingside' if move.to_file > move.from_file else 'queenside',
+        }
+
+        templates = MOVE_TEMPLATES
+        if move.is_castling:
+            templates += CASTLING_TEMPLATES
+        if move.piece_type == chess.PAWN:
+            templates += PAWN_TEMPLATES + PIECE_TEMPLATES[:5]
+        else:
+            templates += PIECE_TEMPLATES
+
+        if move.promotion:
+            names['promotion'] = chess.piece_name(move.promotion)
+            templates = tuple(f'{template} {promotion}'.strip() for template in templates + ('promote',)
+                              for promotion in ('{promotion}', 'equals {promotion}'))
+
+        for template in templates:
+            if '{captured}' in template and not move.is_capture:
+                continue
+
+            phrase = template.format(**names)
+            for suffix in SUFFIXES:
+                if phrase + suffix not in seen:
+                    seen.add(phrase + suffix)
+                    yield (phrase + suffix).strip()
+
+
+class PhraseTable:
+    """
+    Every generated phrase (see ``generate_phrases()``) that ``phrase_to_san()`` resolves to a move
+    in one position, keyed by its normalized tokens, so that resolving a phrase is a normalization
+    and a dict lookup.
+
+    The table is filled by running each generated phrase through the same rules as ``phrase_to_san()``,
+    so it agrees with it by construction. Phrases that are not in the table (including every phrase
+    that is an error) fall back to ``phrase_to_san()`` in ``phrase_to_san()`` below.
+    """
+
+    def __init__(self, board: chess.Board, *, index: Optional[MoveIndex] = None):
+        self.index = index if index is not None else MoveIndex(board)
+        self.entries: Dict[Tuple, Tuple[MoveFeatures, List[PhraseToSANWarning]]] = {}
+        self.phrases_by_san: Dict[str, List[str]] = {}
+
+        for phrase in generate_phrases(self.index):
+            parsed = parse_phrase(phrase)
+            key = parsed[1:]
+            if key in self.entries:
+                continue
+
+            try:
+                move = phrase_to_move(parsed, self.index)
+            except PhraseToSANError:
+                continue
+
+            self.entries[key] = (move, get_warnings(move, parsed, self.index))
+            self.phrases_by_san.setdefault(self.index.san(move), []).append(phrase)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self,
+               phrase: str,
+               *,
+               raise_warnings: bool = False,
+               locale: Union[str, Locale, None] = None) -> Optional[str]:
+        """
+        Get the SAN for ``phrase`` from the table, or ``None`` if it is not in the table.
+        Raises the same warning as ``phrase_to_san()`` with ``raise_warnings``. The table is keyed by
+        the grammar's tokens, so it serves phrases in any ``locale``.
+        """
+        entry = self.entries.get(parse_phrase(phrase, locale)[1:])
+        if entry is None:
+            return None
+
+        move, warnings = entry
+        if raise_warnings and warnings:
+            warning = warnings[0]
+            raise type(warning)(*warning.args)
+        return self.index.san(move)
+
+    def phrase_to_san(self,
+                      phrase: str,
+                      *,
+                      raise_warnings: bool = False,
+                      locale: Union[str, Locale, None] = None) -> str:
+        """
+        Same as ``phrase_to_san(phrase, board, raise_warnings=raise_warnings, locale=locale)`` for the
+        position this table was built for.
+        """
+        san = self.lookup(phrase, raise_warnings=raise_warnings, locale=locale)
+        if san is None:
+            san = phrase_to_san(phrase, self.index.board, raise_warnings=raise_warnings, index=self.index,
+                                locale=locale)
+        return san
+
+    def phrases(self, san: str) -> List[str]:
+        """
+        Get the generated phrases that resolve to the move ``san``.
+        """
+        return self.phrases_by_san.get(san, [])
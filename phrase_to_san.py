@@ -1,18 +1,29 @@
+import enum
+import functools
 import time
 
 import chess
-import re
 
-from typing import Optional, Callable, Collection, Type
+from typing import Optional, Callable, Collection, Dict, List, NamedTuple, Sequence, Tuple, Type, Union
+
+from grammar import FILES, GRAMMAR, RANKS, MoveQuery
+from instrumentation import HOOKS, ResolveTrace
+from locales import Locale, get_locale
+from move_index import MoveFeatures, MoveIndex
+from position import Position
 
 SQUARE_NAMES = [chess.square_name(s) for s in chess.SQUARES]
-FILES = 'abcdefgh'
-RANKS = '12345678'
 PIECE_NAMES = chess.PIECE_NAMES[1:]
 CAPTURABLE_PIECE_NAMES = chess.PIECE_NAMES[1:6]
 PROMOTABLE_PIECE_NAMES = chess.PIECE_NAMES[2:6]
 NON_PAWN_PIECE_NAMES = chess.PIECE_NAMES[2:7]
 CHECKING_PIECE_NAMES = chess.PIECE_NAMES[1:6]
+PIECE_TYPES = {name: piece_type for piece_type, name in enumerate(chess.PIECE_NAMES) if name}
+
+ENGLISH = get_locale('en')
+'''The locale phrases are parsed in unless another one is asked for (see ``locales``).'''
+NORMALIZER = ENGLISH.normalizer
+'''Compiled on first use from ``stt_replacements.REPLACEMENTS``; see ``NORMALIZER.last_seconds`` for timing.'''
 
 
 ''' Errors '''
@@ -52,505 +63,685 @@ class IsNotCaptureWarning(PhraseToSANWarning): pass
 class IsNotAmbiguousWarning(PhraseToSANWarning): pass
 
 
+def square(file: str, rank: str) -> chess.Square:
+    return chess.square(FILES.index(file), RANKS.index(rank))
 
-def phrase_to_san(phrase: str,
-                  board: chess.Board,
-                  *,
-                  raise_warnings: bool = False) -> str:
+
+class ParsedPhrase(NamedTuple):
     """
-    Take a spoken-English ``phrase`` and convert it to SAN
-    given the state of the provided ``board``.
+    A normalized phrase split into tokens, with a trailing "check"/"checkmate"/"stalemate" taken out.
     """
+    phrase: str
+    tokens: Tuple[str, ...]
+    says_check: bool
+    says_mate: bool
+    says_stalemate: bool
 
-    from stt_replacements import REPLACEMENTS
-
-    for pattern, replacement in REPLACEMENTS.items():
-        phrase = re.sub(pattern, replacement, phrase)
-        phrase = phrase.replace(pattern, replacement)
-
-    # def parse_equals_queen(equals_queen: List[str]) -> str | None:
-    #     # ``equals_queen``:
-    #     #   - May be empty (for moves that are not a promotion)
-    #     #   - May start with 'equals'
-    #     #   - Must end with a promotable piece (if it's not empty)
-    #     if not equals_queen:
-    #         return None
-    #
-    #     if len(equals_queen) not in (1, 2):
-    #         raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{equals_queen}")')
-    #
-    #     if len(equals_queen) == 1:
-    #         piece = equals_queen[0]
-    #         if piece == 'equals':
-    #             raise UnspecifiedPromotionPiece(f'Unspecified promotion piece: "{phrase}"')
-    #     else:
-    #         equals, piece = equals_queen
-    #         if equals != 'equals':
-    #             raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{equals}")')
-    #
-    #     if piece not in PROMOTABLE_PIECE_NAMES:
-    #         raise InvalidPromotionPiece(f'Invalid promotion piece: "{piece}"')
-    #
-    #     return piece
-
-
-    def get_only_san_where(conditions: Collection[Callable[[chess.Move], bool]],
-                           error: Type[PhraseToSANError],
-                           error_msg: str,
-                           optional_conditions: Collection[Callable[[chess.Move], bool]] = None) -> Optional[str]:
+
+class HypothesisResult(NamedTuple):
+    """
+    The outcome of resolving one speech recognition hypothesis with ``phrases_to_san()``.
+    Exactly one of ``san`` and ``error`` is set. ``warnings`` holds every warning that
+    ``phrase_to_san(..., raise_warnings=True)`` could raise for the move, in the order it checks them.
+    """
+    hypothesis: str
+    score: Optional[float]
+    san: Optional[str]
+    error: Optional[PhraseToSANError]
+    warnings: Tuple[PhraseToSANWarning, ...]
+
+    @property
+    def is_clean(self) -> bool:
+        return self.san is not None and not self.warnings
+
+
+class Status(enum.Enum):
+    RESOLVED = 'resolved'
+    '''The phrase describes exactly one legal move (there may still be warnings).'''
+    AMBIGUOUS = 'ambiguous'
+    '''Several legal moves fit the phrase; see ``PhraseResult.candidates``.'''
+    NO_MATCH = 'no_match'
+    '''The phrase could be parsed, but no legal move fits it.'''
+    UNPARSED = 'unparsed'
+    '''The phrase doesn't take any form the grammar knows about.'''
+
+
+class WarningFlag(enum.IntFlag):
+    IS_CHECKMATE = enum.auto()
+    IS_NOT_CHECKMATE = enum.auto()
+    IS_CHECK = enum.auto()
+    IS_NOT_CHECK = enum.auto()
+    IS_STALEMATE = enum.auto()
+    IS_NOT_STALEMATE = enum.auto()
+    IS_CAPTURE = enum.auto()
+    IS_NOT_CAPTURE = enum.auto()
+    IS_NOT_AMBIGUOUS = enum.auto()
+
+
+WARNINGS: Dict[WarningFlag, Tuple[Type[PhraseToSANWarning], str]] = {
+    WarningFlag.IS_CHECKMATE: (IsCheckmateWarning,
+                               '{bare_san} gives checkmate ({san}), but you did not say "checkmate"'),
+    WarningFlag.IS_NOT_CHECKMATE: (IsNotCheckmateWarning, '{san} does not give checkmate, but you said "checkmate"'),
+    WarningFlag.IS_CHECK: (IsCheckWarning, '{bare_san} gives check ({san}), but you did not say "check"'),
+    WarningFlag.IS_NOT_CHECK: (IsNotCheckWarning, '{san} does not give check, but you said "check"'),
+    WarningFlag.IS_STALEMATE: (IsStalemateWarning, '{san} gives stalemate, but you did not say "stalemate"'),
+    WarningFlag.IS_NOT_STALEMATE: (IsNotStalemateWarning, '{san} does not give stalemate, but you said "stalemate"'),
+    WarningFlag.IS_CAPTURE: (IsCaptureWarning, '{san} is a capture, but you did not say "takes"'),
+    WarningFlag.IS_NOT_CAPTURE: (IsNotCaptureWarning, '{san} is not a capture, but you said "takes"'),
+    WarningFlag.IS_NOT_AMBIGUOUS: (IsNotAmbiguousWarning,
+                                   '{san} is not ambiguous, so there is no need to say where it moves from'),
+}
+'''
+The warning raised for each flag and its message, in the order ``phrase_to_san(..., raise_warnings=True)`` checks
+them.
+'''
+
+
+class PhraseResult(NamedTuple):
+    """
+    The outcome of resolving a phrase with ``resolve_phrase()``, without raising anything.
+
+    ``san`` and ``move`` are set if the phrase resolved (``status`` is ``Status.RESOLVED``), and ``warnings``
+    holds every warning that applies to it at once. Otherwise ``error`` is the ``PhraseToSANError`` subclass
+    ``phrase_to_san()`` would raise, and if the phrase was ambiguous, ``candidates`` holds the legal moves that
+    fit it. Messages are only formatted when asked for (see ``message`` and ``exception()``).
+    """
+    status: Status
+    query: MoveQuery
+    move: Optional[MoveFeatures] = None
+    san: Optional[str] = None
+    candidates: Tuple[MoveFeatures, ...] = ()
+    warnings: WarningFlag = WarningFlag(0)
+    error: Optional[Type[PhraseToSANError]] = None
+    template: Optional[str] = None
+    '''The error message, to be formatted with the fields of ``query`` and ``detail``.'''
+    detail: Optional[str] = None
+
+    @property
+    def phrase(self) -> str:
+        return self.query.phrase
+
+    @property
+    def is_clean(self) -> bool:
+        return self.status is Status.RESOLVED and not self.warnings
+
+    @property
+    def error_message(self) -> Optional[str]:
+        if self.template is None:
+            return None
+        return self.template.format(**self.query._asdict(), extra_list=list(self.query.extra), detail=self.detail)
+
+    def warning_list(self) -> List[PhraseToSANWarning]:
         """
-        Given ``board``, get the only SAN move in the position where the given set of ``conditions``
-        about the move hold. Takes ``optional_conditions`` that are used to narrow the available moves only
-        if multiple are found that match the required ``conditions``. If no such move exists,
-        raises ``PhraseToSANError``. If multiple exist, raises the given ``error`` with the given ``error_msg``.
+        Get an instance of each warning in ``warnings``, in the order ``phrase_to_san()`` checks them.
         """
-        if optional_conditions is None:
-            optional_conditions = []
+        return [warning_for(flag, self.san) for flag in WARNINGS if flag & self.warnings]
 
-        candidate_moves = []
-        for move in board.legal_moves:
-            if any((not condition(move) for condition in conditions)):
-                continue
+    @property
+    def message(self) -> Optional[str]:
+        """
+        The error message, or the message of the first warning, or ``None`` for a clean result.
+        """
+        exception = self.exception()
+        return str(exception) if exception is not None else None
 
-            candidate_moves.append(move)
+    def exception(self) -> Optional[Exception]:
+        """
+        Get the exception ``phrase_to_san(..., raise_warnings=True)`` would raise, if any.
+        """
+        if self.error is not None:
+            return self.error(self.error_message)
+        if self.warnings:
+            return self.warning_list()[0]
+        return None
 
-        if not candidate_moves:
-            raise PhraseToSANError('No matching SAN move')
-        elif len(candidate_moves) == 1:
-            return board.san(candidate_moves[0])
-        else:
-            if not optional_conditions:
-                raise error(error_msg)
 
-            san = None
-            for move in candidate_moves:
-                if any((not condition(move) for condition in optional_conditions)):
-                    continue
-
-                if san is not None:
-                    raise error(error_msg)
-                san = board.san(move)
-            return san
-
-    def gives_check(move: chess.Move) -> bool:
-        board.push(move)
-        is_check = board.is_check()
-        board.pop()
-        return is_check
-
-    def gives_mate(move: chess.Move) -> bool:
-        board.push(move)
-        is_mate = board.is_checkmate()
-        board.pop()
-        return is_mate
-
-    def gives_stalemate(move: chess.Move) -> bool:
-        board.push(move)
-        is_stalemate = board.is_stalemate()
-        board.pop()
-        return is_stalemate
+def warning_for(flag: WarningFlag, san: str) -> PhraseToSANWarning:
+    warning, template = WARNINGS[flag]
+    return warning(template.format(san=san, bare_san=san[:-1]))
+
 
+def parse_phrase(phrase: str, locale: Union[str, Locale, None] = None) -> ParsedPhrase:
+    """
+    Normalize ``phrase`` (see ``NORMALIZER``) and split it into tokens. A ``locale`` other than English (ex. ``'de'``)
+    normalizes it with its own replacements and translates its words to the English tokens (see ``locales``).
+    """
     # Get ready to process token-by-token
-    tokens = phrase.lower().split()
+    phrase, tokens = (ENGLISH if locale is None else get_locale(locale)).tokenize(phrase)
+    return split_suffix(phrase, tokens)
+
 
+def split_suffix(phrase: str, tokens: List[str]) -> ParsedPhrase:
+    """
+    Take "check"/"checkmate"/"stalemate" off the end of the ``tokens`` of the normalized ``phrase``.
+    """
     # Take out 'check' / 'checkmate'
     says_check = False
     says_mate = False
     says_stalemate = False
-    if tokens[-1] == 'check':
+    if tokens and tokens[-1] == 'check':
         says_check = True
-        check_token = tokens[-1]  # TODO remove these 3 vars?
         del tokens[-1]
-    elif tokens[-1] == 'checkmate':
+    elif tokens and tokens[-1] == 'checkmate':
         says_mate = True
-        mate_token = tokens[-1]  # (TODO)
         del tokens[-1]
-    elif tokens[-1] == 'stalemate':
+    elif tokens and tokens[-1] == 'stalemate':
         says_stalemate = True
-        stalemate_token = tokens[-1]  # (TODO)
         del tokens[-1]
 
-    # Lambdas that use check/checkmate as a condition to isolate move
-    check_lambda = lambda move: gives_check(move) if says_check else True
-    mate_lambda = lambda move: gives_mate(move) if says_mate else True
-    stalemate_lambda = lambda move: gives_stalemate(move) if says_stalemate else True
-    check_lambdas = (check_lambda, mate_lambda, stalemate_lambda)
-
-    match tokens:
-        case ['castles', 'kingside']:
-            conditions = (
-                lambda move: board.is_castling(move),
-                lambda move: board.san(move).startswith('O-O') and 'O-O-O' not in board.san(move),
-            )
-            san = get_only_san_where(conditions,
-                                     PhraseToSANError,
-                                     'Cannot kingside castle here',
-                                     optional_conditions=check_lambdas)
-        case ['castles', 'queenside']:
-            conditions = (
-                lambda move: board.is_castling(move),
-                lambda move: board.san(move).startswith('O-O-O'),
-            )
-            san = get_only_san_where(conditions,
-                                     PhraseToSANError,
-                                     'Cannot queenside castle here',
-                                     optional_conditions=check_lambdas)
-        case ['castles']:
-            conditions = (
-                lambda move: board.is_castling(move),
-            )
-            san = get_only_san_where(conditions,
-                                     UnspecifiedCastlingDirection,
-                                     'Please specify castling direction',
-                                     optional_conditions=check_lambdas)
-        case [] if any((says_check, says_mate, says_stalemate)):
-            conditions = (
-                lambda move: board.gives_check(move),
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     'Multiple checks exist',
-                                     optional_conditions=check_lambdas)
-        case [piece] if piece in CHECKING_PIECE_NAMES and any((says_check, says_mate, says_stalemate)):
-            conditions = (
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: board.gives_check(move),
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousSourceOrDestination,
-                                     f'Multiple {piece} checks exist',
-                                     optional_conditions=check_lambdas)
-        case [] if says_mate:  # TODO make sure this works
-            conditions = (
-                gives_mate,
-            )
-            san = get_only_san_where(conditions,
-                                     InvalidSourceOrDestination,
-                                     'Multiple checkmates exist',
-                                     optional_conditions=check_lambdas)
-        case [] if says_check:  # TODO make sure this works
-            conditions = (
-                gives_check,
-            )
-            san = get_only_san_where(conditions,
-                                     InvalidSourceOrDestination,
-                                     'Multiple checks exist',
-                                     optional_conditions=check_lambdas)
-        case [] if says_stalemate:  # TODO make sure this works
-            conditions = (
-                gives_stalemate,
-            )
-            san = get_only_san_where(conditions,
-                                     InvalidSourceOrDestination,
-                                     'Multiple stalemates exist',
-                                     optional_conditions=check_lambdas)
-        case ['takes']:
-            # TODO: Check that there is only 1 legal capture in the position
-            conditions = (
-                lambda move: board.is_capture(move),
-            )
-            san = get_only_san_where(conditions,
-                                      AmbiguousSourceOrDestination,
-                                      'Multiple captures exist',
-                                     optional_conditions=check_lambdas)
-        case [from_file, 'takes'] if from_file in FILES:
-            # TODO: Check that there is only one legal pawn capture move
-            #  where from file is `file`
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: board.piece_type_at(move.from_square) == chess.PAWN,
-                lambda move: chess.square_name(move.from_square)[0] == from_file,
-            )
-            san = get_only_san_where(conditions,
-                                      AmbiguousCaptureDestination,
-                                      f'There are multiple pawns on the {from_file}-file that can take a piece',
-                                     optional_conditions=check_lambdas)
-        case ['takes', to_file] if to_file in FILES:
-            # TODO: Assume this will only be said for a pawn capture. Check that
-            #  there is only one legal pawn capture onto `to_file`
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: board.piece_type_at(move.from_square) == chess.PAWN,
-                lambda move: chess.square_name(move.to_square)[0] == to_file,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureDestination,
-                                     f'There are multiple pawns that can take onto the {to_file}-file',
-                                     optional_conditions=check_lambdas)
-
-            # For this specific phrase, we are looking first for pawn captures onto the given file,
-            # but let's still check that no other piece can capture on the `to_square` for clarity.
-            capture_destination = board.parse_san(san).to_square
-            for move in board.legal_moves:
-                if not board.is_capture(move):
-                    continue
-                if move.to_square != capture_destination:
-                    continue
-
-                if board.san(move) != san:
-                    raise AmbiguousCaptureSource(f'Another piece can capture on {chess.square_name(move.to_square)}. '
-                                                 f'It seems like you want to take with the pawn, but please clarify.')
-        case ['takes', to_file, to_rank] if to_file in FILES and to_rank in RANKS:
-            # TODO: Check that there is only one legal capture move to the given square
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.square_name(move.to_square) == f'{to_file}{to_rank}',
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSource,
-                                     f'Multiple pieces can take on {to_file}{to_rank}',
-                                     optional_conditions=check_lambdas)
-        case ['takes', piece] if piece in CAPTURABLE_PIECE_NAMES:
-            # TODO: Check that there is only one legal capture move where
-            #  board.piece_type_at(move.to_square) is `piece`
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.to_square)] == piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     f'Multiple {piece}s can be taken, or multiple pieces can take a {piece}',
-                                     optional_conditions=check_lambdas)
-        case [piece, 'takes'] if piece in PIECE_NAMES:
-            # TODO: Check that there is only one legal capture move where
-            #  board.piece_type_at(move.from_square) is `piece`
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     f'Multiple pieces can be taken by a {piece}, '
-                                     f'or multiple {piece}s can take a piece',
-                                     optional_conditions=check_lambdas)
-        case [piece, 'takes', captured_piece] if piece in PIECE_NAMES and captured_piece in CAPTURABLE_PIECE_NAMES:
-            # TODO: Validate that there is only one legal `piece` takes `captured_piece` move
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.to_square)] == captured_piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     f'There are multiple ways for a {piece} to take a {captured_piece}',
-                                     optional_conditions=check_lambdas)
-        case [from_file, *takes, to_file, to_rank] if from_file in FILES and to_file in FILES and to_rank in RANKS:
-            # TODO: Check that there is a legal pawn capture, or that this is a UCI move
-            #  Note: `takes` should be [], ['takes'], or a [from_rank] for a UCI-formatted move (special case)
-            if takes and takes[0] in RANKS:
-                # UCI-phrased move
-                from_rank = takes[0]
-                uci = f'{from_file}{from_rank}{to_file}{to_rank}'
-                try:
-                    return board.san(chess.Move.from_uci(uci))
-                except ValueError:
-                    raise PhraseToSANError(f'Phrase was interpreted as UCI, but the move "{uci}" is invalid')
-            if takes not in ([], ['takes']):
-                raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{takes}")')
+    return ParsedPhrase(phrase, tuple(tokens), says_check, says_mate, says_stalemate)
 
-            try:
-                move = board.push_san(f'{from_file}{to_file}{to_rank}')
-                board.pop()
-            except ValueError:
-                raise PhraseToSANError(f'Invalid pawn capture: "{phrase}"')
-            san = board.san(move)
-        case [from_file, *takes, to_file] if from_file in FILES and to_file in FILES:
-            # TODO: Check that there is only one legal pawn capture from `from_file` to `to_file`
-            if takes not in ([], ['takes']):
-                raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{takes}")')
-
-            conditions = (
-                lambda move: board.is_capture(move),  # This is correct
-                lambda move: board.piece_type_at(move.from_square) == chess.PAWN,
-                lambda move: chess.square_name(move.from_square)[0] == from_file,
-                lambda move: chess.square_name(move.to_square)[0] == to_file,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureDestination,
-                                     f'Multiple pawns on the {from_file}-file can take onto the {to_file}-file',
-                                     optional_conditions=check_lambdas)
-        case [to_file, to_rank] if to_file in FILES and to_rank in RANKS:
-            # TODO: Simple pawn move
-            try:
-                move = board.push_san(f'{to_file}{to_rank}')
-                board.pop()
-            except ValueError:
-                raise InvalidDestination(f'No pawn can move to {to_file}{to_rank}')
-            san = board.san(move)
-        case [piece, from_file, from_rank, 'takes', captured_piece] \
-                if all((piece in PIECE_NAMES,
-                        from_file in FILES,
-                        from_rank in RANKS,
-                        captured_piece in CAPTURABLE_PIECE_NAMES)):
-            # TODO: Make sure there is only one way to  a `captured_piece` with
-            #  the `piece` from `{from_file}{from_rank}`
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.square_name(move.from_square) == f'{from_file}{from_rank}',
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.to_square)] == captured_piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureDestination,
-                                     f'Multiple {captured_piece}s can be taken by the {piece} '
-                                     f'on {from_file}{from_rank}',
-                                     optional_conditions=check_lambdas)
-        case [piece, from_file, from_rank, *takes, to_file, to_rank] \
-                if all((piece in PIECE_NAMES,
-                        from_file in FILES,
-                        from_rank in RANKS,
-                        to_file in FILES,
-                        to_rank in RANKS)):
-            # TODO: Piece move/capture with full-square disamgibuator
-            assert piece != 'pawn', 'Internal error: this should have been handled in an earlier match case'
-
-            if takes not in ([], ['takes']):
-                raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{takes}")')
 
-            try:
-                move = board.push_san(f'{piece[0].upper()}{from_file}{from_rank}{to_file}{to_rank}')
-                board.pop()
-            except ValueError:
-                raise InvalidSourceOrDestination(f'No valid SAN for phrase: "{phrase}"')
-            san = board.san(move)
-        case [piece, from_file, 'takes', captured_piece] \
-                if all((piece in PIECE_NAMES,
-                        from_file in FILES,
-                        captured_piece in CAPTURABLE_PIECE_NAMES)):
-            # TODO: Piece move/capture with file disambiguator. Make sure no further disambiguator is required
-            #  by trying to push SAN
-            assert piece != 'pawn', 'Internal error: this should have been handled in an earlier match case'
-
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.square_name(move.from_square)[0] == from_file,
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.to_square)] == captured_piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     f'There are multiple ways for a {piece} on the {from_file}-file '
-                                     f'to take a {captured_piece}',
-                                     optional_conditions=check_lambdas)
-        case [piece, from_file, *takes, to_file, to_rank] \
-                if all((piece in PIECE_NAMES,
-                        from_file in FILES,
-                        to_file in FILES,
-                        to_rank in RANKS)):
-            # TODO: Make sure there is only one way to move/capture onto `{to_rank}{to_file}`
-            #  with a `piece` on `from_file`
-            if takes not in ([], ['takes']):
-                raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{takes}")')
-
-            conditions = (
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.square_name(move.from_square)[0] == from_file,
-                lambda move: chess.square_name(move.to_square) == f'{to_file}{to_rank}',
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSource,
-                                     f'Multiple {piece}s from the {from_file}-file can take on {to_file}{to_rank}',
-                                     optional_conditions=check_lambdas)
-        case [piece, from_rank, 'takes', captured_piece] \
-                if all((piece in PIECE_NAMES,
-                        from_rank in RANKS,
-                        captured_piece in CAPTURABLE_PIECE_NAMES)):
-            # TODO: Piece move/capture with rank disambiguator. Make sure no further disambiguator is required
-            #  by trying to push SAN
-            assert piece != 'pawn', 'Internal error: this should have been handled in an earlier match case'
-
-            conditions = (
-                lambda move: board.is_capture(move),
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.square_name(move.from_square)[1] == from_rank,
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.to_square)] == captured_piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     f'There are multiple ways for a {piece} on the rank {from_rank} '
-                                     f'to take a {captured_piece}',
-                                     optional_conditions=check_lambdas)
-        case [piece, from_rank, *takes, to_file, to_rank] \
-                if all((piece in PIECE_NAMES,
-                        from_rank in RANKS,
-                        to_file in FILES,
-                        to_rank in RANKS)):
-            # TODO: Make sure there is only one way to move/capture onto `{to_rank}{to_file}`
-            #  with a `piece` on `from_file`
-            assert piece != 'pawn', 'Internal error: this should have been handled in an earlier match case'
-
-            if takes not in ([], ['takes']):
-                raise PhraseToSANError(f'Could not parse phrase: "{phrase}" (invalid tokens: "{takes}")')
-
-            conditions = (
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.square_name(move.from_square)[0] == from_rank,
-                lambda move: chess.square_name(move.to_square) == f'{to_file}{to_rank}',
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSource,
-                                     f'Multiple {piece}s from rank {from_rank} can take on {to_file}{to_rank}',
-                                     optional_conditions=check_lambdas)
-        case [piece, 'takes', captured_piece] \
-                if all((piece in PIECE_NAMES,
-                        captured_piece in CAPTURABLE_PIECE_NAMES)):
-            # TODO: Simple piece/pawn move/capture with no disambiguator. Make sure no
-            #  further disambiguator is required by trying to push the SAN
-            assert piece != 'pawn', 'Internal error: this should have been handled in an earlier match case'
-
-            conditions = (
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.to_square)] == captured_piece,
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSourceOrDestination,
-                                     f'There are multiple ways for a {piece} to take a {captured_piece}',
-                                     optional_conditions=check_lambdas)
-        case [piece, *takes, to_file, to_rank] \
-                if all((piece in PIECE_NAMES,
-                        to_file in FILES,
-                        to_rank in RANKS)):
-            # TODO: Make sure there is only one way to move/capture onto `{to_rank}{to_file}` with a `piece`
-            conditions = (
-                lambda move: chess.PIECE_NAMES[board.piece_type_at(move.from_square)] == piece,
-                lambda move: chess.square_name(move.to_square) == f'{to_file}{to_rank}',
-            )
-            san = get_only_san_where(conditions,
-                                     AmbiguousCaptureSource,
-                                     f'Multiple {piece}s can take on {to_file}{to_rank}',
-                                     optional_conditions=check_lambdas)
-        case _:
-            raise PhraseToSANError(f'Could not parse phrase: "{phrase}"')
-
-    if raise_warnings:
-        board.push_san(san)
-        is_mate = board.is_checkmate()
-        is_check = board.is_check()
-        is_stalemate = board.is_stalemate()
-        board.pop()
-
-        if is_mate and not says_mate:
-            assert san[-1] == '#'
-            raise IsCheckmateWarning(f'{san[:-1]} gives checkmate ({san}), but you did not say "checkmate"')
-        elif not is_mate and says_mate:
-            # noinspection PyUnboundLocalVariable
-            raise IsNotCheckmateWarning(f'{san} does not give checkmate, but you said "{mate_token}"')
-        elif is_check and not says_check:
-            assert san[-1] == '+'
-            raise IsCheckWarning(f'{san[:-1]} gives check ({san}), but you did not say "check"')
-        elif not is_check and says_check:
-            # noinspection PyUnboundLocalVariable
-            raise IsNotCheckWarning(f'{san} does not give check, but you said "{check_token}"')
-        elif is_stalemate and not says_stalemate:
-            raise IsStalemateWarning(f'{san} gives stalemate, but you did not say "stalemate"')
-        elif not is_stalemate and says_stalemate:
-            # noinspection PyUnboundLocalVariable
-            raise IsNotStalemateWarning(f'{san} does not give stalemate, but you said "{stalemate_token}"')
-
-    return san
+def get_only_move(candidates: Collection[MoveFeatures],
+                  error: Type[PhraseToSANError],
+                  error_msg: str,
+                  optional_conditions: Collection[Callable[[MoveFeatures], bool]] = None) -> MoveFeatures:
+    """
+    Get the only move among ``candidates`` (as looked up in a ``MoveIndex``). Takes ``optional_conditions`` that
+    are used to narrow the candidates only if there are several. If there are no candidates, raises
+    ``PhraseToSANError``. If none or multiple remain after narrowing, raises the given ``error`` with the given
+    ``error_msg``.
+    """
+    if optional_conditions is None:
+        optional_conditions = []
+
+    if not candidates:
+        raise PhraseToSANError('No matching SAN move')
+    elif len(candidates) == 1:
+        return candidates[0]
+    else:
+        if not optional_conditions:
+            raise error(error_msg)
+
+        only_move = None
+        for candidate in candidates:
+            if any((not condition(candidate) for condition in optional_conditions)):
+                continue
+
+            if only_move is not None:
+                raise error(error_msg)
+            only_move = candidate
+
+        if only_move is None:
+            raise error(error_msg)
+        return only_move
+
+
+class Resolution(NamedTuple):
+    """
+    How to find the move for a phrase that matched one of the grammar's rules: ``candidates`` gets
+    the legal moves that fit the ``MoveQuery``, and ``error`` is raised with ``message`` (formatted
+    with the query's fields) unless exactly one remains after narrowing them down with the phrase's
+    "check"/"checkmate"/"stalemate". With ``first``, the first candidate is taken instead (these are
+    rules where the phrase names the destination square and the piece or source file, so only
+    promotions can give several). With ``strict_extra``, the words between the source and destination
+    may only be nothing or "takes".
+    """
+    candidates: Callable[[MoveQuery, MoveIndex], List[MoveFeatures]]
+    error: Type[PhraseToSANError]
+    message: str
+    first: bool = False
+    strict_extra: bool = False
+
+
+def file_index(file: str) -> int:
+    return FILES.index(file)
+
+
+def rank_index(rank: str) -> int:
+    return RANKS.index(rank)
+
+
+RESOLUTIONS: Dict[str, Resolution] = {
+    'castles_side': Resolution(
+        lambda q, index: index.castles(kingside=q.side == 'kingside', queenside=q.side == 'queenside'),
+        PhraseToSANError,
+        'Cannot {side} castle here'),
+    'castles': Resolution(
+        lambda q, index: index.castles(),
+        UnspecifiedCastlingDirection,
+        'Please specify castling direction'),
+    'promotes': Resolution(
+        lambda q, index: index.promotions(),
+        AmbiguousSourceOrDestination,
+        'There are multiple ways to promote to a {promotion}'),
+    'check': Resolution(
+        lambda q, index: index.checking_moves(),
+        AmbiguousCaptureSourceOrDestination,
+        'Multiple checks exist'),
+    'piece_check': Resolution(
+        lambda q, index: [move for move in index.select(piece_type=PIECE_TYPES[q.piece]) if index.gives_check(move)],
+        AmbiguousSourceOrDestination,
+        'Multiple {piece} checks exist'),
+    'takes': Resolution(
+        lambda q, index: index.select(is_capture=True),
+        AmbiguousSourceOrDestination,
+        'Multiple captures exist'),
+    'file_takes': Resolution(
+        lambda q, index: index.select(is_capture=True, piece_type=chess.PAWN, from_file=file_index(q.from_file)),
+        AmbiguousCaptureDestination,
+        'There are multiple pawns on the {from_file}-file that can take a piece'),
+    'takes_file': Resolution(
+        lambda q, index: index.select(is_capture=True, piece_type=chess.PAWN, to_file=file_index(q.to_file)),
+        AmbiguousCaptureDestination,
+        'There are multiple pawns that can take onto the {to_file}-file'),
+    'takes_square': Resolution(
+        lambda q, index: index.select(is_capture=True, to_square=square(q.to_file, q.to_rank)),
+        AmbiguousCaptureSource,
+        'Multiple pieces can take on {to_file}{to_rank}'),
+    'takes_piece': Resolution(
+        lambda q, index: index.select(is_capture=True, captured_type=PIECE_TYPES[q.captured]),
+        AmbiguousCaptureSourceOrDestination,
+        'Multiple {captured}s can be taken, or multiple pieces can take a {captured}'),
+    'piece_takes': Resolution(
+        lambda q, index: index.select(is_capture=True, piece_type=PIECE_TYPES[q.piece]),
+        AmbiguousCaptureSourceOrDestination,
+        'Multiple pieces can be taken by a {piece}, or multiple {piece}s can take a piece'),
+    'piece_takes_piece': Resolution(
+        lambda q, index: index.select(is_capture=True,
+                                      piece_type=PIECE_TYPES[q.piece],
+                                      captured_type=PIECE_TYPES[q.captured]),
+        AmbiguousCaptureSourceOrDestination,
+        'There are multiple ways for a {piece} to take a {captured}'),
+    'uci': Resolution(
+        lambda q, index: index.select(from_square=square(q.from_file, q.from_rank),
+                                      to_square=square(q.to_file, q.to_rank)),
+        PhraseToSANError,
+        'Phrase was interpreted as UCI, but the move "{from_file}{from_rank}{to_file}{to_rank}" is invalid',
+        first=True),
+    'file_square': Resolution(
+        lambda q, index: index.select(piece_type=chess.PAWN,
+                                      from_file=file_index(q.from_file),
+                                      to_square=square(q.to_file, q.to_rank)),
+        PhraseToSANError,
+        'Invalid pawn capture: "{phrase}"',
+        first=True, strict_extra=True),
+    'file_file': Resolution(
+        lambda q, index: index.select(is_capture=True,
+                                      piece_type=chess.PAWN,
+                                      from_file=file_index(q.from_file),
+                                      to_file=file_index(q.to_file)),
+        AmbiguousCaptureDestination,
+        'Multiple pawns on the {from_file}-file can take onto the {to_file}-file',
+        strict_extra=True),
+    'square': Resolution(
+        lambda q, index: index.select(piece_type=chess.PAWN,
+                                      from_file=file_index(q.to_file),
+                                      to_square=square(q.to_file, q.to_rank)),
+        InvalidDestination,
+        'No pawn can move to {to_file}{to_rank}',
+        first=True),
+    'piece_from_square_takes_piece': Resolution(
+        lambda q, index: index.select(is_capture=True,
+                                      from_square=square(q.from_file, q.from_rank),
+                                      piece_type=PIECE_TYPES[q.piece],
+                                      captured_type=PIECE_TYPES[q.captured]),
+        AmbiguousCaptureDestination,
+        'Multiple {captured}s can be taken by the {piece} on {from_file}{from_rank}'),
+    'piece_from_square_square': Resolution(
+        lambda q, index: index.select(piece_type=PIECE_TYPES[q.piece],
+                                      from_square=square(q.from_file, q.from_rank),
+                                      to_square=square(q.to_file, q.to_rank)),
+        InvalidSourceOrDestination,
+        'No valid SAN for phrase: "{phrase}"',
+        first=True, strict_extra=True),
+    'piece_file_takes_piece': Resolution(
+        lambda q, index: index.select(is_capture=True,
+                                      piece_type=PIECE_TYPES[q.piece],
+                                      from_file=file_index(q.from_file),
+                                      captured_type=PIECE_TYPES[q.captured]),
+        AmbiguousCaptureSourceOrDestination,
+        'There are multiple ways for a {piece} on the {from_file}-file to take a {captured}'),
+    'piece_file_square': Resolution(
+        lambda q, index: index.select(piece_type=PIECE_TYPES[q.piece],
+                                      from_file=file_index(q.from_file),
+                                      to_square=square(q.to_file, q.to_rank)),
+        AmbiguousCaptureSource,
+        'Multiple {piece}s from the {from_file}-file can take on {to_file}{to_rank}',
+        strict_extra=True),
+    'piece_rank_takes_piece': Resolution(
+        lambda q, index: index.select(is_capture=True,
+                                      piece_type=PIECE_TYPES[q.piece],
+                                      from_rank=rank_index(q.from_rank),
+                                      captured_type=PIECE_TYPES[q.captured]),
+        AmbiguousCaptureSourceOrDestination,
+        'There are multiple ways for a {piece} on the rank {from_rank} to take a {captured}'),
+    'piece_rank_square': Resolution(
+        lambda q, index: index.select(piece_type=PIECE_TYPES[q.piece],
+                                      from_rank=rank_index(q.from_rank),
+                                      to_square=square(q.to_file, q.to_rank)),
+        AmbiguousCaptureSource,
+        'Multiple {piece}s from rank {from_rank} can take on {to_file}{to_rank}',
+        strict_extra=True),
+    'piece_square': Resolution(
+        lambda q, index: index.select(piece_type=PIECE_TYPES[q.piece], to_square=square(q.to_file, q.to_rank)),
+        AmbiguousCaptureSource,
+        'Multiple {piece}s can take on {to_file}{to_rank}'),
+}
+'''How to resolve a phrase that matched each of the grammar's rules (see ``grammar.RULES``).'''
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_query(parsed: ParsedPhrase) -> MoveQuery:
+    """
+    Parse the tokens of a ``parsed`` phrase into a ``MoveQuery`` (see ``grammar.GRAMMAR``). This doesn't
+    depend on the position, so results are cached.
+    """
+    return GRAMMAR.parse(*parsed)
+
+
+def query_result(query: MoveQuery, index: MoveIndex, counts: Optional[Dict[str, int]] = None) -> PhraseResult:
+    """
+    Find the only legal move in ``index`` that fits the ``query``. The result has no SAN or warnings yet.
+    If there are ``counts`` (see ``instrumentation.COUNTS``), the conditions evaluated are added to them.
+    """
+    if query.rule is None:
+        return PhraseResult(Status.UNPARSED, query, error=PhraseToSANError,
+                            template='Could not parse phrase: "{phrase}"')
+
+    resolution = RESOLUTIONS[query.rule]
+    if resolution.strict_extra and query.extra not in ((), ('takes',)):
+        return PhraseResult(Status.UNPARSED, query, error=PhraseToSANError,
+                            template='Could not parse phrase: "{phrase}" (invalid tokens: "{extra_list}")')
+
+    candidates = resolution.candidates(query, index)
+    if query.promotion is not None:
+        if query.rule == 'promotes' and not index.promotion_mask:
+            # Ex. "bishop" on its own, where it can't mean a promotion
+            return PhraseResult(Status.UNPARSED, query, error=PhraseToSANError,
+                                template='Could not parse phrase: "{phrase}"')
+        if query.promotion and query.promotion not in PROMOTABLE_PIECE_NAMES:
+            return PhraseResult(Status.NO_MATCH, query, error=InvalidPromotionPiece,
+                                template='Invalid promotion piece: "{promotion}"')
+        promotion = PIECE_TYPES.get(query.promotion)
+        promotions = [move for move in candidates if move.promotion and promotion in (None, move.promotion)]
+        if candidates and not any(move.promotion for move in candidates):
+            return PhraseResult(Status.NO_MATCH, query, candidates=tuple(candidates), error=PromotionPieceError,
+                                template='Not a promotion: "{phrase}"')
+        candidates = promotions
+        if candidates and promotion is None:
+            return PhraseResult(Status.AMBIGUOUS, query, candidates=tuple(candidates),
+                                error=UnspecifiedPromotionPiece, template='Unspecified promotion piece: "{phrase}"')
+    elif index.promotion_mask and candidates:
+        # Promotions only count if the phrase says what to promote to, unless the phrase can't mean anything else
+        others = [move for move in candidates if not move.promotion]
+        if not others and len({(move.from_square, move.to_square) for move in candidates}) == 1:
+            return PhraseResult(Status.AMBIGUOUS, query, candidates=tuple(candidates),
+                                error=UnspecifiedPromotionPiece, template='Unspecified promotion piece: "{phrase}"')
+        if resolution.first:
+            candidates = others
+
+    if len(candidates) == 1:
+        move = candidates[0]
+    elif not candidates:
+        if resolution.first:
+            return PhraseResult(Status.NO_MATCH, query, error=resolution.error, template=resolution.message)
+        return PhraseResult(Status.NO_MATCH, query, error=PhraseToSANError, template='No matching SAN move')
+    elif resolution.first:
+        move = candidates[0]
+    else:
+        # Use check/checkmate as a condition to isolate move
+        says_check, says_mate, says_stalemate = query.says_check, query.says_mate, query.says_stalemate
+        if counts is not None:
+            # A phrase ends in at most one of them, so each candidate is tested once if it says any
+            counts['conditions'] += len(candidates) * (says_check + says_mate + says_stalemate)
+        remaining = [move for move in candidates
+                     if (not says_check or index.gives_check(move))
+                     and (not says_mate or index.gives_mate(move))
+                     and (not says_stalemate or index.gives_stalemate(move))]
+        if len(remaining) != 1:
+            return PhraseResult(Status.AMBIGUOUS if remaining else Status.NO_MATCH, query,
+                                candidates=tuple(candidates), error=resolution.error, template=resolution.message)
+        move = remaining[0]
+
+    if query.rule == 'takes_file':
+        # For this specific phrase, we are looking first for pawn captures onto the given file,
+        # but let's still check that no other piece can capture on the `to_square` for clarity.
+        others = [other for other in index.select(is_capture=True, to_square=move.to_square) if other.move != move.move]
+        if others:
+            return PhraseResult(Status.AMBIGUOUS, query, candidates=(move, *others), error=AmbiguousCaptureSource,
+                                template='Another piece can capture on {detail}. It seems like you want to take '
+                                         'with the pawn, but please clarify.',
+                                detail=chess.square_name(move.to_square))
+
+    return PhraseResult(Status.RESOLVED, query, move=move, candidates=(move,))
+
+
+def resolve_query(query: MoveQuery, index: MoveIndex) -> MoveFeatures:
+    """
+    Find the only legal move in ``index`` that fits the ``query``, or raise a ``PhraseToSANError``.
+    """
+    result = query_result(query, index)
+    if result.error is not None:
+        raise result.exception()
+    return result.move
+
+
+def phrase_to_move(parsed: ParsedPhrase, index: MoveIndex) -> MoveFeatures:
+    """
+    Find the only legal move in ``index`` described by the ``parsed`` phrase,
+    or raise a ``PhraseToSANError``.
+    """
+    return resolve_query(parse_query(parsed), index)
+
+
+TAKES_RULES = frozenset(rule.name for rule in GRAMMAR.rules if 'takes' in rule.pattern)
+'''Rules whose phrases always say "takes".'''
+
+
+def says_takes(query: MoveQuery) -> bool:
+    """
+    Whether the phrase of ``query`` says "takes" (in whatever locale it was said in).
+    """
+    return query.rule in TAKES_RULES or 'takes' in query.extra
+
+SQUARE_RULES = frozenset(rule.name for rule in GRAMMAR.rules if 'to_rank' in rule.pattern and rule.name != 'uci')
+'''
+Rules whose phrases spell out the destination square like SAN does, so they should say "takes" for captures
+and only disambiguate as much as SAN would. UCI-style phrases always give both squares, so they are exempt.
+'''
+
+
+def warning_flags(move: MoveFeatures, parsed: Union[ParsedPhrase, MoveQuery], index: MoveIndex) -> WarningFlag:
+    """
+    Get the flags of every warning that applies to playing ``move`` for the ``parsed`` phrase.
+    Apart from check, checkmate and stalemate, this only looks at the move's precomputed features (see
+    ``MoveIndex.disambiguator()`` and ``disambiguates()``), so it costs the same however many legal moves there are.
+    """
+    query = parse_query(parsed) if isinstance(parsed, ParsedPhrase) else parsed
+    is_mate = index.gives_mate(move)
+    is_check = index.gives_check(move)
+    is_stalemate = index.gives_stalemate(move)
+
+    # A mate is also a check, and saying "checkmate" also says "check"
+    says_check = parsed.says_check or parsed.says_mate
+
+    flags = 0
+    if is_mate and not parsed.says_mate:
+        flags |= WarningFlag.IS_CHECKMATE
+    elif not is_mate and parsed.says_mate:
+        flags |= WarningFlag.IS_NOT_CHECKMATE
+    if is_check and not says_check and not is_mate:
+        flags |= WarningFlag.IS_CHECK
+    elif not is_check and says_check:
+        flags |= WarningFlag.IS_NOT_CHECK
+    if is_stalemate and not parsed.says_stalemate:
+        flags |= WarningFlag.IS_STALEMATE
+    elif not is_stalemate and parsed.says_stalemate:
+        flags |= WarningFlag.IS_NOT_STALEMATE
+
+    takes = says_takes(query)
+    if takes and not move.is_capture:
+        flags |= WarningFlag.IS_NOT_CAPTURE
+    elif query.rule in SQUARE_RULES:
+        if move.is_capture and not takes:
+            flags |= WarningFlag.IS_CAPTURE
+        # Over-disambiguated: a file or rank the move didn't need, or both when either one would have done
+        gives_file, gives_rank = query.from_file is not None, query.from_rank is not None
+        if gives_file or gives_rank:
+            if not any(index.disambiguator(move)) or (gives_file and gives_rank and any(index.disambiguates(move))):
+                flags |= WarningFlag.IS_NOT_AMBIGUOUS
+    return WarningFlag(flags)
+
+
+def get_warnings(move: MoveFeatures, parsed: ParsedPhrase, index: MoveIndex) -> List[PhraseToSANWarning]:
+    """
+    Get every warning that applies to playing ``move`` for the ``parsed`` phrase, in the order
+    ``phrase_to_san(..., raise_warnings=True)`` checks them.
+    """
+    flags = warning_flags(move, parsed, index)
+    return [warning_for(flag, index.san(move)) for flag in WARNINGS if flag & flags]
+
+
+def resolve_phrase(phrase: str,
+                   board: Union[chess.Board, Position],
+                   *,
+                   index: Optional[MoveIndex] = None,
+                   warnings: bool = True,
+                   locale: Union[str, Locale, None] = None) -> PhraseResult:
+    """
+    Take a spoken-English ``phrase`` and find the move it describes given the state of the provided ``board``,
+    like ``phrase_to_san()``, but return a ``PhraseResult`` instead of raising errors and warnings.
+
+    Pass an ``index`` built from the current position of ``board`` to reuse its legal moves across several
+    phrases. Without ``warnings``, the (lazily computed) checkmate and stalemate probes that warnings need
+    are skipped and ``PhraseResult.warnings`` is always empty. See ``parse_phrase()`` for ``locale``.
+    """
+    if HOOKS:
+        return _resolve_phrase_traced(phrase, board, index, warnings, locale)
+
+    if index is None:
+        index = MoveIndex(board)
+
+    query = parse_query(parse_phrase(phrase, locale))
+    result = query_result(query, index)
+    if result.move is None:
+        return result
+    return result._replace(san=index.san(result.move),
+                           warnings=warning_flags(result.move, query, index) if warnings else WarningFlag(0))
+
+
+def _resolve_phrase_traced(phrase: str, board: Union[chess.Board, Position], index: Optional[MoveIndex], warnings: bool,
+                           locale: Union[str, Locale, None]) -> PhraseResult:
+    """
+    ``resolve_phrase()``, timing each stage and passing a ``ResolveTrace`` to every hook (see ``instrumentation``).
+    """
+    clock = time.perf_counter
+    start = clock()
+    generated = 0
+    if index is None:
+        index = MoveIndex(board)
+        generated = len(index.moves)
+    checks, replies = index.probe_counts()
+    indexed = clock()
+    compiled = ENGLISH if locale is None else get_locale(locale)
+    # Timed here rather than read off the normalizer, which other threads may be using at the same time
+    normalized = compiled.normalizer.normalize(phrase)
+    normalized_at = clock()
+    parsed = split_suffix(normalized, compiled.split(normalized))
+    parsed_at = clock()
+    query = parse_query(parsed)
+    queried = clock()
+    counts = {'conditions': 0}
+    result = query_result(query, index, counts)
+    resolved = clock()
+    if result.move is not None:
+        result = result._replace(san=index.san(result.move),
+                                 warnings=warning_flags(result.move, query, index) if warnings else WarningFlag(0))
+    finished = clock()
+
+    new_checks, new_replies = (after - before for after, before in zip(index.probe_counts(), (checks, replies)))
+    trace = ResolveTrace(
+        phrase, query.rule, result.status.value, result.error.__name__ if result.error is not None else None,
+        {'index': indexed - start, 'normalize': normalized_at - indexed, 'tokenize': parsed_at - normalized_at,
+         'grammar': queried - parsed_at, 'resolve': resolved - queried, 'warnings': finished - resolved},
+        {'moves_generated': generated, 'candidates': len(result.candidates), 'conditions': counts['conditions'],
+         'check_probes': new_checks, 'reply_probes': new_replies, 'board_pushes': new_checks + new_replies})
+    for hook in list(HOOKS):
+        hook(trace)
+    return result
+
+
+def phrase_to_san(phrase: str,
+                  board: Union[chess.Board, Position],
+                  *,
+                  raise_warnings: bool = False,
+                  index: Optional[MoveIndex] = None,
+                  locale: Union[str, Locale, None] = None) -> str:
+    """
+    Take a spoken-English ``phrase`` and convert it to SAN
+    given the state of the provided ``board``.
+
+    Pass an ``index`` built from the current position of ``board`` to reuse
+    its legal moves across several phrases; otherwise one is built here.
+
+    ``board`` is only read (to copy it), never moved. To resolve phrases on other
+    threads while the game goes on, pass a ``Position`` snapshot of it instead.
+
+    For phrases in another language, pass the name of its ``locale`` (ex. ``'es'``, see ``locales``).
+    """
+    result = resolve_phrase(phrase, board, index=index, warnings=raise_warnings, locale=locale)
+    if result.error is not None or result.warnings:
+        raise result.exception()
+    return result.san
+
+
+def phrases_to_san(hypotheses: Sequence[str],
+                   board: Union[chess.Board, Position],
+                   scores: Optional[Sequence[float]] = None,
+                   *,
+                   stop_early: bool = True,
+                   index: Optional[MoveIndex] = None,
+                   locale: Union[str, Locale, None] = None) -> List[HypothesisResult]:
+    """
+    Resolve an N-best list of speech recognition ``hypotheses`` for one move against ``board``.
+
+    The legal moves, check/mate probes and SAN strings of the position are shared across the
+    whole batch, and hypotheses that normalize to the same phrase are only resolved once.
+    Hypotheses are tried from the highest ``scores`` down (or in the given order if there are
+    no scores). With ``stop_early``, no more are tried once one resolves with no warnings.
+
+    Returns a ``HypothesisResult`` for each hypothesis that was tried, ranked with clean
+    results first, then results with warnings, then errors (each group in score order).
+    Errors and warnings are returned rather than raised. See ``parse_phrase()`` for ``locale``.
+    """
+    if scores is not None and len(scores) != len(hypotheses):
+        raise ValueError(f'Got {len(scores)} scores for {len(hypotheses)} hypotheses')
+    if index is None:
+        index = MoveIndex(board)
+
+    order = range(len(hypotheses))
+    if scores is not None:
+        order = sorted(order, key=lambda i: -scores[i])
+
+    resolved = {}
+    results = []
+    for i in order:
+        parsed = parse_phrase(hypotheses[i], locale)
+        if parsed not in resolved:
+            query = parse_query(parsed)
+            result = query_result(query, index)
+            if result.error is not None:
+                resolved[parsed] = (None, result.exception(), ())
+            else:
+                san = index.san(result.move)
+                warnings = warning_flags(result.move, query, index)
+                resolved[parsed] = (san, None, tuple(warning_for(flag, san) for flag in WARNINGS if flag & warnings))
+
+        san, error, warnings = resolved[parsed]
+        result = HypothesisResult(hypotheses[i], scores[i] if scores is not None else None, san, error, warnings)
+        results.append(result)
+        if stop_early and result.is_clean:
+            break
+
+    return sorted(results, key=lambda result: (result.error is not None, bool(result.warnings)))
+
 
 def main():
-    b = chess.Board()
+    # Imported here because ``phrase_session`` builds on this module
+    from phrase_session import PhraseSession
+
+    session = PhraseSession()
     flipped = False
 
     USE_SVG = True
@@ -572,9 +763,10 @@ def main():
     SENTINELS = ['stop', 'done', 'exit', 'quit', 'break']
     while True:
         if USE_SVG:
-            yield b, flipped, output
+            yield session.board, flipped, output
             time.sleep(0.1)
         else:
+            b = session.board
             print(b if not flipped else b.transform(chess.flip_vertical).transform(chess.flip_horizontal))
 
         phrase = input('Enter a move as a spoken-English phrase:\n>>> ')
@@ -582,26 +774,26 @@ def main():
             break
 
         if phrase == 'reset':
-            b = chess.Board()
+            session.reset()
             continue
         elif phrase == 'flip':
             flipped = not flipped
             continue
         elif phrase == 'pop':
-            b.pop()
+            session.pop()
             continue
 
         if ALLOW_SAN:
             try:
                 for san in phrase.split():
-                    b.push_san(san)
+                    session.push_san(san)
                 continue
             except ValueError:
                 pass
         try:
-            san = phrase_to_san(phrase, b, raise_warnings=RAISE_WARNINGS)
+            san = session.phrase_to_san(phrase, raise_warnings=RAISE_WARNINGS)
             output = f'SAN: {san}'
-            b.push_san(san)
+            session.push_san(san)
         except PhraseToSANError as e:
             output = f'Error: {str(e)}'
         except PhraseToSANWarning as e:
@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Set, Union
+
+from grammar import GRAMMAR
+from locales import Locale, get_locale
+from move_index import MoveFeatures
+from phrase_table import PhraseTable
+
+SUFFIX_WORDS = ('check', 'checkmate', 'stalemate')
+
+
+class TrieNode:
+    __slots__ = ('children', 'move_ids', 'move')
+
+    def __init__(self):
+        self.children: Dict[str, 'TrieNode'] = {}
+        self.move_ids: Set[int] = set()
+        self.move: Optional[MoveFeatures] = None
+        '''The move this exact phrase resolves to, if it is a whole phrase in the table.'''
+
+
+class PhraseTrie:
+    """
+    The phrases of a ``PhraseTable``, stored word by word. Each node holds the ids of the moves that
+    some phrase starting with that prefix resolves to, which are the moves still possible after
+    hearing the prefix.
+    """
+
+    def __init__(self, table: PhraseTable):
+        self.table = table
+        self.root = TrieNode()
+        for (tokens, says_check, says_mate, says_stalemate), (move, _) in table.entries.items():
+            suffix = ('check',) if says_check else ('checkmate',) if says_mate else \
+                ('stalemate',) if says_stalemate else ()
+            node = self.root
+            node.move_ids.add(move.id)
+            for word in tokens + suffix:
+                child = node.children.get(word)
+                if child is None:
+                    child = node.children[word] = TrieNode()
+                node = child
+                node.move_ids.add(move.id)
+            node.move = move
+
+    def walk(self, words: List[str]) -> Optional[TrieNode]:
+        """
+        Get the node for the prefix ``words``, or ``None`` if no phrase starts with it.
+        """
+        node = self.root
+        for word in words:
+            node = node.children.get(word)
+            if node is None:
+                return None
+        return node
+
+
+class IncrementalParser:
+    """
+    Follows a phrase as it is being spoken, and keeps track of the legal moves that are still
+    consistent with what has been heard so far, so that a move can be committed as soon as only
+    one is left (ex. "knight takes..." when only one knight capture exists).
+
+    A move is consistent with a prefix if some phrase in the position's ``PhraseTable`` starts with
+    that prefix and resolves to the move, so this follows the same rules as ``phrase_to_san()``.
+    Words the grammar doesn't know (ex. "to" in "knight to f 3") are skipped as filler. Once the
+    phrase is over, ``finish()`` resolves the whole of it with ``phrase_to_san()``. The phrase is heard
+    in ``locale`` (see ``locales``); the trie holds the grammar's tokens, so it serves every locale.
+    """
+
+    def __init__(self,
+                 table: PhraseTable,
+                 *,
+                 trie: Optional[PhraseTrie] = None,
+                 locale: Union[str, Locale, None] = None):
+        self.table = table
+        self.trie = trie if trie is not None else PhraseTrie(table)
+        self.locale = get_locale(locale)
+        self.transcript = ''
+        self.node: Optional[TrieNode] = self.trie.root
+
+    def update(self, transcript: str) -> Optional[str]:
+        """
+        Replace everything heard so far with a new partial ``transcript`` (ex. when the recognizer revises
+        its hypothesis). Returns the SAN of the only consistent move, if there is only one.
+        """
+        self.transcript = transcript
+        words = [word for word in self.locale.tokenize(transcript)[1]
+                 if word in GRAMMAR.token_classes or word in SUFFIX_WORDS]
+        self.node = self.trie.walk(words)
+        return self.only_san
+
+    def feed(self, words: str) -> Optional[str]:
+        """
+        Add the next word(s) to the transcript. Returns the SAN of the only consistent move, if there is only one.
+        """
+        return self.update(f'{self.transcript} {words}' if self.transcript else words)
+
+    def reset(self):
+        self.update('')
+
+    @property
+    def candidates(self) -> List[MoveFeatures]:
+        """
+        The legal moves that are still consistent with the transcript, in legal move order.
+        """
+        if self.node is None:
+            return []
+        moves = self.table.index.moves
+        return [moves[i] for i in sorted(self.node.move_ids)]
+
+    @property
+    def only_move(self) -> Optional[MoveFeatures]:
+        if self.node is None or len(self.node.move_ids) != 1:
+            return None
+        return self.table.index.moves[next(iter(self.node.move_ids))]
+
+    @property
+    def only_san(self) -> Optional[str]:
+        move = self.only_move
+        return self.table.index.san(move) if move is not None else None
+
+    @property
+    def is_whole_phrase(self) -> bool:
+        """
+        Whether the transcript so far is already a whole phrase that resolves to a move.
+        """
+        return self.node is not None and self.node.move is not None
+
+    def finish(self, *, raise_warnings: bool = False) -> str:
+        """
+        Resolve the whole transcript, same as ``phrase_to_san()``.
+        """
+        return self.table.phrase_to_san(self.transcript, raise_warnings=raise_warnings, locale=self.locale)
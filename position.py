@@ -0,0 +1,80 @@
+import chess
+
+from typing import NamedTuple, Optional, Union
+
+
+class Position(NamedTuple):
+    """
+    An immutable snapshot of a ``chess.Board``: its bitboards and the state needed to generate legal moves,
+    without the move stack. Snapshots are hashable and cheap to take, and can be shared between threads
+    freely, since nothing can change them.
+
+    Take a snapshot on the thread that owns the board (ex. right after a move is played) and hand it to
+    the threads that resolve phrases; resolving against a ``Position`` never touches the live board. Code
+    that needs to play moves on it (ex. to see whether a move gives check) gets its own ``board()``.
+    """
+    pawns: chess.Bitboard
+    knights: chess.Bitboard
+    bishops: chess.Bitboard
+    rooks: chess.Bitboard
+    queens: chess.Bitboard
+    kings: chess.Bitboard
+    white: chess.Bitboard
+    black: chess.Bitboard
+    promoted: chess.Bitboard
+    turn: chess.Color
+    castling_rights: chess.Bitboard
+    ep_square: Optional[chess.Square]
+    halfmove_clock: int
+    fullmove_number: int
+    chess960: bool = False
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> 'Position':
+        return cls(board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+                   board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.promoted,
+                   board.turn, board.castling_rights, board.ep_square, board.halfmove_clock, board.fullmove_number,
+                   board.chess960)
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Position':
+        return cls.from_board(chess.Board(fen))
+
+    def board(self) -> chess.Board:
+        """
+        Get a new board in this position (with an empty move stack), that the caller is free to change.
+        """
+        board = chess.Board(None, chess960=self.chess960)
+        board.pawns, board.knights, board.bishops = self.pawns, self.knights, self.bishops
+        board.rooks, board.queens, board.kings = self.rooks, self.queens, self.kings
+        board.occupied_co[chess.WHITE] = self.white
+        board.occupied_co[chess.BLACK] = self.black
+        board.occupied = self.white | self.black
+        board.promoted = self.promoted
+        board.turn = self.turn
+        board.castling_rights = self.castling_rights
+        board.ep_square = self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        return board
+
+    def fen(self) -> str:
+        return self.board().fen()
+
+    def without_clocks(self) -> 'Position':
+        """
+        Get this position with the halfmove clock and fullmove number reset, so that the same position reached at
+        different points of different games compares (and hashes) equal. Neither affects how phrases resolve.
+        """
+        if self.halfmove_clock == 0 and self.fullmove_number == 1:
+            return self
+        return self._replace(halfmove_clock=0, fullmove_number=1)
+
+
+def as_board(board: Union[chess.Board, Position]) -> chess.Board:
+    """
+    Get a private copy of ``board`` (or a new board for a ``Position``), without its move stack.
+    """
+    if isinstance(board, Position):
+        return board.board()
+    return board.copy(stack=False)
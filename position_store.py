@@ -0,0 +1,427 @@
+"""
+A compact binary store of the per-position work ``phrase_to_san()`` does: legal moves, their SAN and check,
+checkmate and stalemate flags, and the ``PhraseTable`` of the position. Build it once for the positions that
+come up most (ex. openings), then every worker process maps the same file (or ``multiprocessing.shared_memory``
+block) and reads from it in place:
+
+    python position_store.py build openings.bin --positions 500
+    python position_store.py build games.bin --pgn games.pgn --plies 16 --positions 2000
+
+    store = PositionStore.open('openings.bin')
+    artifact = store.get(board)                # ``None`` if the position isn't in the store
+    san = artifact.phrase_to_san('knight f 3')
+
+All numbers are little-endian. The file is a header, a directory of ``(zobrist hash, offset)`` sorted by hash,
+one block per position, and a pool of UTF-8 strings that the blocks point into (each distinct string is stored
+once, however many positions use it). A position block is a ``POSITION`` record followed by a ``MOVE`` record per
+legal move, in ``MoveIndex`` order, and a ``PHRASE`` record per phrase of its table, sorted by phrase.
+"""
+import argparse
+import bisect
+import collections
+import itertools
+import mmap
+import struct
+import sys
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from locales import Locale
+from move_index import MoveIndex
+from phrase_table import PhraseTable
+from phrase_to_san import WARNINGS, parse_phrase, phrase_to_san, warning_for
+
+MAGIC = b'SANP'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHIII')
+'''Magic, version, reserved, number of positions, offset and size of the string pool.'''
+DIRECTORY = struct.Struct('<QI')
+'''Polyglot zobrist hash of a position, and the offset of its block.'''
+POSITION = struct.Struct('<IHHI')
+'''Offset and length of the EPD of the position, number of moves, number of phrases.'''
+MOVE = struct.Struct('<BBBBBBHI')
+'''
+From square, to square, piece type, captured piece type (or 0), promotion (or 0), ``MOVE_*`` flags, length and
+offset of the SAN.
+'''
+PHRASE = struct.Struct('<IHHH')
+'''Offset and length of the phrase key (see ``phrase_key()``), id of its move, and its ``WarningFlag``s.'''
+
+MOVE_CAPTURE = 1
+MOVE_CASTLING = 2
+MOVE_CHECK = 4
+MOVE_NO_REPLY = 8
+'''The opponent has no legal move after it (so it is checkmate if it is check, and stalemate otherwise).'''
+
+SUFFIXES = ('', ' check', ' checkmate', ' stalemate')
+
+OPENING_LINES = [
+    'e4 e5 Nf3 Nc6 Bb5 a6 Ba4 Nf6 O-O Be7 Re1 b5 Bb3 d6 c3 O-O',
+    'e4 e5 Nf3 Nc6 Bc4 Bc5 c3 Nf6 d3 d6 O-O O-O',
+    'e4 e5 Nf3 Nc6 d4 exd4 Nxd4 Nf6 Nxc6 bxc6 e5 Qe7',
+    'e4 e5 Nf3 Nf6 Nxe5 d6 Nf3 Nxe4 d4 d5 Bd3 Nc6',
+    'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6 Be3 e5 Nb3 Be6',
+    'e4 c5 Nf3 Nc6 d4 cxd4 Nxd4 Nf6 Nc3 e5 Ndb5 d6',
+    'e4 c5 Nf3 e6 d4 cxd4 Nxd4 Nc6 Nc3 Qc7 Be2 a6',
+    'e4 c5 Nc3 Nc6 g3 g6 Bg2 Bg7 d3 d6',
+    'e4 e6 d4 d5 Nc3 Nf6 Bg5 Be7 e5 Nfd7 Bxe7 Qxe7',
+    'e4 e6 d4 d5 Nd2 c5 exd5 exd5 Ngf3 Nc6',
+    'e4 c6 d4 d5 Nc3 dxe4 Nxe4 Bf5 Ng3 Bg6 h4 h6',
+    'e4 c6 d4 d5 e5 Bf5 Nf3 e6 Be2 c5',
+    'e4 d5 exd5 Qxd5 Nc3 Qa5 d4 Nf6 Nf3 Bf5',
+    'e4 d6 d4 Nf6 Nc3 g6 f4 Bg7 Nf3 O-O',
+    'd4 d5 c4 e6 Nc3 Nf6 Bg5 Be7 e3 O-O Nf3 Nbd7',
+    'd4 d5 c4 c6 Nf3 Nf6 Nc3 dxc4 a4 Bf5',
+    'd4 d5 c4 dxc4 Nf3 Nf6 e3 e6 Bxc4 c5 O-O a6',
+    'd4 Nf6 c4 g6 Nc3 Bg7 e4 d6 Nf3 O-O Be2 e5',
+    'd4 Nf6 c4 e6 Nc3 Bb4 e3 O-O Bd3 d5 Nf3 c5',
+    'd4 Nf6 c4 e6 Nf3 b6 g3 Ba6 b3 Bb4+',
+    'd4 Nf6 c4 c5 d5 e6 Nc3 exd5 cxd5 d6',
+    'd4 d5 Bf4 Nf6 e3 c5 c3 Nc6 Nd2 e6 Ngf3 Bd6',
+    'd4 d5 Nf3 Nf6 c4 e6 g3 Be7 Bg2 O-O',
+    'c4 e5 Nc3 Nf6 g3 d5 cxd5 Nxd5 Bg2 Nb6',
+    'c4 Nf6 Nc3 e6 e4 d5 e5 d4',
+    'Nf3 d5 g3 Nf6 Bg2 e6 O-O Be7 d3 O-O',
+    'e4 e5 Bc4 Nc6 Qh5 Nf6 Qxf7#',
+    'f4 d5 Nf3 Nf6 e3 g6 b3 Bg7',
+]
+'''Main lines of common openings, whose positions make up the default store.'''
+
+
+def phrase_key(tokens: Iterable[str], says_check: bool, says_mate: bool, says_stalemate: bool) -> bytes:
+    """
+    The key a phrase is stored under: its normalized tokens (see ``parse_phrase()``), then its suffix, as UTF-8.
+    """
+    suffix = SUFFIXES[says_check + 2 * says_mate + 3 * says_stalemate]
+    return (' '.join(tokens) + suffix).encode()
+
+
+''' Building '''
+class _Pool:
+    """
+    Strings stored once each, in the order they were first added.
+    """
+
+    def __init__(self):
+        self.offsets: Dict[bytes, int] = {}
+        self.data = bytearray()
+
+    def add(self, string: bytes) -> int:
+        offset = self.offsets.get(string)
+        if offset is None:
+            offset = self.offsets[string] = len(self.data)
+            self.data += string
+        return offset
+
+
+def _position_block(board: chess.Board, pool: _Pool) -> bytes:
+    table = PhraseTable(board)
+    index = table.index
+    flag_of = {warning: flag for flag, (warning, _) in WARNINGS.items()}
+
+    epd = board.epd().encode()
+    block = bytearray(POSITION.pack(pool.add(epd), len(epd), len(index.moves), len(table.entries)))
+    for move in index.moves:
+        san = index.san(move).encode()
+        flags = MOVE_CAPTURE * move.is_capture | MOVE_CASTLING * move.is_castling \
+            | MOVE_CHECK * index.gives_check(move) | MOVE_NO_REPLY * (not index.has_reply(move))
+        block += MOVE.pack(move.from_square, move.to_square, move.piece_type, move.captured_type or 0,
+                           move.promotion or 0, flags, len(san), pool.add(san))
+
+    phrases = sorted((phrase_key(*key), move, warnings) for key, (move, warnings) in table.entries.items())
+    for key, move, warnings in phrases:
+        flags = 0
+        for warning in warnings:
+            flags |= flag_of[type(warning)]
+        block += PHRASE.pack(pool.add(key), len(key), move.id, flags)
+    return bytes(block)
+
+
+def build_store(boards: Iterable[chess.Board]) -> bytes:
+    """
+    Build a store of the positions of ``boards`` (each position once). This builds a ``PhraseTable`` for
+    each position, so it takes a few tens of milliseconds per position.
+    """
+    pool = _Pool()
+    blocks: Dict[Tuple[int, str], bytes] = {}
+    for board in boards:
+        key = (chess.polyglot.zobrist_hash(board), board.epd())
+        if key not in blocks:
+            blocks[key] = _position_block(board, pool)
+
+    offset = HEADER.size + DIRECTORY.size * len(blocks)
+    directory = bytearray()
+    body = bytearray()
+    for (zobrist, _), block in sorted(blocks.items()):
+        directory += DIRECTORY.pack(zobrist, offset + len(body))
+        body += block
+    pool_offset = offset + len(body)
+    return HEADER.pack(MAGIC, VERSION, 0, len(blocks), pool_offset, len(pool.data)) + directory + body + pool.data
+
+
+def share_store(data: bytes, name: Optional[str] = None) -> shared_memory.SharedMemory:
+    """
+    Copy a store into a new ``SharedMemory`` block, for workers to read with ``PositionStore.attach()``. The
+    caller owns the block: ``close()`` and ``unlink()`` it once the workers are done.
+    """
+    block = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+    block.buf[:len(data)] = data
+    return block
+
+
+def opening_positions(lines: Iterable[str] = OPENING_LINES) -> Iterator[chess.Board]:
+    """
+    Yield the starting position and every position of the SAN ``lines``.
+    """
+    for line in lines:
+        board = chess.Board()
+        yield board.copy(stack=False)
+        for san in line.split():
+            board.push_san(san)
+            yield board.copy(stack=False)
+
+
+def pgn_positions(path: str, plies: int) -> Iterator[chess.Board]:
+    """
+    Yield the positions of the first ``plies`` moves of each game in the PGN file at ``path``.
+    """
+    with open(path, encoding='utf-8') as f:
+        while (game := chess.pgn.read_game(f)) is not None:
+            board = game.board()
+            yield board.copy(stack=False)
+            for move in itertools.islice(game.mainline_moves(), plies):
+                board.push(move)
+                yield board.copy(stack=False)
+
+
+def most_common(boards: Iterable[chess.Board], n: int) -> List[chess.Board]:
+    """
+    Get the ``n`` positions that come up most in ``boards``, most common first.
+    """
+    counts = collections.Counter()
+    first: Dict[str, chess.Board] = {}
+    for board in boards:
+        epd = board.epd()
+        counts[epd] += 1
+        first.setdefault(epd, board)
+    return [first[epd] for epd, _ in counts.most_common(n)]
+
+
+''' Reading '''
+class MoveRecord(NamedTuple):
+    id: int
+    move: chess.Move
+    piece_type: chess.PieceType
+    captured_type: Optional[chess.PieceType]
+    san: str
+    flags: int
+
+    @property
+    def gives_check(self) -> bool:
+        return bool(self.flags & MOVE_CHECK)
+
+    @property
+    def gives_mate(self) -> bool:
+        return self.flags & (MOVE_CHECK | MOVE_NO_REPLY) == MOVE_CHECK | MOVE_NO_REPLY
+
+    @property
+    def gives_stalemate(self) -> bool:
+        return self.flags & (MOVE_CHECK | MOVE_NO_REPLY) == MOVE_NO_REPLY
+
+
+class PositionArtifact:
+    """
+    One position of a ``PositionStore``, read in place from its buffer. ``lookup()`` and ``phrase_to_san()``
+    work like those of ``PhraseTable``, and ``move_index()`` gives a ``MoveIndex`` with the SAN and probe flags
+    of every move already filled in.
+    """
+
+    def __init__(self, store: 'PositionStore', offset: int):
+        self.store = store
+        epd_offset, epd_length, self.n_moves, self.n_phrases = POSITION.unpack_from(store.buffer, offset)
+        self.epd = store.string(epd_offset, epd_length)
+        self._moves_offset = offset + POSITION.size
+        self._phrases_offset = self._moves_offset + MOVE.size * self.n_moves
+
+    def __len__(self) -> int:
+        return self.n_phrases
+
+    def board(self) -> chess.Board:
+        return chess.Board.from_epd(self.epd)[0]
+
+    def move(self, move_id: int) -> MoveRecord:
+        from_square, to_square, piece_type, captured_type, promotion, flags, san_length, san_offset = \
+            MOVE.unpack_from(self.store.buffer, self._moves_offset + MOVE.size * move_id)
+        return MoveRecord(move_id, chess.Move(from_square, to_square, promotion or None), piece_type,
+                          captured_type or None, self.store.string(san_offset, san_length), flags)
+
+    def moves(self) -> List[MoveRecord]:
+        return [self.move(move_id) for move_id in range(self.n_moves)]
+
+    def _phrase(self, i: int) -> Tuple[bytes, int, int]:
+        key_offset, key_length, move_id, flags = PHRASE.unpack_from(self.store.buffer,
+                                                                    self._phrases_offset + PHRASE.size * i)
+        return self.store.bytes(key_offset, key_length), move_id, flags
+
+    def lookup(self,
+               phrase: str,
+               *,
+               raise_warnings: bool = False,
+               locale: Union[str, Locale, None] = None) -> Optional[str]:
+        """
+        Get the SAN for ``phrase`` (in ``locale``) from the phrase table, or ``None`` if it is not in the table.
+        Raises the same warning as ``phrase_to_san()`` with ``raise_warnings``.
+        """
+        key = phrase_key(*parse_phrase(phrase, locale)[1:])
+        lo, hi = 0, self.n_phrases
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found, move_id, flags = self._phrase(mid)
+            if found == key:
+                san = self.move(move_id).san
+                if raise_warnings and flags:
+                    raise next(warning_for(flag, san) for flag in WARNINGS if flag & flags)
+                return san
+            if found < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def phrase_to_san(self,
+                      phrase: str,
+                      *,
+                      raise_warnings: bool = False,
+                      index: Optional[MoveIndex] = None,
+                      locale: Union[str, Locale, None] = None) -> str:
+        """
+        Same as ``phrase_to_san(phrase, board, raise_warnings=raise_warnings, locale=locale)`` for this position.
+        """
+        san = self.lookup(phrase, raise_warnings=raise_warnings, locale=locale)
+        if san is None:
+            if index is None:
+                index = self.move_index()
+            san = phrase_to_san(phrase, index.board, raise_warnings=raise_warnings, index=index, locale=locale)
+        return san
+
+    def move_index(self, board: Optional[chess.Board] = None) -> MoveIndex:
+        """
+        Build a ``MoveIndex`` for this position (of ``board``, if given), with the SAN, check and reply flags of
+        its moves taken from the store instead of worked out again.
+        """
+        index = MoveIndex(board if board is not None else self.board())
+        for record, move in zip(self.moves(), index.moves):
+            if record.move != move.move:
+                raise ValueError(f'The store does not match the legal moves of {self.epd}')
+            index._san[move.id] = record.san
+            index._gives_check[move.id] = record.gives_check
+            index._has_reply[move.id] = not record.flags & MOVE_NO_REPLY
+        return index
+
+
+class PositionStore:
+    """
+    Reads a store made by ``build_store()`` from any buffer (``bytes``, a memory map or a ``SharedMemory``
+    block's ``buf``), without copying it. Positions are found by binary search on their zobrist hash.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        self.buffer = memoryview(buffer)
+        self._closers = []
+        magic, version, _, self.n_positions, self._pool_offset, pool_size = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a version {VERSION} position store')
+        self._hashes = [DIRECTORY.unpack_from(self.buffer, HEADER.size + DIRECTORY.size * i)[0]
+                        for i in range(self.n_positions)]
+
+    @classmethod
+    def open(cls, path: str) -> 'PositionStore':
+        """
+        Map the store at ``path`` into memory (read-only, so processes mapping the same file share its pages).
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        store = cls(mapped)
+        store._closers.append(mapped.close)
+        return store
+
+    @classmethod
+    def attach(cls, name: str) -> 'PositionStore':
+        """
+        Read the store in the ``SharedMemory`` block ``name`` (see ``share_store()``).
+        """
+        block = shared_memory.SharedMemory(name=name)
+        store = cls(block.buf)
+        store._closers.append(block.close)
+        return store
+
+    def close(self):
+        self.buffer.release()
+        for close in self._closers:
+            close()
+        self._closers.clear()
+
+    def __len__(self) -> int:
+        return self.n_positions
+
+    def bytes(self, offset: int, length: int) -> bytes:
+        start = self._pool_offset + offset
+        return self.buffer[start:start + length].tobytes()
+
+    def string(self, offset: int, length: int) -> str:
+        return self.bytes(offset, length).decode()
+
+    def get(self, board: chess.Board) -> Optional[PositionArtifact]:
+        """
+        Get the artifact of the position of ``board``, or ``None`` if it is not in the store.
+        """
+        zobrist = chess.polyglot.zobrist_hash(board)
+        i = bisect.bisect_left(self._hashes, zobrist)
+        epd = None
+        while i < self.n_positions and self._hashes[i] == zobrist:
+            artifact = PositionArtifact(self, DIRECTORY.unpack_from(self.buffer, HEADER.size + DIRECTORY.size * i)[1])
+            # Different positions may share a hash; the EPD tells them apart
+            epd = epd or board.epd()
+            if artifact.epd == epd:
+                return artifact
+            i += 1
+        return None
+
+    def __iter__(self) -> Iterator[PositionArtifact]:
+        for i in range(self.n_positions):
+            yield PositionArtifact(self, DIRECTORY.unpack_from(self.buffer, HEADER.size + DIRECTORY.size * i)[1])
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a store')
+    build.add_argument('output')
+    build.add_argument('--positions', type=int, default=500, help='how many of the most common positions to store')
+    build.add_argument('--pgn', help='take the positions from the games of this PGN file instead of OPENING_LINES')
+    build.add_argument('--plies', type=int, default=16, help='how far into each PGN game to take positions from')
+    show = commands.add_parser('show', help='list the positions in a store')
+    show.add_argument('store')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        boards = pgn_positions(args.pgn, args.plies) if args.pgn else opening_positions()
+        data = build_store(most_common(boards, args.positions))
+        with open(args.output, 'wb') as f:
+            f.write(data)
+        print(f'{len(PositionStore(data))} positions, {len(data)} bytes', file=sys.stderr)
+    else:
+        store = PositionStore.open(args.store)
+        for artifact in store:
+            print(f'{artifact.epd}\t{artifact.n_moves} moves\t{len(artifact)} phrases')
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Measure how well dictated games resolve, against the PGN of what was actually played.
+
+    python replay_eval.py games.pgn games.tsv --failures failures.jsonl --json metrics.json --workers 4
+
+``games.tsv`` has one ``game_id<TAB>phrase`` line per move, as for ``transcripts_to_pgn.py``, and its games
+must be in the same order as the games of ``games.pgn``, whose ``[Event]`` header (see ``--id-header``) holds
+the game id. Each game is replayed on one board, always playing the move from the PGN: each phrase is resolved
+with ``resolve_phrase()`` in the position it was said in, so one wrong ply doesn't throw the rest of the game off.
+
+The report gives the accuracy of each grammar rule (the "arm" a phrase was read with), the most common pairs of
+expected and produced SAN among the plies that were wrong, and how often each error and warning class came up.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+
+import chess
+import chess.pgn
+
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from phrase_to_san import Status, resolve_phrase
+from transcripts_to_pgn import read_games
+
+UNPARSED_ARM = 'unparsed'
+'''The arm of phrases that didn't match any grammar rule.'''
+
+
+class ReplayStats:
+    """
+    Totals of a replay, that can be added up across games, batches and processes with ``merge()``.
+    ``as_dict()`` gives flat totals, like ``instrumentation.ResolveStats``.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.clean_games = 0
+        '''Games whose every phrase resolved to the move that was played.'''
+        self.misaligned_games = 0
+        '''Games with a different number of phrases and moves (only the plies both have are replayed).'''
+        self.plies = 0
+        self.correct = 0
+        self.arm_plies: Counter = Counter()
+        self.arm_correct: Counter = Counter()
+        self.confusion: Counter = Counter()
+        '''
+        ``(expected SAN, produced SAN)`` for each wrong ply; the produced SAN is the error class name in brackets
+        if there was none.
+        '''
+        self.errors: Counter = Counter()
+        self.warnings: Counter = Counter()
+        self.seconds = 0.0
+        '''Time spent resolving phrases, summed over all processes.'''
+
+    def merge(self, other: 'ReplayStats') -> 'ReplayStats':
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+        return self
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.plies if self.plies else 0.0
+
+    def arm_accuracy(self) -> Dict[str, Tuple[int, int, float]]:
+        """
+        Get ``(plies, correct, accuracy)`` of each arm, most common arm first.
+        """
+        return {arm: (plies, self.arm_correct[arm], self.arm_correct[arm] / plies)
+                for arm, plies in self.arm_plies.most_common()}
+
+    def as_dict(self, top: int = 20) -> Dict[str, float]:
+        stats = {'games': self.games, 'clean_games': self.clean_games, 'misaligned_games': self.misaligned_games,
+                 'plies': self.plies, 'correct': self.correct, 'accuracy': self.accuracy, 'seconds': self.seconds}
+        for arm, (plies, correct, accuracy) in self.arm_accuracy().items():
+            stats.update({f'arm.{arm}.plies': plies, f'arm.{arm}.correct': correct, f'arm.{arm}.accuracy': accuracy})
+        stats.update({f'confusion.{expected}->{produced}': n
+                      for (expected, produced), n in self.confusion.most_common(top)})
+        stats.update({f'error.{error}': n for error, n in self.errors.items()})
+        stats.update({f'warning.{warning}': n for warning, n in self.warnings.items()})
+        return stats
+
+    def report(self, top: int = 20) -> str:
+        lines = [f'{self.games} games ({self.clean_games} clean, {self.misaligned_games} misaligned), '
+                 f'{self.correct}/{self.plies} plies correct ({self.accuracy:.2%})', '',
+                 f'{"arm":<32}{"plies":>8}{"correct":>9}{"accuracy":>10}']
+        for arm, (plies, correct, accuracy) in self.arm_accuracy().items():
+            lines.append(f'{arm:<32}{plies:>8}{correct:>9}{accuracy:>10.2%}')
+
+        for title, counter in ((f'most common confusions (top {top})', self.confusion),
+                               ('errors', self.errors), ('warnings', self.warnings)):
+            if counter:
+                lines += ['', title]
+                for key, n in counter.most_common(top):
+                    label = ' -> '.join(key) if isinstance(key, tuple) else key
+                    lines.append(f'{n:>8}  {label}')
+        return '\n'.join(lines)
+
+
+class ReplayGame(NamedTuple):
+    game_id: str
+    pgn: str
+    '''The text of the game from the PGN file, parsed in the process that replays it.'''
+    phrases: List[str]
+
+
+def read_pgn_texts(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Split the lines of a PGN file into the text of each game, without parsing them.
+    """
+    game: List[str] = []
+    in_moves = False
+    for line in lines:
+        if line.startswith('[') and in_moves:
+            yield ''.join(game)
+            game, in_moves = [], False
+        if line.strip() and not line.startswith('['):
+            in_moves = True
+        game.append(line)
+    if any(line.strip() for line in game):
+        yield ''.join(game)
+
+
+def read_pairs(pgn_lines: Iterable[str],
+               transcript_lines: Iterable[str],
+               id_header: Optional[str] = 'Event') -> Iterator[ReplayGame]:
+    """
+    Pair each game of a PGN file with the transcript (see ``read_games()``) in the same place. Unless ``id_header``
+    is ``None``, the header of that name must hold the id of the transcript, or a ``ValueError`` is raised.
+    """
+    header = re.compile(rf'^\[{re.escape(id_header)} "(.*)"\]\s*$', re.MULTILINE) if id_header else None
+    texts, transcripts = read_pgn_texts(pgn_lines), read_games(transcript_lines)
+    for number, (text, transcript) in enumerate(itertools.zip_longest(texts, transcripts), start=1):
+        if text is None or transcript is None:
+            raise ValueError(f'The PGN and the transcripts have a different number of games (from game {number})')
+        game_id, phrases = transcript
+        if header is not None:
+            match = header.search(text)
+            pgn_id = match.group(1) if match is not None else None
+            if pgn_id != game_id:
+                raise ValueError(f'Game {number} of the PGN has id {pgn_id!r}, but its transcript has {game_id!r}')
+        yield ReplayGame(game_id, text, phrases)
+
+
+def replay_game(game: ReplayGame, stats: ReplayStats, failures: List[Dict]):
+    """
+    Replay ``game``, adding it to ``stats``, and add a dict to ``failures`` for each ply that didn't resolve to
+    the move that was played.
+    """
+    pgn = chess.pgn.read_game(io.StringIO(game.pgn))
+    board = pgn.board()
+    moves = list(pgn.mainline_moves())
+    clock = time.perf_counter
+    clean = True
+    for ply, (phrase, move) in enumerate(zip(game.phrases, moves), start=1):
+        start = clock()
+        result = resolve_phrase(phrase, board)
+        stats.seconds += clock() - start
+
+        arm = result.query.rule or UNPARSED_ARM
+        expected = board.san(move)
+        correct = result.status is Status.RESOLVED and result.move.move == move
+        stats.plies += 1
+        stats.arm_plies[arm] += 1
+        if result.error is not None:
+            stats.errors[result.error.__name__] += 1
+        for warning in result.warning_list():
+            stats.warnings[type(warning).__name__] += 1
+
+        if correct:
+            stats.correct += 1
+            stats.arm_correct[arm] += 1
+        else:
+            clean = False
+            produced = result.san if result.san is not None else f'[{result.error.__name__}]'
+            stats.confusion[expected, produced] += 1
+            failures.append({'game_id': game.game_id, 'ply': ply, 'phrase': phrase, 'fen': board.fen(), 'arm': arm,
+                             'expected': expected, 'produced': result.san, 'status': result.status.value,
+                             'error': result.error.__name__ if result.error is not None else None,
+                             'message': result.message})
+        board.push(move)
+
+    stats.games += 1
+    stats.clean_games += clean
+    stats.misaligned_games += len(game.phrases) != len(moves)
+
+
+def replay_batch(batch: List[ReplayGame]) -> Tuple[ReplayStats, List[Dict]]:
+    stats, failures = ReplayStats(), []
+    for game in batch:
+        replay_game(game, stats, failures)
+    return stats, failures
+
+
+def replay(games: Iterable[ReplayGame],
+           *,
+           executor: Optional[Executor] = None,
+           batch_size: int = 32,
+           max_pending: int = 16) -> Iterator[Tuple[ReplayStats, List[Dict]]]:
+    """
+    Replay ``games`` (see ``read_pairs()``), yielding the stats and failures of each batch of ``batch_size`` games
+    in input order, to be ``merge()``d. Batches are sent to ``executor`` (or replayed here if there is none),
+    with at most ``max_pending`` of them read ahead, as in ``transcripts_to_pgn.convert()``.
+    """
+    games = iter(games)
+    batches = iter(lambda: list(itertools.islice(games, batch_size)), [])
+    if executor is None:
+        yield from map(replay_batch, batches)
+        return
+
+    pending = deque()
+    for batch in batches:
+        pending.append(executor.submit(replay_batch, batch))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pgn', help='PGN of the games that were played')
+    parser.add_argument('transcripts', help='game_id<TAB>phrase lines, or - for stdin')
+    parser.add_argument('--id-header', default='Event',
+                        help='PGN header holding the game id ("" to pair games by order only)')
+    parser.add_argument('--failures', help='JSON lines report of every ply that was wrong')
+    parser.add_argument('--json', help='write the metrics (see ReplayStats.as_dict()) here as JSON')
+    parser.add_argument('--top', type=int, default=20, help='confusions and exception classes to report')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='0 to replay in this process')
+    parser.add_argument('--batch-size', type=int, default=32, help='games per task sent to a worker')
+    args = parser.parse_args(argv)
+
+    def open_text(path: str, std: TextIO) -> TextIO:
+        return std if path == '-' else open(path, encoding='utf-8', buffering=1 << 20)
+
+    start = time.perf_counter()
+    stats = ReplayStats()
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 0 else None
+    with open(args.pgn, encoding='utf-8', buffering=1 << 20) as pgn, open_text(args.transcripts, sys.stdin) as lines:
+        report = open(args.failures, 'w', encoding='utf-8') if args.failures else None
+        try:
+            games = read_pairs(pgn, lines, args.id_header or None)
+            for batch_stats, failures in replay(games, executor=executor, batch_size=args.batch_size,
+                                                max_pending=2 * max(1, args.workers)):
+                stats.merge(batch_stats)
+                if report is not None:
+                    for failure in failures:
+                        report.write(json.dumps(failure) + '\n')
+        finally:
+            if report is not None:
+                report.close()
+            if executor is not None:
+                executor.shutdown()
+
+    print(stats.report(args.top))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(stats.as_dict(args.top), f, indent=2)
+
+    elapsed = time.perf_counter() - start
+    print(f'{stats.plies} plies in {elapsed:.1f}s: {stats.plies / elapsed:.1f} plies/s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
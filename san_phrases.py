@@ -0,0 +1,62 @@
+"""
+One place to import everything from, without paying for the parts that aren't used:
+
+    import san_phrases
+    san_phrases.phrase_to_san('knight f 3', board)
+
+Each name is imported from its module the first time it is looked up (PEP 562), so ex. a worker that only
+resolves phrases never imports the server, the PGN converter or the fuzzy matcher. ``warm_up()`` does the
+one-time work the first phrase would otherwise pay for (compiling the normalizer and filling the grammar's table).
+"""
+import importlib
+
+from typing import Dict, List, Sequence
+
+EXPORTS: Dict[str, str] = {
+    **dict.fromkeys(['phrase_to_san', 'phrases_to_san', 'resolve_phrase', 'parse_phrase', 'PhraseResult', 'Status',
+                     'WarningFlag', 'PhraseToSANError', 'PhraseToSANWarning', 'NORMALIZER'], 'phrase_to_san'),
+    **dict.fromkeys(['GRAMMAR', 'Grammar', 'MoveQuery', 'Rule'], 'grammar'),
+    **dict.fromkeys(['MoveIndex', 'MoveFeatures'], 'move_index'),
+    **dict.fromkeys(['Position'], 'position'),
+    **dict.fromkeys(['PhraseTable'], 'phrase_table'),
+    **dict.fromkeys(['PhraseSession'], 'phrase_session'),
+    **dict.fromkeys(['PhraseCache'], 'phrase_cache'),
+    **dict.fromkeys(['PhraseBatcher'], 'phrase_batcher'),
+    **dict.fromkeys(['PositionStore', 'build_store', 'share_store'], 'position_store'),
+    **dict.fromkeys(['IncrementalParser', 'PhraseTrie'], 'phrase_trie'),
+    **dict.fromkeys(['rank_candidates', 'narrow', 'ScoredCandidate'], 'disambiguation'),
+    **dict.fromkeys(['resolve_fuzzy', 'fuzzy_readings', 'FuzzyMatcher', 'get_matcher'], 'fuzzy_matcher'),
+    **dict.fromkeys(['add_hook', 'remove_hook', 'ResolveStats', 'ResolveTrace'], 'instrumentation'),
+    **dict.fromkeys(['get_locale', 'register_vocabulary', 'Locale', 'Vocabulary'], 'locales'),
+}
+'''The module each name lives in.'''
+
+__all__ = ['warm_up', *EXPORTS]
+
+
+def __getattr__(name: str):
+    module = EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # Later lookups don't go through here
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(__all__)
+
+
+def warm_up(locales: Sequence[str] = ()):
+    """
+    Compile the normalizer (and those of ``locales``) and fill the grammar's table ahead of the first phrase
+    (ex. when a worker starts).
+    """
+    from grammar import GRAMMAR
+    from locales import get_locale
+    from phrase_to_san import NORMALIZER
+
+    NORMALIZER.compile()
+    for locale in locales:
+        get_locale(locale).normalizer.compile()
+    GRAMMAR.prefill()
@@ -0,0 +1,88 @@
+import chess
+import pytest
+
+from disambiguation import narrow, rank_candidates
+from move_index import MoveIndex
+from phrase_to_san import Status, resolve_phrase
+
+DISCOVERED_CHECK = '3k4/8/8/8/8/8/3N4/3RK1N1 w - - 0 1'
+'''Both knights can go to f3, and the one on d2 uncovers a check from the rook.'''
+BACK_RANK = '6k1/5ppp/8/8/8/8/8/R3K1R1 w - - 0 1'
+'''"rook check" is either Ra8# or Rxg7+.'''
+TWO_ROOKS = 'r3k3/8/8/8/8/8/8/R2RK3 w - - 0 1'
+KNIGHTS_TO_D7 = '8/8/1N3N2/8/8/8/7k/4K3 w - - 0 1'
+
+
+def ranked(phrase: str, fen: str, **kwargs):
+    board = chess.Board(fen)
+    index = MoveIndex(board)
+    result = resolve_phrase(phrase, board, index=index)
+    return result, rank_candidates(result, index, **kwargs)
+
+
+def sans(candidates):
+    return [candidate.san for candidate in candidates]
+
+
+def test_check_agreement_comes_first():
+    # Ndf3 is first in legal move order, but the phrase didn't say "check"
+    result, candidates = ranked('knight f 3', DISCOVERED_CHECK)
+    assert result.status is Status.AMBIGUOUS and [move.move.uci() for move in result.candidates] == ['d2f3', 'g1f3']
+    assert sans(candidates) == ['Ngf3', 'Ndf3+']
+    assert [(candidate.score, candidate.check_agrees, candidate.capture_agrees) for candidate in candidates] == \
+        [(2.0, True, True), (1.0, False, True)]
+
+
+def test_conditions_met():
+    # Neither is mate, so both only agree about capturing and keep legal move order
+    result, candidates = ranked('knight f 3 checkmate', DISCOVERED_CHECK)
+    assert result.status is Status.NO_MATCH
+    assert sans(candidates) == ['Ndf3+', 'Ngf3'] and {candidate.score for candidate in candidates} == {1.0}
+    assert [candidate.gives_check for candidate in candidates] == [True, False]
+
+
+def test_capture_and_mate():
+    # Each agrees with one thing the phrase said: Rxg7+ is (only) check, Ra8# doesn't take
+    _, candidates = ranked('rook check', BACK_RANK)
+    assert sans(candidates) == ['Rxg7+', 'Ra8#']
+    assert [(c.check_agrees, c.capture_agrees, c.conditions_met) for c in candidates] == \
+        [(True, False, 1), (False, True, 1)]
+    assert [(c.gives_check, c.gives_mate) for c in candidates] == [(True, False), (True, True)]
+
+
+def test_prior():
+    _, candidates = ranked('knight f 3', DISCOVERED_CHECK, prior=lambda move: 2.0 * (move.from_square == chess.D2))
+    assert sans(candidates) == ['Ndf3+', 'Ngf3'] and [candidate.score for candidate in candidates] == [3.0, 2.0]
+
+
+@pytest.mark.parametrize('fen, phrase, follow_up, expected', [
+    (TWO_ROOKS, 'rook b 1', 'the one on d', ['Rdb1']),
+    (TWO_ROOKS, 'rook b 1', 'the a rook', ['Rab1']),
+    (TWO_ROOKS, 'rook b 1', 'the one on 1', ['Rab1', 'Rdb1']),
+    (KNIGHTS_TO_D7, 'knight d 7', 'the one on b', ['Nbd7']),
+    (KNIGHTS_TO_D7, 'knight d 7', 'f 6', ['Nfd7']),
+    # Both go to d7, so "to d 7" doesn't tell them apart
+    (KNIGHTS_TO_D7, 'knight d 7', 'to d 7', ['Nbd7', 'Nfd7']),
+    (BACK_RANK, 'rook check', 'to a 8', ['Ra8#']),
+    # No rook is on the 8th rank, so it is the square moved to
+    (BACK_RANK, 'rook check', 'the one on 8', ['Ra8#']),
+    (BACK_RANK, 'rook check', 'the one on g', ['Rxg7+']),
+    (BACK_RANK, 'rook check', 'the one that takes the pawn', ['Rxg7+']),
+    (BACK_RANK, 'rook check', 'checkmate', ['Ra8#']),
+    (BACK_RANK, 'rook check', 'check', ['Rxg7+', 'Ra8#']),
+])
+def test_narrow(fen, phrase, follow_up, expected):
+    _, candidates = ranked(phrase, fen)
+    assert sorted(sans(narrow(candidates, follow_up))) == sorted(expected)
+
+
+@pytest.mark.parametrize('follow_up', ['the one on h', 'to c 3', 'the bishop', 'the one that takes the queen'])
+def test_narrow_to_nothing(follow_up):
+    _, candidates = ranked('rook check', BACK_RANK)
+    assert narrow(candidates, follow_up) == []
+
+
+def test_narrow_keeps_order():
+    _, candidates = ranked('knight f 3', DISCOVERED_CHECK)
+    assert sans(narrow(candidates, 'the knight')) == ['Ngf3', 'Ndf3+']
+    assert sans(narrow(candidates, 'check')) == ['Ndf3+']
@@ -0,0 +1,98 @@
+import chess
+import pytest
+
+from fuzzy_matcher import FUZZY_MATCHER, BKTree, edit_distance, fuzzy_readings, get_matcher, phonetic_key, resolve_fuzzy
+from locales import Vocabulary, register_vocabulary
+from phrase_to_san import Status
+
+TWO_KNIGHTS = '4k3/8/8/8/8/8/3N4/4K1N1 w - - 0 1'
+PAWN_ON_E5 = '4k3/8/8/4P3/8/8/8/4K3 w - - 0 1'
+PAWN_ON_E5_KNIGHT_ON_D6 = '4k3/8/3n4/4P3/8/8/8/4K3 w - - 0 1'
+
+
+def test_phonetic_key_and_tree():
+    assert phonetic_key('nite') == phonetic_key('knight')
+    assert edit_distance('knight', 'night') == 1
+    tree = BKTree(['knight', 'bishop', 'rook', 'queen', 'king'])
+    assert tree.search('kin', 1) == [(1, 'king')]
+    assert tree.search('kight', 1) == [(1, 'knight')]
+    assert tree.search('rooks', 0) == []
+
+
+@pytest.mark.parametrize('phrase, fen, san', [
+    ('nite f 3', chess.STARTING_FEN, 'Nf3'),
+    ('nite f tree', chess.STARTING_FEN, 'Nf3'),
+    ('pawn e for', chess.STARTING_FEN, 'e4'),
+    ('bishup c 4', 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3', 'Bc4'),
+])
+def test_resolve_fuzzy(phrase, fen, san):
+    board = chess.Board(fen)
+    result = resolve_fuzzy(phrase, board)
+    assert result.status is Status.RESOLVED and result.san == san
+
+
+def test_readings_are_legal_moves():
+    board = chess.Board()
+    readings = fuzzy_readings('pawn e for', board)
+    # "e 4" is cheaper than "e 3", and nothing that doesn't resolve to a legal move is kept ("for" as "f" here)
+    assert [(reading.phrase, reading.result.san) for reading in readings] == [('pawn e 4', 'e4'), ('pawn e 3', 'e3')]
+    assert readings[0].cost < readings[1].cost
+    assert all(board.is_legal(reading.result.move.move) for reading in readings)
+    assert fuzzy_readings('nite e 5', board) == []
+
+
+def test_ties_are_not_resolved():
+    # "tax" sounds as much like "takes" as like "6"
+    board = chess.Board(PAWN_ON_E5_KNIGHT_ON_D6)
+    readings = fuzzy_readings('e tax', board)
+    assert sorted(reading.result.san for reading in readings) == ['e6', 'exd6']
+    assert readings[0].cost == readings[1].cost
+    assert resolve_fuzzy('e tax', board).status is Status.UNPARSED
+    # With nothing to take, only one reading is left
+    assert resolve_fuzzy('e tax', chess.Board(PAWN_ON_E5)).san == 'e6'
+
+
+def test_max_unknown():
+    board = chess.Board()
+    assert fuzzy_readings('nite f tree', board, max_unknown=1) == []
+    assert [reading.phrase for reading in fuzzy_readings('nite f tree', board, max_unknown=2)] == ['knight f 3']
+
+
+@pytest.mark.parametrize('phrase', ['nite to f 3', 'nite the f 3', 'nite to the f 3'])
+def test_filler_is_not_a_rank(phrase):
+    # Both knights can go to f3, so the phrase is ambiguous, and "to"/"the" must not be read as "2" to settle it
+    board = chess.Board(TWO_KNIGHTS)
+    assert fuzzy_readings(phrase, board) == []
+    assert resolve_fuzzy(phrase, board).status is not Status.RESOLVED
+
+
+def test_spoken_rank():
+    # Unlike "to", "too" is only ever a misheard "2"
+    assert FUZZY_MATCHER.candidates('too') == ((0, '2'),)
+    assert resolve_fuzzy('nite too f 3', chess.Board(TWO_KNIGHTS)).san == 'Ndf3'
+
+
+@pytest.mark.parametrize('phrase, locale', [
+    ('caballo efe trez', 'es'),
+    ('Springer f dri', 'de'),
+    ('Springa f drei', 'de'),
+])
+def test_locales(phrase, locale):
+    board = chess.Board()
+    assert resolve_fuzzy(phrase, board).status is not Status.RESOLVED
+    assert resolve_fuzzy(phrase, board, locale=locale).san == 'Nf3'
+    assert get_matcher(locale) is get_matcher(locale) is not FUZZY_MATCHER
+
+
+def test_locale_fillers():
+    board = chess.Board(TWO_KNIGHTS)
+    assert fuzzy_readings('caballo hacia efe trez', board, locale='es') == []
+    assert resolve_fuzzy('caballo de efe trez', board, locale='es').san == 'Ndf3'
+
+
+def test_registered_vocabulary_gets_a_new_matcher():
+    register_vocabulary(Vocabulary('fuzzy-it', pieces={'cavallo': 'knight'}, numbers={'tre': '3'}))
+    first = get_matcher('fuzzy-it')
+    assert resolve_fuzzy('cavalo f tre', chess.Board(), locale='fuzzy-it').san == 'Nf3'
+    register_vocabulary(Vocabulary('fuzzy-it', pieces={'cavallo': 'knight'}, numbers={'tré': '3'}))
+    assert get_matcher('fuzzy-it') is not first
@@ -0,0 +1,63 @@
+import chess
+import pytest
+
+from grammar import GRAMMAR, split_promotion
+from phrase_to_san import UnspecifiedPromotionPiece, parse_phrase, phrase_to_san, resolve_phrase
+
+TWO_PROMOTIONS = '5r1k/4P3/8/8/8/8/8/4K3 w - - 0 1'
+'''The pawn on e7 can promote on e8, or by taking the rook on f8 (with check, along the 8th rank).'''
+ONE_PROMOTION = '7k/4P3/8/8/8/8/8/4K3 w - - 0 1'
+
+
+def parse(phrase: str):
+    parsed = parse_phrase(phrase)
+    return GRAMMAR.parse(*parsed)
+
+
+@pytest.mark.parametrize('phrase, fen, san', [
+    ('e 8 equals queen', TWO_PROMOTIONS, 'e8=Q'),
+    ('e 8 queen', TWO_PROMOTIONS, 'e8=Q'),
+    ('e 8 promote to rook', TWO_PROMOTIONS, 'e8=R'),
+    ('takes f 8 queen check', TWO_PROMOTIONS, 'exf8=Q+'),
+    ('e f knight', TWO_PROMOTIONS, 'exf8=N'),
+    ('takes rook promote knight', TWO_PROMOTIONS, 'exf8=N'),
+    ('takes rook queen', TWO_PROMOTIONS, 'exf8=Q+'),
+    ('pawn takes rook queen', TWO_PROMOTIONS, 'exf8=Q+'),
+    ('pawn takes rook promote to bishop', TWO_PROMOTIONS, 'exf8=B'),
+    ('queen', ONE_PROMOTION, 'e8=Q+'),
+    ('promote queen', ONE_PROMOTION, 'e8=Q+'),
+    ('promote to queen', ONE_PROMOTION, 'e8=Q+'),
+    ('promotes to knight', ONE_PROMOTION, 'e8=N'),
+])
+def test_promotion_forms(phrase, fen, san):
+    assert phrase_to_san(phrase, chess.Board(fen)) == san
+
+
+@pytest.mark.parametrize('phrase', ['e 8', 'takes rook', 'promote', 'promote to'])
+def test_promotion_without_piece(phrase):
+    fen = ONE_PROMOTION if phrase.startswith('promote') else TWO_PROMOTIONS
+    result = resolve_phrase(phrase, chess.Board(fen))
+    assert result.error is UnspecifiedPromotionPiece
+    with pytest.raises(UnspecifiedPromotionPiece):
+        phrase_to_san(phrase, chess.Board(fen))
+
+
+def test_queen_check_is_a_queen_move():
+    query = parse('queen check')
+    assert query.rule == 'piece_check' and query.promotion is None
+
+
+@pytest.mark.parametrize('tokens, classes, says_any, split', [
+    (('e', '8', 'equals', 'queen'), ('file', 'rank', 'equals', 'piece'), False, (2, 3)),
+    (('equals', 'to', 'queen'), ('equals', 'other', 'piece'), False, (3, 2)),
+    (('equals', 'to'), ('equals', 'other'), False, (2, None)),
+    (('equals',), ('equals',), False, (1, None)),
+    (('takes', 'f', '8', 'queen'), ('takes', 'file', 'rank', 'piece'), True, (1, 3)),
+    (('takes', 'rook', 'queen'), ('takes', 'piece', 'piece'), False, (1, 2)),
+    (('knight', 'takes', 'rook'), ('piece', 'takes', 'piece'), False, (0, None)),
+    (('queen',), ('piece',), False, (1, 0)),
+    (('queen',), ('piece',), True, (0, None)),
+    (('knight', 'to'), ('piece', 'other'), False, (0, None)),
+])
+def test_split_promotion(tokens, classes, says_any, split):
+    assert split_promotion(tokens, classes, says_any) == split
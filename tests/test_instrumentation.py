@@ -0,0 +1,64 @@
+import chess
+
+from instrumentation import COUNTS, STAGES, ResolveStats, add_hook, remove_hook
+from locales import get_locale
+from move_index import MoveIndex
+from phrase_to_san import phrase_to_san, resolve_phrase
+
+TWO_ROOKS = 'r3k3/8/8/8/8/8/8/R2RK3 w - - 0 1'
+
+
+def traces(phrases, board, index=None):
+    seen = []
+    add_hook(seen.append)
+    try:
+        for phrase in phrases:
+            resolve_phrase(phrase, board, index=index)
+    finally:
+        remove_hook(seen.append)
+    return seen
+
+
+def test_trace():
+    board = chess.Board(TWO_ROOKS)
+    trace, = traces(['rook takes check'], board)
+    assert trace.rule == 'piece_takes' and trace.status == 'resolved' and trace.error is None
+    assert set(trace.seconds) == set(STAGES) and set(trace.counts) == set(COUNTS)
+    assert trace.counts['moves_generated'] == board.legal_moves.count()
+    assert trace.counts['board_pushes'] == trace.counts['check_probes'] + trace.counts['reply_probes']
+
+
+def test_conditions():
+    board = chess.Board('k7/8/8/p6p/8/8/8/R3K2R w - - 0 1')
+    index = MoveIndex(board)
+    narrowed, unsaid, unparsed = traces(['rook takes check', 'rook a 5', 'banana'], board, index)
+    assert narrowed.status == 'resolved' and narrowed.counts['conditions'] == 2
+    assert unsaid.counts['conditions'] == 0 and unsaid.counts['moves_generated'] == 0
+    assert unparsed.rule is None and unparsed.counts['conditions'] == 0
+
+
+def test_normalize_is_timed_per_call(monkeypatch):
+    normalizer = get_locale(None).normalizer
+    normalize = normalizer.normalize
+
+    def interrupted(phrase: str) -> str:
+        phrase = normalize(phrase)
+        normalizer.last_seconds = 10.0  # As if another thread normalized a phrase right after
+        return phrase
+
+    monkeypatch.setattr(normalizer, 'normalize', interrupted)
+    trace, = traces(['knight f 3'], chess.Board())
+    assert 0 <= trace.seconds['normalize'] < 1 and 0 <= trace.seconds['tokenize'] < 1
+
+
+def test_stats():
+    stats = ResolveStats()
+    add_hook(stats)
+    try:
+        assert phrase_to_san('knight f 3', chess.Board()) == 'Nf3'
+        resolve_phrase('banana', chess.Board())
+    finally:
+        remove_hook(stats)
+    totals = stats.as_dict()
+    assert totals['calls'] == 2 and totals['rule.piece_square'] == 1 and totals['error.PhraseToSANError'] == 1
+    assert totals['count.moves_generated'] == 40 and 'count.conditions' in totals
@@ -0,0 +1,108 @@
+import threading
+
+import chess
+import pytest
+
+from disambiguation import narrow, rank_candidates
+from locales import Locale, Vocabulary, get_locale, register_vocabulary
+from move_index import MoveIndex
+from phrase_table import PhraseTable
+from phrase_to_san import parse_phrase, phrase_to_san, resolve_phrase
+from phrase_trie import IncrementalParser
+
+ITALIAN_GAME = 'r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3'
+TWO_ROOKS = 'r3k3/8/8/8/8/8/8/R2RK3 w - - 0 1'
+
+
+@pytest.mark.parametrize('phrase, fen, san', [
+    ('caballo efe tres', chess.STARTING_FEN, 'Nf3'),
+    ('caballo a efe tres', chess.STARTING_FEN, 'Nf3'),
+    ('Caballo A efe tres', chess.STARTING_FEN, 'Nf3'),
+    ('caballo de ge uno a efe tres', chess.STARTING_FEN, 'Nf3'),
+    ('peón de cuatro', chess.STARTING_FEN, 'd4'),
+    ('de cuatro', chess.STARTING_FEN, 'd4'),
+    ('a cuatro', chess.STARTING_FEN, 'a4'),
+    ('peón a a cuatro', chess.STARTING_FEN, 'a4'),
+    ('torre de be uno', TWO_ROOKS, 'Rdb1'),
+    ('torre come jaque', TWO_ROOKS, 'Rxa8+'),
+    ('alfil a ce cinco', ITALIAN_GAME, 'Bc5'),
+    ('enroque corto', 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O'),
+    ('enroque de la dama', 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O-O'),
+])
+def test_spanish(phrase, fen, san):
+    assert phrase_to_san(phrase, chess.Board(fen), locale='es') == san
+
+
+@pytest.mark.parametrize('phrase, fen, san', [
+    ('Springer f drei', chess.STARTING_FEN, 'Nf3'),
+    ('Bauer e vier', chess.STARTING_FEN, 'e4'),
+    ('deh vier', chess.STARTING_FEN, 'd4'),
+    ('Läufer c fünf', ITALIAN_GAME, 'Bc5'),
+    ('Turm schlägt Schach', TWO_ROOKS, 'Rxa8+'),
+    ('kurze Rochade', 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O'),
+])
+def test_german(phrase, fen, san):
+    assert phrase_to_san(phrase, chess.Board(fen), locale='de') == san
+
+
+def test_locales_share_tokens():
+    english = parse_phrase('knight takes f 7 check')
+    assert parse_phrase('caballo come efe siete jaque', 'es') == english._replace(phrase='caballo come efe siete jaque')
+    assert parse_phrase('Springer schlägt f sieben Schach', 'de').tokens == english.tokens
+
+
+def test_unknown_locale():
+    with pytest.raises(ValueError):
+        get_locale('xx')
+    with pytest.raises(ValueError):
+        Locale(Vocabulary('xx', pieces={'cavallo': 'horse'}))
+
+
+def test_register_vocabulary():
+    register_vocabulary(Vocabulary('it', pieces={'cavallo': 'knight'}, numbers={'tre': '3'}, fillers=('in',)))
+    assert phrase_to_san('cavallo in f tre', chess.Board(), locale='it') == 'Nf3'
+
+
+def test_compiled_once_across_threads():
+    register_vocabulary(Vocabulary('pt', pieces={'cavalo': 'knight'}, numbers={'três': '3'}))
+    barrier = threading.Barrier(8)
+    compiled = []
+
+    def run():
+        barrier.wait()
+        compiled.append(get_locale('pt'))
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(compiled) == 8 and all(locale is compiled[0] for locale in compiled)
+    assert phrase_to_san('cavalo f três', chess.Board(), locale=compiled[0]) == 'Nf3'
+
+
+def test_incremental_parser():
+    parser = IncrementalParser(PhraseTable(chess.Board()), locale='es')
+    assert parser.feed('caballo') is None
+    assert len(parser.candidates) == 4
+    assert parser.feed('a efe tres') == 'Nf3'
+    assert parser.finish() == 'Nf3'
+
+
+def test_narrow():
+    board = chess.Board(TWO_ROOKS)
+    index = MoveIndex(board)
+    result = resolve_phrase('torre be uno', board, index=index, locale='es')
+    candidates = rank_candidates(result, index)
+    assert [candidate.san for candidate in candidates] == ['Rdb1', 'Rab1']
+    assert [candidate.san for candidate in narrow(candidates, 'la de de', 'es')] == ['Rdb1']
+    assert [candidate.san for candidate in narrow(candidates, 'der Turm auf ah', 'de')] == ['Rab1']
+
+
+def test_rank_candidates_takes():
+    board = chess.Board('4k3/8/8/8/8/8/8/Rn1RK3 w - - 0 1')
+    index = MoveIndex(board)
+    result = resolve_phrase('torre come be uno', board, index=index, locale='es')
+    candidates = rank_candidates(result, index)
+    assert sorted(candidate.san for candidate in candidates) == ['Raxb1', 'Rdxb1']
+    assert all(candidate.capture_agrees for candidate in candidates)
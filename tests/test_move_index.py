@@ -0,0 +1,76 @@
+import sys
+import threading
+
+import chess
+import pytest
+
+from move_index import MoveIndex
+from phrase_to_san import phrase_to_san, resolve_phrase
+
+PHRASES = ['knight f 3', 'e 4', 'takes', 'bishop c 4', 'knight takes', 'queen h 5', 'castles', 'e f', 'd 4', 'check']
+
+BOARDS = [
+    chess.Board(),
+    chess.Board('r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3'),
+    chess.Board('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4'),
+    chess.Board('rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2'),
+]
+
+
+def outcome(phrase: str, board: chess.Board, index: MoveIndex = None):
+    result = resolve_phrase(phrase, board, index=index)
+    return result.status, result.san, result.error, result.warnings
+
+
+def test_select_and_mask():
+    index = MoveIndex(chess.Board())
+    knights = index.select(piece_type=chess.KNIGHT)
+    assert sorted(index.board.san(move.move) for move in knights) == ['Na3', 'Nc3', 'Nf3', 'Nh3']
+    assert index.mask(piece_type=chess.KNIGHT, to_square=chess.F3) == 1 << next(
+        move.id for move in knights if move.to_square == chess.F3)
+    assert index.select(is_capture=True) == []
+
+
+def test_index_keeps_its_own_board():
+    board = chess.Board()
+    index = MoveIndex(board)
+    board.push_san('e4')
+    assert phrase_to_san('e 4', index.board, index=index) == 'e4'
+    assert len(index.moves) == 20
+
+
+@pytest.mark.parametrize('board', BOARDS, ids=range(len(BOARDS)))
+def test_shared_index_from_threads(board):
+    """
+    Each round, 8 threads share a new index and resolve every phrase at once, so the lazily built tables,
+    SAN strings and probes are all first used concurrently. They must give the same results as one thread.
+    """
+    expected = {phrase: outcome(phrase, board) for phrase in PHRASES}
+    failures = []
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible, so that races show up
+    try:
+        rounds(board, expected, failures)
+    finally:
+        sys.setswitchinterval(interval)
+    assert failures == []
+
+
+def rounds(board: chess.Board, expected, failures):
+    for _ in range(40):
+        index = MoveIndex(board)
+        barrier = threading.Barrier(8)
+
+        def work(offset: int):
+            barrier.wait()
+            for i in range(len(PHRASES)):
+                phrase = PHRASES[(i + offset) % len(PHRASES)]
+                got = outcome(phrase, board, index)
+                if got != expected[phrase]:
+                    failures.append((phrase, got, expected[phrase]))
+
+        threads = [threading.Thread(target=work, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import pytest
+
+from phrase_batcher import PhraseBatcher, resolve_batch
+from phrase_to_san import PhraseToSANError, phrase_to_san
+from position import Position
+
+
+def test_groups_ignore_clocks():
+    board = chess.Board()
+    for san in ('Nf3', 'Nf6', 'Ng1', 'Ng8'):
+        board.push_san(san)
+    start, later = Position.from_board(chess.Board()), Position.from_board(board)
+    assert start != later and start.without_clocks() == later.without_clocks()
+
+    with PhraseBatcher(window=0.05) as batcher:
+        futures = [batcher.submit('a', 'e 4', start), batcher.submit('b', 'knight f 3', later)]
+        assert [future.result() for future in futures] == ['e4', 'Nf3']
+    assert batcher.stats.as_dict()['positions'] == 1
+
+
+def test_errors_are_raised_from_futures():
+    board = chess.Board('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3')
+    with PhraseBatcher() as batcher:
+        future = batcher.submit('g', 'knight', Position.from_board(board))
+        with pytest.raises(PhraseToSANError):
+            future.result()
+
+
+def test_thread_pool():
+    boards = [chess.Board()]
+    for san in ('e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Nf6', 'Ng5', 'd5', 'exd5', 'Nxd5', 'Nxf7'):
+        boards.append(boards[-1].copy())
+        boards[-1].push_san(san)
+    phrases = ['takes', 'knight f 3', 'e 4', 'pawn takes', 'check', 'bishop c 4', 'd 5', 'king takes']
+
+    expected, futures = [], []
+    with ThreadPoolExecutor(4) as executor, PhraseBatcher(executor, window=0.001, max_batch=16) as batcher:
+        for board in boards * 3:
+            position = Position.from_board(board)
+            for phrase in phrases:
+                expected.append(resolve_batch([(position, [(phrase, False, None)])])[0][0])
+                futures.append(batcher.submit('g', phrase, position))
+        got = []
+        for future in futures:
+            try:
+                got.append((future.result(), None))
+            except Exception as e:
+                got.append((None, type(e)))
+    assert got == [(san, error) for san, error, _ in expected]
+    assert batcher.stats.as_dict()['requests'] == len(futures)
+
+
+def test_resolve_batch_matches_phrase_to_san():
+    board = chess.Board()
+    board.push_san('e4')
+    assert resolve_batch([(Position.from_board(board), [('e 5', False, None), ('springer f sechs', False, 'de')])]) == \
+        [[(phrase_to_san('e 5', board), None, None), ('Nf6', None, None)]]
@@ -0,0 +1,115 @@
+import sys
+import threading
+
+import chess
+import pytest
+
+from phrase_cache import PhraseCache, position_key
+from phrase_to_san import IsNotCheckWarning, PhraseToSANError, PhraseToSANWarning, phrase_to_san
+
+PHRASES = ['knight f 3', 'e 4', 'takes', 'knight to f 3', 'castles', 'check', 'banana', 'knight f 3 check', 'e f']
+
+BOARDS = [
+    chess.Board(),
+    chess.Board('rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2'),
+    chess.Board('r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 2 3'),
+]
+
+
+def outcome(resolve, phrase: str, board: chess.Board, raise_warnings: bool):
+    try:
+        return resolve(phrase, board, raise_warnings=raise_warnings)
+    except (PhraseToSANError, PhraseToSANWarning) as e:
+        return type(e), str(e)
+
+
+def test_hits_and_replayed_errors():
+    cache = PhraseCache()
+    board = chess.Board()
+    assert cache.phrase_to_san('knight f 3', board) == 'Nf3'
+    assert cache.phrase_to_san('Knight F 3', board) == 'Nf3'
+    assert cache.phrase_to_san('Springer f drei', board, locale='de') == 'Nf3'
+    assert cache.stats()[:2] == (2, 1) and len(cache) == 1
+
+    for _ in range(2):
+        with pytest.raises(IsNotCheckWarning, match='Nf3'):
+            cache.phrase_to_san('knight f 3 check', board, raise_warnings=True)
+        with pytest.raises(PhraseToSANError, match='banana'):
+            cache.phrase_to_san('banana', board)
+    # Same tokens, but the message quotes the phrase as it was said, so it is resolved again
+    with pytest.raises(PhraseToSANError, match='Banana'):
+        cache.phrase_to_san('Banana', board)
+    assert cache.stats()[:2] == (4, 4)
+
+
+def test_positions_are_kept_apart():
+    cache = PhraseCache()
+    board = chess.Board()
+    assert cache.phrase_to_san('e 4', board) == 'e4'
+    board.push_san('e4')
+    assert cache.phrase_to_san('e 5', board) == 'e5'
+    with pytest.raises(PhraseToSANError):
+        cache.phrase_to_san('e 4', board)
+    # Same pieces, but no castling rights
+    castling = chess.Board('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    no_castling = chess.Board('r3k2r/8/8/8/8/8/8/R3K2R w - - 0 1')
+    assert position_key(castling) != position_key(no_castling)
+    assert cache.phrase_to_san('castles kingside', castling) == 'O-O'
+    with pytest.raises(PhraseToSANError):
+        cache.phrase_to_san('castles kingside', no_castling)
+
+
+def test_eviction():
+    cache = PhraseCache(max_entries=2)
+    board = chess.Board()
+    for phrase in ('e 4', 'd 4', 'c 4'):
+        cache.phrase_to_san(phrase, board)
+    assert len(cache) == 2 and cache.stats().evictions == 1
+    cache.phrase_to_san('d 4', board)
+    assert cache.stats().hits == 1
+    cache.phrase_to_san('e 4', board)
+    assert cache.stats().misses == 4
+
+    cache = PhraseCache(max_entries=None, max_bytes=1000)
+    for phrase in ('e 4', 'd 4', 'c 4', 'b 4', 'a 4', 'f 4', 'g 4', 'h 4'):
+        cache.phrase_to_san(phrase, board)
+    assert 0 < cache.bytes <= 1000 and cache.stats().evictions == 8 - len(cache)
+    cache.clear()
+    assert len(cache) == 0 and cache.stats() == (0, 0, 0, 0, 0)
+
+
+def test_shared_from_threads():
+    """
+    8 threads share one cache and resolve every phrase in every position at once, so that most lookups race
+    with another thread's miss. They must give the same results as ``phrase_to_san()``, and every lookup must
+    be counted.
+    """
+    expected = {(i, phrase, raise_warnings): outcome(phrase_to_san, phrase, board, raise_warnings)
+                for i, board in enumerate(BOARDS) for phrase in PHRASES for raise_warnings in (False, True)}
+    cache = PhraseCache()
+    barrier = threading.Barrier(8)
+    failures = []
+
+    def run():
+        barrier.wait()
+        for (i, phrase, raise_warnings), result in expected.items():
+            got = outcome(cache.phrase_to_san, phrase, BOARDS[i], raise_warnings)
+            if got != result:
+                failures.append((phrase, got, result))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert failures == []
+    stats = cache.stats()
+    assert stats.hits + stats.misses == 8 * len(expected)
+    assert stats.misses >= stats.entries
+    assert all(board.move_stack == [] for board in BOARDS)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import pytest
+
+import phrase_server
+from phrase_server import PhraseServer, handle
+from position_store import PositionStore, build_store
+
+SCHOLARS_MATE = 'r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 2 3'
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """
+    This process as a worker, with no games yet.
+    """
+    monkeypatch.setattr(phrase_server, '_GAMES', type(phrase_server._GAMES)())
+    monkeypatch.setattr(phrase_server, '_STORE', None)
+    phrase_server._init_worker()
+
+
+@pytest.fixture
+def server(worker):
+    """
+    A server whose workers are threads of this process, so that they share the ``worker`` state.
+    """
+    server = PhraseServer(workers=2, max_in_flight=4, timeout=5.0)
+    for pool in server.pools:
+        pool.shutdown()
+    server.pools = [ThreadPoolExecutor(1), ThreadPoolExecutor(1)]
+    yield server
+    server.shutdown()
+
+
+def serve(server: PhraseServer, lines, on_read=None):
+    """
+    Feed ``lines`` to ``server.serve_stream()`` and get the responses back. ``on_read()`` is called before each
+    line is read.
+    """
+    lines = list(lines)
+    written = []
+
+    async def readline() -> bytes:
+        if on_read is not None:
+            on_read()
+        return (lines.pop(0) + '\n').encode() if lines else b''
+
+    async def write(data: bytes):
+        written.append(json.loads(data))
+
+    asyncio.run(server.serve_stream(readline, write))
+    return written
+
+
+def test_handle_fen(worker):
+    assert handle({'fen': chess.STARTING_FEN, 'phrase': 'knight f 3'}) == {'ok': True, 'san': 'Nf3'}
+    assert handle({'fen': chess.STARTING_FEN, 'phrase': 'Springer f drei', 'locale': 'de'}) == \
+        {'ok': True, 'san': 'Nf3'}
+    assert handle({'fen': SCHOLARS_MATE, 'phrase': 'queen takes f 7'}) == {'ok': True, 'san': 'Qxf7#'}
+    response = handle({'fen': SCHOLARS_MATE, 'phrase': 'queen takes f 7', 'raise_warnings': True})
+    assert (response['ok'], response['error'], response['warning']) == (False, 'IsCheckmateWarning', True)
+    response = handle({'fen': chess.STARTING_FEN, 'phrase': 'bishop e 4'})
+    assert (response['ok'], response['warning']) == (False, False)
+
+
+def test_handle_store(worker, monkeypatch):
+    monkeypatch.setattr(phrase_server, '_STORE', PositionStore(build_store([chess.Board(SCHOLARS_MATE)])))
+    assert handle({'fen': SCHOLARS_MATE, 'phrase': 'checkmate'}) == {'ok': True, 'san': 'Qxf7#'}
+    # Not in the store's table, or not in the store at all
+    assert handle({'fen': SCHOLARS_MATE, 'phrase': 'queen to f 7'}) == {'ok': True, 'san': 'Qxf7#'}
+    assert handle({'fen': chess.STARTING_FEN, 'phrase': 'e 4'}) == {'ok': True, 'san': 'e4'}
+
+
+@pytest.mark.parametrize('request_', [
+    {'phrase': 'e 4'},
+    {'fen': chess.STARTING_FEN},
+    {'fen': 'not a fen', 'phrase': 'e 4'},
+    {'fen': chess.STARTING_FEN, 'phrase': 'e 4', 'locale': 'xx'},
+    {'game': 'g', 'undo': True},
+    {'game': 'g', 'fen': 'not a fen'},
+])
+def test_handle_bad_requests(worker, request_):
+    response = handle(request_)
+    assert response['ok'] is False and response['error'] == 'BadRequest' and response['message']
+
+
+def test_handle_games(worker):
+    assert handle({'game': 'a', 'phrase': 'e 4'})['san'] == 'e4'
+    assert handle({'game': 'b', 'phrase': 'd 4'})['san'] == 'd4'
+    response = handle({'game': 'a', 'phrase': 'e 5'})
+    assert response['san'] == 'e5' and response['fen'].startswith('rnbqkbnr/pppp1ppp/8/4p3/4P3/')
+    assert handle({'game': 'a', 'undo': True})['fen'].startswith('rnbqkbnr/pppppppp/8/8/4P3/')
+    assert handle({'game': 'a', 'fen': SCHOLARS_MATE, 'phrase': 'checkmate'})['san'] == 'Qxf7#'
+    # A phrase that doesn't resolve leaves the game where it was
+    assert handle({'game': 'b', 'phrase': 'banana'})['ok'] is False
+    assert handle({'game': 'b'})['fen'] == 'rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1'
+    assert list(phrase_server._GAMES) == ['a', 'b']
+
+
+def test_games_over_the_limit(worker, monkeypatch):
+    monkeypatch.setattr(phrase_server, 'MAX_GAMES_PER_WORKER', 2)
+    for game in ('a', 'b'):
+        handle({'game': game, 'phrase': 'e 4'})
+    session = phrase_server._GAMES['a']
+    handle({'game': 'a', 'phrase': 'e 5'})
+    handle({'game': 'c', 'phrase': 'e 4'})
+    # The least recently used game is dropped, and starts over if it comes back
+    assert list(phrase_server._GAMES) == ['a', 'c'] and phrase_server._GAMES['a'] is session
+    assert handle({'game': 'b', 'phrase': 'e 5'})['ok'] is False
+    assert handle({'game': 'b', 'phrase': 'e 4'})['ok'] is True
+
+
+def test_routing():
+    server = PhraseServer(workers=4)
+    try:
+        pools = {server.route({'game': 'g42', 'phrase': phrase}) for phrase in ('e 4', 'e 5', 'knight f 3')}
+        assert len(pools) == 1
+        assert server.route({'fen': SCHOLARS_MATE, 'phrase': 'e 4'}) is server.route({'fen': SCHOLARS_MATE})
+        assert len({server.route({'game': f'g{i}'}) for i in range(64)}) == 4
+    finally:
+        server.shutdown()
+
+
+def test_serve_stream(server):
+    responses = serve(server, [
+        json.dumps({'id': 1, 'game': 'g', 'phrase': 'e 4'}),
+        '',
+        json.dumps({'id': 2, 'fen': SCHOLARS_MATE, 'phrase': 'checkmate'}),
+        'not json',
+        '[1, 2]',
+        json.dumps({'id': 3, 'game': 'g', 'phrase': 'knight f 6'}),
+        json.dumps({'id': 4, 'stats': True}),
+    ])
+    by_id = {response.get('id'): response for response in responses}
+    assert len(responses) == 6
+    assert by_id[1] == {'id': 1, 'ok': True, 'san': 'e4',
+                        'fen': 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'}
+    assert by_id[2] == {'id': 2, 'ok': True, 'san': 'Qxf7#'}
+    # Requests for one game go to one worker in order, so "knight f 6" is said after "e 4" was played
+    assert by_id[3]['san'] == 'Nf6'
+    bad = [response for response in responses if 'id' not in response]
+    assert [response['error'] for response in bad] == ['BadRequest', 'BadRequest']
+    assert by_id[4]['stats']['requests'] >= 1
+    assert (server.stats.requests, server.stats.ok, server.stats.in_flight) == (3, 3, 0)
+
+
+def test_timeout(server, monkeypatch):
+    def slow(request):
+        time.sleep(0.5)
+        return {'ok': True, 'san': 'e4'}
+
+    monkeypatch.setattr(phrase_server, 'handle', slow)
+    server.timeout = 0.05
+    responses = serve(server, [json.dumps({'id': 1, 'fen': chess.STARTING_FEN, 'phrase': 'e 4'})])
+    assert responses == [{'id': 1, 'ok': False, 'error': 'Timeout', 'message': 'No response within 0.05s'}]
+    assert (server.stats.timeouts, server.stats.errors, server.stats.in_flight) == (1, 1, 0)
+
+
+def test_backpressure(server, monkeypatch):
+    """
+    With ``max_in_flight`` requests being handled, the server stops reading until one of them finishes.
+    """
+    release = threading.Event()
+    handled = []
+
+    def blocking(request):
+        handled.append(request['id'])
+        release.wait(5)
+        return {'ok': True, 'san': 'e4'}
+
+    monkeypatch.setattr(phrase_server, 'handle', blocking)
+    lines = [json.dumps({'id': i, 'game': f'g{i}', 'phrase': 'e 4'}) for i in range(10)]
+    read = []
+    # Let the requests go once the server has stalled, from another thread
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    try:
+        responses = serve(server, lines, lambda: read.append(release.is_set()))
+    finally:
+        timer.cancel()
+    assert sorted(response['id'] for response in responses) == list(range(10))
+    # Only ``max_in_flight`` lines were read before the first request finished, and then the rest (and the end)
+    assert read == [False] * 4 + [True] * 7
+    assert len(handled) == 10
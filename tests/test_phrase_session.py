@@ -0,0 +1,66 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import pytest
+
+from phrase_session import PhraseSession
+from phrase_to_san import phrase_to_san
+
+MOVES = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6', 'O-O']
+
+
+def play(session: PhraseSession):
+    board = chess.Board()
+    for san in MOVES:
+        for phrase in ('castles', 'knight f 3', 'bishop takes', 'takes', 'e 4', 'a 6', 'pawn takes'):
+            try:
+                expected = phrase_to_san(phrase, board)
+            except Exception as e:
+                expected = type(e)
+            try:
+                got = session.phrase_to_san(phrase)
+            except Exception as e:
+                got = type(e)
+            assert got == expected, (board.fen(), phrase)
+        board.push_san(san)
+        session.push_san(san)
+
+
+@pytest.mark.parametrize('max_positions', [0, 1, 64])
+def test_matches_phrase_to_san(max_positions):
+    with ThreadPoolExecutor(1) as executor:
+        session = PhraseSession(max_positions=max_positions, executor=executor)
+        play(session)
+        executor.shutdown(wait=True)
+        assert session.incremental_parser().feed('knight e 4') == 'Nxe4'
+
+
+def test_without_prefetch():
+    session = PhraseSession(prefetch=False)
+    assert session.table is None
+    play(session)
+    assert session.incremental_parser().feed('knight e 4') == 'Nxe4'
+
+
+def test_cancelled_prefetch():
+    with ThreadPoolExecutor(1) as executor:
+        # Keep the executor busy, so that the first position's table is still queued when it is evicted
+        executor.submit(time.sleep, 0.2)
+        session = PhraseSession(max_positions=0, executor=executor)
+        assert session.snapshot.table.cancelled()
+        assert session.table is None
+        assert session.phrase_to_san('knight f 3') == 'Nf3'
+        assert session.incremental_parser(locale='es').feed('caballo efe tres') == 'Nf3'
+
+
+def test_pop_and_reset():
+    session = PhraseSession(prefetch=False)
+    session.push_san('e4')
+    snapshot = session.snapshot
+    session.push_san('e5')
+    session.pop()
+    assert session.snapshot is snapshot
+    session.reset()
+    assert session.phrase_to_san('e 4') == 'e4'
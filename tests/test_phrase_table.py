@@ -0,0 +1,69 @@
+import chess
+import pytest
+
+from phrase_table import PhraseTable, generate_phrases
+from phrase_to_san import PhraseToSANError, PhraseToSANWarning, phrase_to_san
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    'rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 2 3',
+    'rnbqkbnr/pppppppp/8/8/8/5N2/PPP1PPPP/RNBQKB1R w KQkq - 0 1',
+    'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1',
+    'r1n4k/1P6/8/2pP4/8/8/8/4K3 w - c6 0 1',
+    '7k/5Q2/6K1/8/8/8/8/8 w - - 0 1',
+]
+
+
+def outcome(resolve, phrase: str, raise_warnings: bool):
+    try:
+        return resolve(phrase, raise_warnings=raise_warnings)
+    except (PhraseToSANError, PhraseToSANWarning) as e:
+        return type(e), str(e)
+
+
+@pytest.mark.parametrize('fen', POSITIONS)
+def test_table_agrees_with_phrase_to_san(fen):
+    board = chess.Board(fen)
+    table = PhraseTable(board)
+    assert len(table) > 0
+    # Every generated phrase, including the ones left out of the table for being errors
+    for phrase in set(generate_phrases(table.index)):
+        for raise_warnings in (False, True):
+            expected = outcome(lambda *args, **kwargs: phrase_to_san(*args, board, **kwargs), phrase, raise_warnings)
+            assert outcome(table.phrase_to_san, phrase, raise_warnings) == expected, phrase
+    assert board.fen() == fen
+
+
+@pytest.mark.parametrize('fen', POSITIONS)
+def test_phrases(fen):
+    board = chess.Board(fen)
+    table = PhraseTable(board)
+    assert set(table.phrases_by_san) <= {board.san(move) for move in board.legal_moves}
+    for san, phrases in table.phrases_by_san.items():
+        assert phrases and table.phrases(san) == phrases
+        for phrase in phrases:
+            assert table.lookup(phrase) == san == phrase_to_san(phrase, board)
+    assert table.phrases('Kxe8') == []
+
+
+def test_scholars_mate():
+    table = PhraseTable(chess.Board(POSITIONS[2]))
+    assert {'checkmate', 'takes checkmate', 'takes pawn checkmate', 'queen checkmate'} <= set(table.phrases('Qxf7#'))
+    assert table.phrase_to_san('queen takes f 7') == 'Qxf7#'
+    with pytest.raises(PhraseToSANWarning):
+        table.phrase_to_san('queen takes f 7', raise_warnings=True)
+
+
+def test_fallback():
+    table = PhraseTable(chess.Board())
+    assert table.lookup('knight f 3') == 'Nf3'
+    assert table.lookup('knight to f 3') is None
+    assert table.phrase_to_san('knight to f 3') == 'Nf3'
+    with pytest.raises(PhraseToSANError):
+        table.phrase_to_san('bishop e 4')
+
+
+def test_locale():
+    table = PhraseTable(chess.Board())
+    assert table.lookup('Springer f drei', locale='de') == table.lookup('caballo efe tres', locale='es') == 'Nf3'
@@ -0,0 +1,137 @@
+import chess
+import pytest
+
+from grammar import RULES
+from phrase_to_san import (IsNotAmbiguousWarning, IsNotCheckWarning, PhraseToSANError, PhraseToSANWarning, Status,
+                           UnspecifiedCastlingDirection, WarningFlag, phrase_to_san, phrases_to_san, resolve_phrase)
+from position import Position
+
+CASTLING = 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1'
+SCANDINAVIAN = 'rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2'
+FOUR_KNIGHTS = 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3'
+SCHOLARS_MATE = 'r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 2 3'
+TWO_ROOKS = 'r3k3/8/8/8/8/8/8/R2RK3 w - - 0 1'
+STACKED_ROOKS = '4k3/8/8/R7/8/8/8/R3K3 w - - 0 1'
+TWO_KNIGHTS = 'rnbqkbnr/pppppppp/8/8/8/5N2/PPP1PPPP/RNBQKB1R w KQkq - 0 1'
+CROSSED_ROOKS = '3R4/7k/8/8/8/8/8/R3K3 w - - 0 1'
+THREE_QUEENS = '4k3/8/8/8/8/Q7/8/Q1Q1K3 w - - 0 1'
+
+RULE_CASES = [
+    ('castles kingside', CASTLING, 'castles_side', 'O-O'),
+    ('castles', 'r3k2r/8/8/8/8/8/8/4K2R w Kkq - 0 1', 'castles', 'O-O'),
+    ('promote queen', '7k/4P3/8/8/8/8/8/4K3 w - - 0 1', 'promotes', 'e8=Q+'),
+    ('checkmate', SCHOLARS_MATE, 'check', 'Qxf7#'),
+    ('bishop check', SCANDINAVIAN, 'piece_check', 'Bb5+'),
+    ('takes', SCANDINAVIAN, 'takes', 'exd5'),
+    ('e takes', SCANDINAVIAN, 'file_takes', 'exd5'),
+    ('takes d', SCANDINAVIAN, 'takes_file', 'exd5'),
+    ('takes d 5', SCANDINAVIAN, 'takes_square', 'exd5'),
+    ('takes pawn', SCANDINAVIAN, 'takes_piece', 'exd5'),
+    ('knight takes', FOUR_KNIGHTS, 'piece_takes', 'Nxe5'),
+    ('knight takes pawn', FOUR_KNIGHTS, 'piece_takes_piece', 'Nxe5'),
+    ('g 1 f 3', chess.STARTING_FEN, 'uci', 'Nf3'),
+    ('e takes d 5', SCANDINAVIAN, 'file_square', 'exd5'),
+    ('e d', SCANDINAVIAN, 'file_file', 'exd5'),
+    ('e 4', chess.STARTING_FEN, 'square', 'e4'),
+    ('rook a 1 takes rook', TWO_ROOKS, 'piece_from_square_takes_piece', 'Rxa8+'),
+    ('knight b 1 c 3', chess.STARTING_FEN, 'piece_from_square_square', 'Nc3'),
+    ('rook a takes rook', TWO_ROOKS, 'piece_file_takes_piece', 'Rxa8+'),
+    ('rook d b 1', TWO_ROOKS, 'piece_file_square', 'Rdb1'),
+    ('rook 1 takes rook', TWO_ROOKS, 'piece_rank_takes_piece', 'Rxa8+'),
+    ('rook 5 a 3', STACKED_ROOKS, 'piece_rank_square', 'R5a3'),
+    ('knight f 3', chess.STARTING_FEN, 'piece_square', 'Nf3'),
+]
+
+
+def test_every_rule_has_a_case():
+    assert {rule for _, _, rule, _ in RULE_CASES} == {rule.name for rule in RULES}
+
+
+@pytest.mark.parametrize('phrase, fen, rule, san', RULE_CASES, ids=[case[2] for case in RULE_CASES])
+def test_rules(phrase, fen, rule, san):
+    board = chess.Board(fen)
+    result = resolve_phrase(phrase, board)
+    assert (result.query.rule, result.status, result.san) == (rule, Status.RESOLVED, san)
+    assert board.san(result.move.move) == san
+    assert phrase_to_san(phrase, board) == san
+
+
+@pytest.mark.parametrize('phrase, fen, status, error', [
+    ('banana', chess.STARTING_FEN, Status.UNPARSED, PhraseToSANError),
+    ('bishop e 4', chess.STARTING_FEN, Status.NO_MATCH, PhraseToSANError),
+    ('castles', CASTLING, Status.AMBIGUOUS, UnspecifiedCastlingDirection),
+    ('knight d 2', TWO_KNIGHTS, Status.AMBIGUOUS, PhraseToSANError),
+    ('rook b 1', TWO_ROOKS, Status.AMBIGUOUS, PhraseToSANError),
+])
+def test_errors(phrase, fen, status, error):
+    result = resolve_phrase(phrase, chess.Board(fen))
+    assert result.status is status and issubclass(result.error, error) and result.san is None
+    with pytest.raises(error):
+        phrase_to_san(phrase, chess.Board(fen))
+
+
+def test_ambiguous_candidates():
+    board = chess.Board(TWO_KNIGHTS)
+    result = resolve_phrase('knight d 2', board)
+    assert sorted(board.san(move.move) for move in result.candidates) == ['Nbd2', 'Nfd2']
+    assert phrase_to_san('knight b d 2', board) == 'Nbd2'
+
+
+@pytest.mark.parametrize('phrase, fen, san, warning', [
+    ('knight b 1 d 2', TWO_KNIGHTS, 'Nbd2', IsNotAmbiguousWarning),
+    ('knight f 3 check', chess.STARTING_FEN, 'Nf3', IsNotCheckWarning),
+])
+def test_warnings(phrase, fen, san, warning):
+    board = chess.Board(fen)
+    assert phrase_to_san(phrase, board) == san
+    with pytest.raises(warning):
+        phrase_to_san(phrase, board, raise_warnings=True)
+    result = resolve_phrase(phrase, board)
+    assert [type(w) for w in result.warning_list()] == [warning] and isinstance(result.exception(), PhraseToSANWarning)
+
+
+@pytest.mark.parametrize('phrase, fen, san, over_disambiguated', [
+    # No disambiguator needed at all
+    ('knight g f 3', chess.STARTING_FEN, 'Nf3', True),
+    ('knight 1 f 3', chess.STARTING_FEN, 'Nf3', True),
+    # Either the file or the rank is enough, so one of them is fine even if SAN would pick the other...
+    ('rook a d 1', CROSSED_ROOKS, 'Rad1', False),
+    ('rook 1 d 1', CROSSED_ROOKS, 'Rad1', False),
+    ('rook 8 d 1', CROSSED_ROOKS, 'Rdd1', False),
+    # ...but not both
+    ('rook a 1 d 1', CROSSED_ROOKS, 'Rad1', True),
+    ('knight b 1 d 2', TWO_KNIGHTS, 'Nbd2', True),
+    # Only both tell the queen on a1 apart
+    ('queen a 1 b 2', THREE_QUEENS, 'Qa1b2', False),
+])
+def test_over_disambiguation(phrase, fen, san, over_disambiguated):
+    board = chess.Board(fen)
+    result = resolve_phrase(phrase, board)
+    assert result.san == san
+    assert bool(result.warnings & WarningFlag.IS_NOT_AMBIGUOUS) is over_disambiguated
+    if over_disambiguated:
+        with pytest.raises(IsNotAmbiguousWarning):
+            phrase_to_san(phrase, board, raise_warnings=True)
+    else:
+        assert phrase_to_san(phrase, board, raise_warnings=True) == san
+
+
+def test_board_is_not_moved():
+    board = chess.Board(FOUR_KNIGHTS)
+    fen = board.fen()
+    assert phrase_to_san('knight takes check', board, raise_warnings=False) == 'Nxe5'
+    assert phrase_to_san('bishop c 4', Position.from_board(board)) == 'Bc4'
+    assert board.fen() == fen and not board.move_stack
+
+
+def test_phrases_to_san():
+    board = chess.Board()
+    assert [result.san for result in phrases_to_san(['e 4', 'banana'], board)] == ['e4']
+
+    results = phrases_to_san(['banana', 'knight f 3 check', 'e 4'], board, [0.9, 0.8, 0.1], stop_early=False)
+    assert [(result.hypothesis, result.san) for result in results] == \
+        [('e 4', 'e4'), ('knight f 3 check', 'Nf3'), ('banana', None)]
+    assert [type(warning) for warning in results[1].warnings] == [IsNotCheckWarning]
+    assert isinstance(results[2].error, PhraseToSANError)
+    with pytest.raises(ValueError):
+        phrases_to_san(['e 4'], board, [0.5, 0.5])
@@ -0,0 +1,73 @@
+import chess
+import pytest
+
+from phrase_table import PhraseTable
+from phrase_to_san import IsNotCaptureWarning, PhraseToSANError
+from phrase_trie import IncrementalParser, PhraseTrie
+
+FOUR_KNIGHTS = 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3'
+
+
+@pytest.fixture(scope='module')
+def table() -> PhraseTable:
+    return PhraseTable(chess.Board(FOUR_KNIGHTS))
+
+
+def sans(parser: IncrementalParser):
+    return sorted(parser.table.index.san(move) for move in parser.candidates)
+
+
+def test_feed(table):
+    parser = IncrementalParser(table)
+    assert len(parser.candidates) == len(table.index.moves)
+    assert parser.feed('bishop') is None
+    assert sans(parser) == ['Ba6', 'Bb5', 'Bc4', 'Bd3', 'Be2']
+    # One move left before the phrase is over
+    assert parser.feed('b') == 'Bb5' and parser.only_san == 'Bb5' and not parser.is_whole_phrase
+    assert parser.feed('5') == 'Bb5' and parser.is_whole_phrase
+    assert parser.transcript == 'bishop b 5'
+    assert parser.finish() == 'Bb5'
+
+
+def test_update(table):
+    parser = IncrementalParser(table)
+    assert parser.update('knight takes pawn') == 'Nxe5'
+    # The recognizer changed its mind
+    assert parser.update('knight h') == 'Nh4' and parser.transcript == 'knight h'
+    assert parser.update('knight') is None and len(parser.candidates) == 7
+    parser.reset()
+    assert parser.transcript == '' and len(parser.candidates) == len(table.index.moves)
+
+
+def test_filler_is_skipped(table):
+    parser = IncrementalParser(table)
+    assert parser.update('bishop to the b 5') == 'Bb5' and parser.is_whole_phrase
+    # Not in the table, so ``finish()`` falls back to ``phrase_to_san()``
+    assert table.lookup('bishop to the b 5') is None
+    assert parser.finish() == 'Bb5'
+
+
+@pytest.mark.parametrize('transcript', ['e 4', 'queen h 6', 'knight takes queen', 'castles'])
+def test_no_match(table, transcript):
+    parser = IncrementalParser(table)
+    assert parser.update(transcript) is None
+    assert parser.candidates == [] and parser.only_move is None and not parser.is_whole_phrase
+    with pytest.raises(PhraseToSANError):
+        parser.finish()
+
+
+def test_warnings(table):
+    # "knight takes g 5" resolves to Ng5 with a warning, same as ``phrase_to_san()``, so it is still consistent
+    parser = IncrementalParser(table)
+    assert parser.update('knight takes g') is None and sans(parser) == ['Ng1', 'Ng5']
+    assert parser.feed('5') == 'Ng5' and parser.finish() == 'Ng5'
+    with pytest.raises(IsNotCaptureWarning):
+        parser.finish(raise_warnings=True)
+
+
+def test_shared_trie(table):
+    trie = PhraseTrie(table)
+    first, second = IncrementalParser(table, trie=trie), IncrementalParser(table, trie=trie)
+    assert first.update('bishop b') == 'Bb5' and second.update('knight g 1') == 'Ng1'
+    assert first.only_san == 'Bb5'
+    assert trie.walk(['knight', 'takes', 'pawn']).move is not None and trie.walk(['banana']) is None
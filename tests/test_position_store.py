@@ -0,0 +1,134 @@
+import chess
+import pytest
+
+from move_index import MoveIndex
+from phrase_table import PhraseTable
+from phrase_to_san import PhraseToSANError, PhraseToSANWarning, phrase_to_san
+from position_store import PositionStore, build_store, opening_positions, share_store
+
+FENS = [
+    chess.STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 2 3',
+    'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1',
+    'r1n4k/1P6/8/2pP4/8/8/8/4K3 w - c6 0 1',
+    '7k/5Q2/6K1/8/8/8/8/8 w - - 0 1',
+]
+
+
+@pytest.fixture(scope='module')
+def data() -> bytes:
+    # The same position twice is only stored once
+    return build_store([chess.Board(fen) for fen in FENS + FENS[:1]])
+
+
+@pytest.fixture
+def store(data):
+    store = PositionStore(data)
+    yield store
+    store.close()
+
+
+def test_positions(store):
+    assert len(store) == len(FENS)
+    assert sorted(artifact.epd for artifact in store) == sorted(chess.Board(fen).epd() for fen in FENS)
+    assert store.get(chess.Board('8/8/8/8/8/8/8/K6k w - - 0 1')) is None
+    # The move clocks are not part of the position
+    assert store.get(chess.Board(FENS[1].replace(' 2 3', ' 0 9'))).epd == chess.Board(FENS[1]).epd()
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_moves_match_move_index(store, fen):
+    board = chess.Board(fen)
+    index = MoveIndex(board)
+    records = store.get(board).moves()
+    assert [record.move for record in records] == [move.move for move in index.moves]
+    for record, move in zip(records, index.moves):
+        assert record.san == index.san(move) == board.san(move.move)
+        assert (record.piece_type, record.captured_type) == (move.piece_type, move.captured_type)
+        assert (record.gives_check, record.gives_mate, record.gives_stalemate) == \
+            (index.gives_check(move), index.gives_mate(move), index.gives_stalemate(move))
+
+
+def warning(resolve, phrase: str):
+    try:
+        resolve(phrase, raise_warnings=True)
+    except PhraseToSANWarning as e:
+        return type(e), str(e)
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_lookup_matches_phrase_table(store, fen):
+    board = chess.Board(fen)
+    table = PhraseTable(board)
+    artifact = store.get(board)
+    assert len(artifact) == len(table)
+    for san, phrases in table.phrases_by_san.items():
+        for phrase in phrases:
+            assert artifact.lookup(phrase) == table.lookup(phrase) == san
+            assert warning(artifact.lookup, phrase) == warning(table.lookup, phrase), phrase
+
+
+def test_phrase_to_san(store):
+    board = chess.Board(FENS[1])
+    artifact = store.get(board)
+    assert artifact.phrase_to_san('checkmate') == 'Qxf7#'
+    assert artifact.lookup('queen to f 7') is None
+    assert artifact.phrase_to_san('queen to f 7') == 'Qxf7#'
+    with pytest.raises(PhraseToSANWarning):
+        artifact.phrase_to_san('queen takes f 7', raise_warnings=True)
+    with pytest.raises(PhraseToSANError):
+        artifact.phrase_to_san('banana')
+    assert artifact.lookup('Dame schlägt f sieben matt', locale='de') == 'Qxf7#'
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_move_index(store, fen):
+    board = chess.Board(fen)
+    index = store.get(board).move_index()
+    # Every flag and SAN is filled in from the store, before anything is probed
+    assert index.probe_counts() == (len(index.moves), len(index.moves))
+    fresh = MoveIndex(board)
+    for move, expected in zip(index.moves, fresh.moves):
+        assert (index.san(move), index.gives_check(move), index.has_reply(move)) == \
+            (fresh.san(expected), fresh.gives_check(expected), fresh.has_reply(expected))
+    for phrase in ('e 4', 'castles queenside', 'check', 'takes', 'b takes queen'):
+        try:
+            expected = phrase_to_san(phrase, board)
+        except PhraseToSANError as e:
+            expected = type(e)
+        try:
+            assert phrase_to_san(phrase, board, index=index) == expected
+        except PhraseToSANError as e:
+            assert type(e) is expected
+
+
+def test_open(data, tmp_path):
+    path = tmp_path / 'store.bin'
+    path.write_bytes(data)
+    store = PositionStore.open(str(path))
+    try:
+        assert len(store) == len(FENS)
+        assert store.get(chess.Board()).phrase_to_san('knight f 3') == 'Nf3'
+    finally:
+        store.close()
+
+
+def test_shared_memory(data):
+    block = share_store(data)
+    try:
+        store = PositionStore.attach(block.name)
+        assert store.get(chess.Board(FENS[2])).phrase_to_san('castles queenside') == 'O-O-O'
+        store.close()
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_bad_magic(data):
+    with pytest.raises(ValueError):
+        PositionStore(b'NOPE' + data[4:])
+
+
+def test_opening_positions():
+    boards = list(opening_positions())
+    assert boards and all(board.is_valid() for board in boards)
@@ -0,0 +1,45 @@
+import pytest
+
+from replay_eval import ReplayStats, read_pairs, replay, replay_game
+
+PGN = '''[Event "g1"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 *
+
+[Event "g2"]
+
+1. d4 d5 *
+'''
+
+TRANSCRIPTS = ['g1\te 4\n', 'g1\te 5\n', 'g1\tknight f 3\n', 'g1\tknight\n', 'g1\tbishop c 4\n',
+               'g2\td 4\n', 'g2\td 5\n']
+
+
+def test_replay():
+    games = list(read_pairs(PGN.splitlines(keepends=True), TRANSCRIPTS))
+    assert [(game.game_id, len(game.phrases)) for game in games] == [('g1', 5), ('g2', 2)]
+
+    stats = ReplayStats()
+    for batch_stats, failures in replay(games, batch_size=1):
+        stats.merge(batch_stats)
+    assert (stats.games, stats.clean_games, stats.plies, stats.correct) == (2, 1, 7, 5)
+    assert stats.errors == {'PhraseToSANError': 1} and stats.confusion['Nc6', '[PhraseToSANError]'] == 1
+
+
+def test_failures():
+    game = next(read_pairs(PGN.splitlines(keepends=True), TRANSCRIPTS))
+    stats, failures = ReplayStats(), []
+    replay_game(game, stats, failures)
+    unparsed, wrong = failures
+    assert (unparsed['ply'], unparsed['status'], unparsed['expected'], unparsed['produced']) == \
+        (4, 'unparsed', 'Nc6', None)
+    assert (wrong['ply'], wrong['status'], wrong['expected'], wrong['produced']) == (5, 'resolved', 'Bb5', 'Bc4')
+    assert stats.confusion['Bb5', 'Bc4'] == 1
+    assert stats.arm_plies['square'] == 2 and stats.arm_plies['piece_square'] == 2
+
+
+def test_mismatched_ids():
+    with pytest.raises(ValueError):
+        list(read_pairs(PGN.splitlines(keepends=True), [line.replace('g2', 'g3') for line in TRANSCRIPTS]))
+    with pytest.raises(ValueError):
+        list(read_pairs(PGN.splitlines(keepends=True), TRANSCRIPTS[:5]))
@@ -0,0 +1,44 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = sorted(os.path.basename(path)[:-3] for path in glob.glob(os.path.join(ROOT, '*.py')))
+'''The top-level modules of the repo.'''
+
+
+def run(script: str):
+    """
+    Run ``script`` in a fresh interpreter, and get the JSON it prints.
+    """
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def loaded_after(statements: str):
+    """
+    Get the modules of the repo that are imported after running ``statements`` in a fresh interpreter.
+    """
+    return run(f'import json, sys\n{statements}\nprint(json.dumps(sorted(set(sys.modules) & set({MODULES!r}))))')
+
+
+def test_import_is_lazy():
+    """
+    The grammar's table and the normalizer's regexes are built on first use, not on import.
+    """
+    assert run('import phrase_to_san, json; print(json.dumps([len(phrase_to_san.GRAMMAR._table), '
+               'phrase_to_san.NORMALIZER._compiled]))') == [0, False]
+
+
+def test_phrase_to_san_imports():
+    assert loaded_after('import phrase_to_san') == ['grammar', 'instrumentation', 'locales', 'move_index', 'normalizer',
+                                                    'phrase_to_san', 'position', 'stt_replacements']
+
+
+def test_san_phrases_imports_on_first_use():
+    assert loaded_after('import san_phrases') == ['san_phrases']
+    loaded = loaded_after('import san_phrases\nsan_phrases.PhraseCache')
+    assert 'phrase_cache' in loaded and 'phrase_to_san' in loaded
+    assert not {'phrase_server', 'transcripts_to_pgn', 'fuzzy_matcher', 'position_store', 'benchmark'} & set(loaded)
@@ -0,0 +1,26 @@
+from transcripts_to_pgn import convert, convert_game, read_games
+
+
+def test_convert_game():
+    result = convert_game('g1', ['e 4', 'e 5', 'knight f 3 check', 'knight c 6', 'bishop b 5', 'banana', 'a 6'])
+    assert result.plies == 5 and result.stopped
+    assert '1. e4 e5 2. Nf3 Nc6 3. Bb5' in result.pgn and '[Event "g1"]' in result.pgn
+    warning, error = result.problems
+    assert (warning['ply'], warning['level'], warning['error']) == (3, 'warning', 'IsNotCheckWarning')
+    assert (error['ply'], error['level'], error['error']) == (6, 'error', 'PhraseToSANError')
+    assert error['message'] == 'Could not parse phrase: "banana"'
+    assert error['fen'] == 'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3'
+
+
+def test_strict():
+    result = convert_game('g1', ['e 4', 'e 5', 'knight f 3 check', 'knight c 6'], strict=True)
+    assert result.plies == 2 and result.stopped and len(result.problems) == 1
+    assert 'Stopped at ply 3' in result.pgn
+
+
+def test_convert_keeps_input_order():
+    lines = [f'g{i}\t{phrase}\n' for i in range(5) for phrase in ('d 4', 'd 5')]
+    assert [game_id for game_id, _ in read_games(lines)] == [f'g{i}' for i in range(5)]
+    results = list(convert(lines, batch_size=2))
+    assert [result.game_id for result in results] == [f'g{i}' for i in range(5)]
+    assert all(result.plies == 2 and not result.problems for result in results)
@@ -0,0 +1,153 @@
+"""
+Convert dictated games to PGN.
+
+    python transcripts_to_pgn.py games.tsv -o games.pgn --errors errors.jsonl --workers 4
+
+The input has one ``game_id<TAB>phrase`` line per move (``-`` for stdin). The lines of each game must
+be together and in order (ex. run it through ``sort -s -t $'\\t' -k1,1`` first). Each game is replayed
+from the starting position with ``resolve_phrase()``, and written out as PGN in input order. A game stops
+at its first phrase that can't be resolved (or with ``--strict``, that raises a warning), and every error
+and warning goes to the ``--errors`` file as a line of JSON.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import chess
+import chess.pgn
+
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from phrase_to_san import resolve_phrase
+
+
+class GameResult(NamedTuple):
+    game_id: str
+    pgn: str
+    plies: int
+    problems: List[Dict]
+    '''One dict per error or warning, as written to the error report.'''
+    stopped: bool
+    '''Whether the game was stopped before its last phrase.'''
+
+
+def read_games(lines: Iterable[str]) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Group ``game_id<TAB>phrase`` lines into ``(game_id, phrases)``, one game at a time.
+    """
+    def split(line: str) -> Tuple[str, str]:
+        game_id, _, phrase = line.rstrip('\r\n').partition('\t')
+        return game_id, phrase
+
+    rows = (split(line) for line in lines if line.strip())
+    for game_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield game_id, [phrase for _, phrase in group]
+
+
+def convert_game(game_id: str, phrases: List[str], strict: bool = False) -> GameResult:
+    board = chess.Board()
+    problems = []
+    stopped = None
+    for ply, phrase in enumerate(phrases, start=1):
+        result = resolve_phrase(phrase, board)
+        if result.error is None and not result.warnings:
+            board.push(result.move.move)
+            continue
+
+        problem = {'game_id': game_id, 'ply': ply, 'phrase': phrase, 'fen': board.fen()}
+        if result.error is not None:
+            stopped = {**problem, 'level': 'error', 'error': result.error.__name__, 'message': result.message}
+            problems.append(stopped)
+            break
+        warnings = result.warning_list()
+        for warning in warnings:
+            problems.append({**problem, 'level': 'warning', 'error': type(warning).__name__, 'message': str(warning)})
+        if strict:
+            stopped = problems[-len(warnings)]
+            break
+        board.push(result.move.move)
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers['Event'] = game_id
+    if stopped is not None:
+        game.end().comment = f'Stopped at ply {stopped["ply"]}: {stopped["message"]}'
+    return GameResult(game_id, str(game), len(board.move_stack), problems, stopped is not None)
+
+
+def convert_batch(batch: List[Tuple[str, List[str]]], strict: bool) -> List[GameResult]:
+    return [convert_game(game_id, phrases, strict) for game_id, phrases in batch]
+
+
+def convert(lines: Iterable[str],
+            *,
+            executor: Optional[Executor] = None,
+            strict: bool = False,
+            batch_size: int = 32,
+            max_pending: int = 16) -> Iterator[GameResult]:
+    """
+    Convert each game in ``lines`` (see ``read_games()``), in input order. Games are sent to ``executor``
+    (or converted here if there is none) in batches of ``batch_size``, with at most ``max_pending``
+    batches read ahead, so memory use doesn't grow with the size of the input.
+    """
+    games = read_games(lines)
+    batches = iter(lambda: list(itertools.islice(games, batch_size)), [])
+    if executor is None:
+        for batch in batches:
+            yield from convert_batch(batch, strict)
+        return
+
+    pending = deque()
+    for batch in batches:
+        pending.append(executor.submit(convert_batch, batch, strict))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='game_id<TAB>phrase lines, or - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='PGN output (default: stdout)')
+    parser.add_argument('--errors', help='JSON lines report of errors and warnings')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='0 to convert in this process')
+    parser.add_argument('--batch-size', type=int, default=32, help='games per task sent to a worker')
+    parser.add_argument('--strict', action='store_true', help='stop a game at its first warning too')
+    args = parser.parse_args(argv)
+
+    def open_text(path: str, mode: str, std: TextIO) -> TextIO:
+        return std if path == '-' else open(path, mode, encoding='utf-8', buffering=1 << 20)
+
+    start = time.perf_counter()
+    games = plies = stopped = 0
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 0 else None
+    with open_text(args.input, 'r', sys.stdin) as lines, open_text(args.output, 'w', sys.stdout) as output:
+        report = open(args.errors, 'w', encoding='utf-8') if args.errors else None
+        try:
+            for result in convert(lines, executor=executor, strict=args.strict, batch_size=args.batch_size,
+                                  max_pending=2 * max(1, args.workers)):
+                output.write(result.pgn + '\n\n')
+                games += 1
+                plies += result.plies
+                stopped += result.stopped
+                if report is not None:
+                    for problem in result.problems:
+                        report.write(json.dumps(problem) + '\n')
+        finally:
+            if report is not None:
+                report.close()
+            if executor is not None:
+                executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f'{games} games ({stopped} stopped early), {plies} plies in {elapsed:.1f}s: '
+          f'{games / elapsed:.1f} games/s, {plies / elapsed:.1f} plies/s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()